@@ -0,0 +1,207 @@
+import glob
+import os
+import pandas as pd
+
+import GSR_to_graph
+from GSR_to_graph import draw_sheet_figures
+from GSR_to_matrix import create_combined_excel
+from GSR_to_tables import create_statistic_table, dataframe_to_csv
+from GSR_protocol import DEFAULT_PROTOCOL, GSRProtocol
+from GSR_windows import EventWindows, preprocess
+from GSR_workbook import load_gsr_sheets, load_signal_stores, timing_sheet_for
+from parallel_files import parse_files_in_order
+from render_cache import RenderCache
+
+"Statistics tables, event matrix and diagnostic figures of GSR workbooks in one run, every sheet's timing resolved once"
+
+DEFAULT_DATA_SHEETS = ["T1", "T2"]
+MERGED_STATISTICS_FILE = "GSR_Statistics_Table_all.csv"
+MATRIX_FILE = "GSR_matrix_per_event.xlsx"
+
+
+def process_sheet(timing, data, sheet_name, cache: RenderCache = None, sample_step=10, mode="point",
+                  protocol: GSRProtocol = DEFAULT_PROTOCOL):
+    """
+    Resolves the sheet's windows once (data at the protocol's sampling rate) and produces its
+    three outputs from them.
+    Returns (statistics table, {matrix sheet name: DataFrame}); figures are drawn when a
+    render cache is given.
+    """
+    windows = EventWindows(timing, data, preprocess(timing, data), protocol)
+
+    stats = create_statistic_table(timing, data, windows=windows)
+    matrix_sheets = create_combined_excel(timing, data, sheet_name, sample_step, mode, windows=windows) or {}
+    if cache is not None:
+        draw_sheet_figures(timing, data, sheet_name, cache, windows)
+    return stats, matrix_sheets
+
+
+def process_workbook(file_path, data_sheet_names, output_dir, figures=True, force=False, sample_step=10,
+                     mode="point", signal_store=False, protocol: GSRProtocol = DEFAULT_PROTOCOL,
+                     figures_dir=None) -> dict:
+    """
+    Writes <sheet>_GSR_Statistics_Table.csv for every sheet and GSR_matrix_per_event.xlsx into
+    output_dir, and the diagnostic figures into figures_dir (GSR_to_graph.OUTPUT_DIR by default;
+    figures=False skips them). Returns {sheet name: statistics table}.
+    signal_store=True reads the data sheets from their float32 memory maps (see GSR_signal_store)
+    instead of DataFrames; means then carry float32 precision.
+    Data recorded at a higher rate than the protocol's sampling rate is averaged down on load.
+    """
+    timing_sheet_names = [timing_sheet_for(name) for name in data_sheet_names]
+    if signal_store:
+        sheets = load_gsr_sheets(file_path, timing_sheets=timing_sheet_names, skip_missing=True)
+        sheets.update(load_signal_stores(file_path, data_sheet_names, skip_missing=True, protocol=protocol))
+    else:
+        sheets = load_gsr_sheets(
+            file_path, data_sheets=data_sheet_names, timing_sheets=timing_sheet_names, skip_missing=True
+        )
+        for sheet_name in data_sheet_names:
+            if sheet_name in sheets:
+                sheets[sheet_name] = protocol.resample_frame(sheets[sheet_name])
+    cache = RenderCache(figures_dir or GSR_to_graph.OUTPUT_DIR, force=force) if figures else None
+    os.makedirs(output_dir, exist_ok=True)
+
+    all_matrix_sheets = {}
+    all_stats = {}
+    for sheet_name in data_sheet_names:
+        timing_sheet_name = timing_sheet_for(sheet_name)
+        if sheet_name not in sheets or timing_sheet_name not in sheets:
+            print(f"Skipping {sheet_name}: sheet or {timing_sheet_name} is missing")
+            continue
+
+        print(f"\nProcessing {sheet_name}")
+        try:
+            stats, matrix_sheets = process_sheet(
+                sheets[timing_sheet_name], sheets[sheet_name], sheet_name, cache, sample_step, mode, protocol
+            )
+        finally:
+            if cache is not None:
+                cache.save()
+        dataframe_to_csv(stats, output_dir, sheet_name)
+        all_stats[sheet_name] = stats
+        all_matrix_sheets.update(matrix_sheets)
+
+    if all_matrix_sheets:
+        output_file = os.path.join(output_dir, MATRIX_FILE)
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            for sheet_name, df in all_matrix_sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name)
+        print(f"Matrix saved: {output_file}")
+    return all_stats
+
+
+def find_workbooks(path_or_glob: str) -> list[str]:
+    """
+    every .xlsx under a directory (recursively), or the files matching a glob;
+    Excel lock files (~$...) and matrix outputs of earlier runs are left out
+    """
+    if os.path.isdir(path_or_glob):
+        paths = glob.glob(os.path.join(path_or_glob, "**", "*.xlsx"), recursive=True)
+    else:
+        paths = glob.glob(path_or_glob, recursive=True)
+    return sorted(
+        path for path in paths
+        if not os.path.basename(path).startswith("~$") and os.path.basename(path) != MATRIX_FILE
+    )
+
+
+def workbook_source_names(paths) -> dict:
+    """
+    {path: source name}: the path relative to the workbooks' common folder, without the extension
+    (site_a/wave_1/GSR_RawData.xlsx -> site_a/wave_1/GSR_RawData), so same-named workbooks stay apart
+    """
+    if not paths:
+        return {}
+    folders = [os.path.dirname(os.path.abspath(path)) for path in paths]
+    root = os.path.commonpath(folders)
+    return {
+        path: os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0].replace(os.sep, "/")
+        for path in paths
+    }
+
+
+def exclude_outputs(paths, output_root) -> list:
+    """
+    leaves out the workbooks inside the output folder of another workbook (output_root/<source name>),
+    i.e. what earlier runs wrote there; output_root may be the data folder itself or one of its parents
+    """
+    output_dirs = [
+        os.path.abspath(os.path.join(output_root, *source.split("/")))
+        for source in workbook_source_names(paths).values()
+    ]
+    return [
+        path for path in paths
+        if not any(os.path.commonpath([os.path.abspath(path), folder]) == folder for folder in output_dirs)
+    ]
+
+
+def merge_statistics(results) -> pd.DataFrame:
+    """
+    [(source, {sheet: statistics table})] -> one table with source and sheet columns in front;
+    recovery columns that only some workbooks have are NaN for the others
+    """
+    frames = []
+    for source, sheet_stats in results:
+        for sheet_name, stats in sheet_stats.items():
+            frame = stats.reset_index()
+            frame.insert(0, "sheet", sheet_name)
+            frame.insert(0, "source", source)
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["source", "sheet", "Subject_ID"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def process_workbooks(path_or_glob, output_root, data_sheet_names=DEFAULT_DATA_SHEETS, workers=1, **options):
+    """
+    Runs process_workbook on every workbook found (see find_workbooks), each into
+    output_root/<source name>/ with its figures in a Diagnostic_Figures folder there.
+    workers > 1 processes that many workbooks at once in worker processes.
+    The statistics tables of all workbooks are merged into output_root/GSR_Statistics_Table_all.csv
+    with a source column; a workbook that fails is reported and left out.
+    options are passed to process_workbook (figures, force, sample_step, mode, signal_store, protocol).
+    """
+    paths = exclude_outputs(find_workbooks(path_or_glob), output_root)
+    if not paths:
+        print(f"No workbooks found for {path_or_glob}")
+        return None
+    sources = workbook_source_names(paths)
+    print(f"Processing {len(paths)} workbook(s) with {max(workers, 1)} worker(s)")
+
+    tasks = [
+        (path, list(data_sheet_names), os.path.join(output_root, *sources[path].split("/")), options)
+        for path in paths
+    ]
+
+    results = []
+    failed = []
+    for path, stats, error, _ in parse_files_in_order(process_workbook_task, tasks, workers):
+        if error is not None:
+            print(f"Failed to process {path}: {error}")
+            failed.append(path)
+            continue
+        results.append((sources[path], stats))
+
+    merged = merge_statistics(results)
+    os.makedirs(output_root, exist_ok=True)
+    merged_path = os.path.join(output_root, MERGED_STATISTICS_FILE)
+    merged.to_csv(merged_path, index=False, float_format='%.8f')
+    print(f"Merged statistics of {len(results)} workbook(s) saved: {merged_path}")
+    if failed:
+        print(f"{len(failed)} workbook(s) failed: {failed}")
+    return merged
+
+
+def process_workbook_task(file_path, data_sheet_names, output_dir, options):
+    """process_workbook for one batch task; module level so it can be sent to worker processes"""
+    return process_workbook(
+        file_path, data_sheet_names, output_dir,
+        figures_dir=os.path.join(output_dir, "Diagnostic_Figures"), **options
+    )
+
+
+if __name__ == "__main__":
+    # one GSR_RawData workbook per site and study wave under data_dir
+    data_dir = "/Users/jasmineerell/Documents/Research/data/GSR"
+    output_root = "/Users/jasmineerell/Documents/Research/data/GSR_outputs"
+    process_workbooks(data_dir, output_root, workers=4)
@@ -0,0 +1,155 @@
+import json
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+
+"The GSR recording protocol (sampling rate, conditions, segments and trauma rules) as one object, compiled to sample offsets once"
+
+SAMPLING_RATE = 10
+STANDARD_CONDITIONS = ['neut1', 'stress', 'neut2'] #act the same
+TRAUMA_CONDITION = 'trauma'
+#[duration,offset]
+STANDARD_SEGMENTS = {
+    'Baseline': [10,-10],
+    'Audio': [60,0],
+    'Imagery': [30,60],
+    'Recovery_1': [30,90],
+    'Recovery_2': [30,120],
+}
+BASELINE_DURATION, BASELINE_OFFSET = STANDARD_SEGMENTS['Baseline']
+IMAGERY_DURATION = STANDARD_SEGMENTS['Imagery'][0]
+AUDIO_OFFSET = STANDARD_SEGMENTS['Audio'][1]
+TRAUMA_AUDIO_END_LABEL = 'trauma_end'
+RECORDING_END_LABEL = 'end of recording'
+RECOVERY_BLOCK_DURATION = 30
+MIN_RECOVERY_BLOCKS = 9 # the statistics table always has at least this many trauma recovery columns
+# matrix spans: trauma lasts until the first valid of these rows
+TRAUMA_SPAN_END_LABELS = [RECORDING_END_LABEL, TRAUMA_AUDIO_END_LABEL]
+# diagnostic figure: every segment starts STARTING_OFFSET seconds before its onset
+STARTING_OFFSET = 10
+PLOT_SEGMENT_DURATION_SEC = 210 #gives full cover for trauma
+
+
+def resample_rows(values: np.ndarray, input_rate, output_rate) -> np.ndarray:
+    """
+    Averages a subjects x samples array recorded at input_rate down to output_rate.
+    Output sample j is the NaN-ignoring mean of the input samples from j/output_rate seconds
+    up to (j+1)/output_rate, so the rates need not divide; a trailing partial bin is dropped.
+    Every bin is summed at once with np.add.reduceat.
+    """
+    ratio = Fraction(input_rate).limit_denominator() / Fraction(output_rate).limit_denominator()
+    if ratio == 1:
+        return values
+    if ratio < 1:
+        raise ValueError(f"cannot resample {input_rate} Hz up to {output_rate} Hz")
+
+    values = np.asarray(values, dtype=float)
+    n_out = values.shape[1] * ratio.denominator // ratio.numerator
+    # bin j covers input samples [ceil(j * ratio), ceil((j + 1) * ratio))
+    edges = -(-np.arange(n_out + 1, dtype=np.int64) * ratio.numerator // ratio.denominator)
+    if n_out == 0:
+        return np.empty((values.shape[0], 0))
+
+    used = values[:, :edges[-1]]
+    is_valid = ~np.isnan(used)
+    sums = np.add.reduceat(np.where(is_valid, used, 0.0), edges[:-1], axis=1)
+    counts = np.add.reduceat(is_valid, edges[:-1], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+class GSRProtocol:
+    """
+    Everything the GSR windows depend on. Times are in seconds; the constructor compiles the
+    fixed segments into sample offsets for sampling_rate once.
+    input_rate is the rate the device recorded at; higher-rate data is averaged down to
+    sampling_rate on ingest (see resample_frame).
+    """
+    def __init__(self, sampling_rate=SAMPLING_RATE, input_rate=None, standard_conditions=None,
+                 trauma_condition=TRAUMA_CONDITION, standard_segments=None,
+                 trauma_audio_end_label=TRAUMA_AUDIO_END_LABEL, recording_end_label=RECORDING_END_LABEL,
+                 recovery_block_duration=RECOVERY_BLOCK_DURATION, min_recovery_blocks=MIN_RECOVERY_BLOCKS,
+                 trauma_span_end_labels=None, starting_offset=STARTING_OFFSET,
+                 plot_segment_duration_sec=PLOT_SEGMENT_DURATION_SEC):
+        self.sampling_rate = sampling_rate
+        self.input_rate = sampling_rate if input_rate is None else input_rate
+        self.standard_conditions = list(standard_conditions or STANDARD_CONDITIONS)
+        self.trauma_condition = trauma_condition
+        self.standard_segments = {name: list(seg) for name, seg in (standard_segments or STANDARD_SEGMENTS).items()}
+        self.trauma_audio_end_label = trauma_audio_end_label
+        self.recording_end_label = recording_end_label
+        self.recovery_block_duration = recovery_block_duration
+        self.min_recovery_blocks = min_recovery_blocks
+        self.trauma_span_end_labels = list(trauma_span_end_labels or [recording_end_label, trauma_audio_end_label])
+        self.starting_offset = starting_offset
+        self.plot_segment_duration_sec = plot_segment_duration_sec
+
+        for required in ('Baseline', 'Imagery'):
+            if required not in self.standard_segments:
+                raise ValueError(f"the protocol needs a '{required}' segment (the trauma segments use it)")
+        if self.input_rate < self.sampling_rate:
+            raise ValueError(f"input rate {self.input_rate} Hz is below the sampling rate {self.sampling_rate} Hz")
+
+        self.events = self.standard_conditions + [self.trauma_condition]
+        # an event lasts until the next one starts (the last standard condition until trauma)
+        self.next_event = dict(zip(self.events[:-1], self.events[1:]))
+
+        # compiled once: {segment: (offset samples, duration samples)}
+        self.segment_samples = {
+            name: (int(self.seconds_to_samples(offset)), int(self.seconds_to_samples(duration)))
+            for name, (duration, offset) in self.standard_segments.items()
+        }
+        self.imagery_samples = self.segment_samples['Imagery'][1]
+        self.recovery_block_samples = int(self.seconds_to_samples(recovery_block_duration))
+        self.plot_segment_samples = int(self.seconds_to_samples(plot_segment_duration_sec))
+
+    def seconds_to_samples(self, seconds):
+        # int() truncation, as the per subject code always did (NaN stays NaN)
+        return np.trunc(np.asarray(seconds, dtype=float) * self.sampling_rate)
+
+    def segment_names(self) -> list[str]:
+        """statistics table segments, in column order (without the extra trauma recovery blocks)"""
+        names = [f'{cond}_{seg}' for cond in self.standard_conditions for seg in self.standard_segments]
+        names += [f'{self.trauma_condition}_{seg}' for seg in ['Baseline', 'Audio', 'Imagery']]
+        names += [f'{self.trauma_condition}_Recovery_{i}' for i in range(1, self.min_recovery_blocks + 1)]
+        return names
+
+    def resample_frame(self, df_data: pd.DataFrame) -> pd.DataFrame:
+        """the data sheet averaged down from input_rate to sampling_rate (unchanged when they match)"""
+        if self.input_rate == self.sampling_rate:
+            return df_data
+        values = df_data.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).T
+        resampled = resample_rows(values, self.input_rate, self.sampling_rate)
+        return pd.DataFrame(resampled.T, columns=df_data.columns)
+
+    def to_dict(self) -> dict:
+        return {
+            'sampling_rate': self.sampling_rate,
+            'input_rate': self.input_rate,
+            'standard_conditions': self.standard_conditions,
+            'trauma_condition': self.trauma_condition,
+            'standard_segments': self.standard_segments,
+            'trauma_audio_end_label': self.trauma_audio_end_label,
+            'recording_end_label': self.recording_end_label,
+            'recovery_block_duration': self.recovery_block_duration,
+            'min_recovery_blocks': self.min_recovery_blocks,
+            'trauma_span_end_labels': self.trauma_span_end_labels,
+            'starting_offset': self.starting_offset,
+            'plot_segment_duration_sec': self.plot_segment_duration_sec,
+        }
+
+    @classmethod
+    def from_dict(cls, settings: dict):
+        """missing keys keep their default"""
+        return cls(**settings)
+
+    @classmethod
+    def from_json(cls, path: str):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        return f"GSRProtocol({self.sampling_rate} Hz, input {self.input_rate} Hz)"
+
+
+DEFAULT_PROTOCOL = GSRProtocol()
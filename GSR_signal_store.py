@@ -0,0 +1,78 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+"Raw GSR sheets as contiguous float32 memory-mapped arrays (one row per subject), opened without parsing"
+
+STORE_VERSION = 1
+STORE_DTYPE = np.float32
+
+
+def header_path_for(store_path: str) -> str:
+    return store_path + ".json"
+
+
+def write_signal_store(df_data: pd.DataFrame, store_path: str) -> str:
+    """
+    Writes the sheet as a subjects x samples float32 array to store_path, and next to it a small
+    json header (subjects, samples, and every subject's length up to its last valid sample;
+    shorter recordings are NaN padded). Non numeric cells become NaN.
+    """
+    values = df_data.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=STORE_DTYPE).T
+    values = np.ascontiguousarray(values)
+    is_valid = ~np.isnan(values)
+    n_samples = values.shape[1]
+    lengths = np.where(is_valid.any(axis=1), n_samples - np.argmax(is_valid[:, ::-1], axis=1), 0)
+
+    header = {
+        "version": STORE_VERSION,
+        "dtype": np.dtype(STORE_DTYPE).name,
+        "subjects": df_data.columns.astype(str).tolist(),
+        "n_samples": int(n_samples),
+        "lengths": [int(n) for n in lengths],
+    }
+    tmp_path = store_path + ".tmp"
+    values.tofile(tmp_path)
+    os.replace(tmp_path, store_path)
+    with open(header_path_for(store_path) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(header, f)
+    os.replace(header_path_for(store_path) + ".tmp", header_path_for(store_path))
+    return store_path
+
+
+class SignalStore:
+    """
+    A read-only memory map of a sheet written by write_signal_store.
+    Looks enough like the data DataFrame for the GSR code: columns are the subject ids,
+    len() is the number of samples and store[subject] is that subject's samples (no copy).
+    """
+    def __init__(self, store_path):
+        with open(header_path_for(store_path), encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != STORE_VERSION:
+            raise ValueError(f"{store_path} was written by another version of the signal store")
+
+        self.path = store_path
+        self.subjects = header["subjects"]
+        self.columns = pd.Index(self.subjects)
+        self.row_index = {subj_id: i for i, subj_id in enumerate(self.subjects)}
+        self.n_samples = header["n_samples"]
+        self.lengths = dict(zip(self.subjects, header["lengths"]))
+
+        shape = (len(self.subjects), self.n_samples)
+        if shape[0] * shape[1] == 0:
+            # an empty file cannot be mapped
+            self.values = np.empty(shape, dtype=header["dtype"])
+        else:
+            self.values = np.memmap(store_path, dtype=header["dtype"], mode="r", shape=shape)
+
+    def __len__(self):
+        return self.n_samples
+
+    def __getitem__(self, subj_id) -> pd.Series:
+        return pd.Series(self.values[self.row_index[subj_id]], name=subj_id, copy=False)
+
+    def column(self, subj_id) -> np.ndarray:
+        """the subject's samples up to its last valid one (a view)"""
+        return self.values[self.row_index[subj_id], :self.lengths[subj_id]]
@@ -7,39 +7,38 @@ import matplotlib
 matplotlib.use('Agg') 
 import matplotlib.pyplot as plt
 
-SAMPLING_RATE = 10
-STARTING_OFFSET = 10
-STANDARD_CONDITIONS = ['neut1', 'stress', 'neut2']
-TRAUMA_CONDITION = 'trauma'
-STANDARD_SEGMENTS = {
-    'Baseline': [10,-STARTING_OFFSET], 
-    'Audio': [60,0],   
-    'Imagery': [30,60],  
-    'Recovery_1': [30,90],
-    'Recovery_2': [30,120],
-}
-TRAUMA_AUDIO_END_LABEL = 'trauma_end'  
-RECORDING_END_LABEL = 'end of recording' 
-RECOVERY_BLOCK_DURATION = 30 
-BASELINE_DURATION = STANDARD_SEGMENTS['Baseline'][0]
-BASELINE_OFFSET = STANDARD_SEGMENTS['Baseline'][1]
-IMAGERY_DURATION = STANDARD_SEGMENTS['Imagery'][0]
-AUDIO_OFFSET = STANDARD_SEGMENTS['Audio'][1]
+from GSR_workbook import load_gsr_sheets, timing_sheet_for
+from render_cache import RenderCache, render_key
+from GSR_protocol import (
+    DEFAULT_PROTOCOL,
+    GSRProtocol,
+    SAMPLING_RATE,
+    STARTING_OFFSET,
+    STANDARD_SEGMENTS,
+    TRAUMA_AUDIO_END_LABEL,
+    RECORDING_END_LABEL,
+    PLOT_SEGMENT_DURATION_SEC,
+)
+from GSR_windows import EventWindows, preprocess
+
 COLORS = {'neut1': 'lightblue', 'stress': 'purple', 'neut2': 'blue', 'trauma': 'red'}
-PLOT_SEGMENT_DURATION_SEC = 210 #gives full cover for trauma 
-PLOT_SEGMENT_SAMPLES = int(PLOT_SEGMENT_DURATION_SEC * SAMPLING_RATE)
 OUTPUT_DIR = '/Users/yuvalnadam/Desktop/CS/Cognition/MDMA/2ndYear/data/GSR/Diagnostic_Figures_Output'
+# settings that change the diagnostic figure; part of every render cache key
+DIAGNOSTIC_RENDER_PARAMS = {
+    'starting_offset': STARTING_OFFSET,
+    'segment_sec': PLOT_SEGMENT_DURATION_SEC,
+    'version': 1,
+}
+
+def diagnostic_render_params(protocol: GSRProtocol) -> dict:
+    return {**DIAGNOSTIC_RENDER_PARAMS, 'sampling_rate': protocol.sampling_rate, 'protocol': protocol.to_dict()}
 # ----------------------------------------------------------------------
 
 def timing_to_dataframe(file_path: str, sheet_to_load:str):
-    df = pd.read_excel(file_path, sheet_name=sheet_to_load, index_col=0, na_values=['NA', ''])
-    df.columns = df.columns.astype(str)
-    return df
+    return load_gsr_sheets(file_path, timing_sheets=[sheet_to_load])[sheet_to_load]
 
 def GSR_to_dataframe(file_path: str, sheet_to_load:str):
-    df = pd.read_excel(file_path, sheet_name=sheet_to_load, na_values=['NA', ''])
-    df.columns = df.columns.astype(str)
-    return df
+    return load_gsr_sheets(file_path, data_sheets=[sheet_to_load])[sheet_to_load]
 
 
 # Subplot 1
@@ -118,83 +117,56 @@ def plot_raw_data_and_events(gsr_series, subj_id, df_timing, plot_start_sec):
     plt.savefig(output_filename)
     print(f"\n subplot1 : {output_filename}")
 
-def get_baseline_mean(event, id_str, df_timing, df_data):
-    
-    try:
-        start_time = df_timing.loc[event, id_str]
-    except KeyError:
-        return np.nan
-    
-    if pd.isna(start_time): return np.nan 
-    try:
-        start_time_float = float(start_time)
-    except (ValueError, TypeError): 
-        return np.nan
-        
-    onset_sample_abs = int(start_time_float * SAMPLING_RATE)
-    baseline_start_sample = onset_sample_abs + int(BASELINE_OFFSET * SAMPLING_RATE)
-    baseline_end_sample = baseline_start_sample + int(BASELINE_DURATION * SAMPLING_RATE)
-
-    if baseline_start_sample < 0 or baseline_end_sample > len(df_data):
-        return np.nan
-        
-    try:
-        baseline_series = df_data[id_str].iloc[baseline_start_sample:baseline_end_sample]
-    except KeyError:
-        return np.nan
-
-    return baseline_series.mean()
-
-def create_diagnostic_figures(subj_id, df_timing, df_data, data_sheet_name):    
+def create_diagnostic_figures(subj_id, df_timing, df_data, data_sheet_name, windows: EventWindows = None,
+                              protocol: GSRProtocol = DEFAULT_PROTOCOL, output_dir=None):
+    """
+    windows: the sheet's resolved EventWindows, so all subjects share one timing resolution;
+    built for this subject alone (following protocol) when not given.
+    output_dir: where the figure is saved, OUTPUT_DIR by default.
+    """
+    output_dir = output_dir or OUTPUT_DIR
     id_str = str(subj_id)
+    if windows is None:
+        windows = EventWindows(df_timing, df_data, [id_str], protocol)
+    protocol = windows.protocol
+    sampling_rate = protocol.sampling_rate
+    audio_duration_sec = protocol.standard_segments.get('Audio', [0])[0]
 
     #creating two figures - subplot1,subplot2
     fig, axes = plt.subplots(2, 1, figsize=(15, 8), sharex=False)
     
     # --- Subplot 1: Raw GSR Signal ---
     try:
-        neut1_onset_sec = df_timing.loc['neut1', id_str]
-        plot_start_sec = neut1_onset_sec - STARTING_OFFSET 
-        plot_end_sec = df_timing.loc[RECORDING_END_LABEL, id_str]
-        
-        if pd.isna(neut1_onset_sec) or pd.isna(plot_end_sec):
-            raise ValueError("(NaN).")
-         
-        plot_start_sample = int(plot_start_sec * SAMPLING_RATE)
-        plot_end_sample = int(plot_end_sec * SAMPLING_RATE)
+        raw_gsr_series = windows.slice(id_str, 'recording_plot')
+        if raw_gsr_series is None:
+            raise ValueError(windows.reason(id_str, 'recording_plot'))
+        plot_start_sec = windows.onset_sec(id_str, protocol.events[0]) - protocol.starting_offset
         
-        raw_gsr_series = df_data[id_str].iloc[plot_start_sample : plot_end_sample]
-        
-        time_axis = np.arange(0, len(raw_gsr_series) / SAMPLING_RATE, 1 / SAMPLING_RATE)
+        time_axis = np.arange(0, len(raw_gsr_series) / sampling_rate, 1 / sampling_rate)
         if len(time_axis) > len(raw_gsr_series): time_axis = time_axis[:len(raw_gsr_series)]
 
-        axes[0].plot(time_axis, raw_gsr_series.values, color='gray', alpha=0.7)
+        axes[0].plot(time_axis, raw_gsr_series, color='gray', alpha=0.7)
         axes[0].set_title(f'Raw GSR Signal and Events (Subject {id_str})')
         axes[0].set_ylabel('Raw GSR Amplitude')
 
         # adding markers (Audio ---- , Imagery: - - - )
-        for event in ['neut1', 'stress', 'neut2', 'trauma']:
-            try:
-                onset_sec = df_timing.loc[event, str(subj_id)]
-            
-                if pd.isna(onset_sec):
-                    print(f"Did not mark {event} is missing in time table")
-                    continue
-                
-                if event == 'trauma':
-                    end_audio_sec = df_timing.loc[TRAUMA_AUDIO_END_LABEL, id_str]
-                else:
-                    end_audio_sec = onset_sec + STANDARD_SEGMENTS['Audio'][0]
-
-                onset_relative_time = onset_sec - plot_start_sec
-                end_audio_relative_time = end_audio_sec - plot_start_sec
-                
-                axes[0].axvline(x=onset_relative_time, color=COLORS[event], linestyle='-', linewidth=1.5, label=f'{event} Audio Onset')
-                axes[0].axvline(x=end_audio_relative_time, color=COLORS[event], linestyle='--', linewidth=1.5)
-            except Exception:
+        for event in protocol.events:
+            onset_sec = windows.onset_sec(id_str, event)
+            if pd.isna(onset_sec):
                 print(f"Did not mark {event} is missing in time table")
                 continue
 
+            if event == protocol.trauma_condition:
+                end_audio_sec = windows.onset_sec(id_str, protocol.trauma_audio_end_label)
+            else:
+                end_audio_sec = onset_sec + audio_duration_sec
+
+            onset_relative_time = onset_sec - plot_start_sec
+            end_audio_relative_time = end_audio_sec - plot_start_sec
+
+            axes[0].axvline(x=onset_relative_time, color=COLORS.get(event), linestyle='-', linewidth=1.5, label=f'{event} Audio Onset')
+            axes[0].axvline(x=end_audio_relative_time, color=COLORS.get(event), linestyle='--', linewidth=1.5)
+
         axes[0].legend()
         axes[0].grid(axis='y', linestyle='--')
         
@@ -207,53 +179,26 @@ def create_diagnostic_figures(subj_id, df_timing, df_data, data_sheet_name):
     # ----------------------------------------------------
     
     normalized_segments = {}
-    for event in ['neut1', 'stress', 'neut2', 'trauma']:
-        try:
-            baseline_mean = get_baseline_mean(event, id_str, df_timing, df_data)
-            
-            if pd.isna(baseline_mean) or baseline_mean <= 0:
-                print(f" for {event} baseline value - {baseline_mean} (it must be positive) - skipping the event")
-                continue
-
-            # extract the full segment
-            onset_sec = df_timing.loc[event, id_str]
-            segment_start_sec = onset_sec - STARTING_OFFSET
-            
-            segment_start_sample = int(segment_start_sec * SAMPLING_RATE)
-            segment_end_sample = segment_start_sample + PLOT_SEGMENT_SAMPLES
-            
-            if segment_end_sample > len(df_data) or segment_start_sample < 0: 
-                if segment_start_sample < 0:
-                    reason = "segment starts before starting of audio(Index < 0)"
-                else:
-                    reason = "segemnt continue after the recording ended"
-                
-                print(f"'{event}' for {id_str} missing beacuse: {reason}. we are skipping the segment!")
-                continue 
-
-            segment_series = df_data[id_str].iloc[segment_start_sample : segment_end_sample]
-            normalized_series = segment_series / baseline_mean
-            normalized_segments[event] = normalized_series
-            
-        except Exception:
+    for event in protocol.events:
+        normalized_series, reason = windows.normalized_segment(id_str, event)
+        if normalized_series is None:
+            print(f"'{event}' for {id_str} missing beacuse: {reason}. we are skipping the segment!")
             continue
+        normalized_segments[event] = normalized_series
 
     # plotting all
     for event, series in normalized_segments.items():
-        time_axis_relative = np.linspace(-STARTING_OFFSET, PLOT_SEGMENT_DURATION_SEC - STARTING_OFFSET, len(series))
+        time_axis_relative = np.linspace(
+            -protocol.starting_offset, protocol.plot_segment_duration_sec - protocol.starting_offset, len(series)
+        )
         
-        axes[1].plot(time_axis_relative, series.values, color=COLORS[event], label=event)
-        try:
-            if event == 'trauma':
-                end_audio_sec = df_timing.loc[TRAUMA_AUDIO_END_LABEL, id_str]
-                audio_duration = end_audio_sec - df_timing.loc[event, id_str]
-            else:
-                audio_duration = STANDARD_SEGMENTS['Audio'][0]
+        axes[1].plot(time_axis_relative, series, color=COLORS.get(event), label=event)
+        if event == protocol.trauma_condition:
+            audio_duration = windows.onset_sec(id_str, protocol.trauma_audio_end_label) - windows.onset_sec(id_str, event)
+        else:
+            audio_duration = audio_duration_sec
 
-            axes[1].axvline(x=audio_duration, color=COLORS[event], linestyle='--', alpha=0.7)
-
-        except Exception as e:
-            continue
+        axes[1].axvline(x=audio_duration, color=COLORS.get(event), linestyle='--', alpha=0.7)
 
     axes[1].set_title('Baseline-Normalised Segments ')
     axes[1].set_xlabel('Time Relative to Audio Onset (Seconds)')
@@ -264,69 +209,90 @@ def create_diagnostic_figures(subj_id, df_timing, df_data, data_sheet_name):
     axes[1].grid(axis='y', linestyle='--')
     
     # output dir
-    os.makedirs(OUTPUT_DIR, exist_ok=True) 
+    os.makedirs(output_dir, exist_ok=True) 
     
-    output_filename = os.path.join(OUTPUT_DIR, f'Diagnostic_Figure_Subj_{id_str}_{data_sheet_name}.png')    
+    output_filename = os.path.join(output_dir, diagnostic_figure_filename(id_str, data_sheet_name))
     plt.savefig(output_filename)
     plt.close(fig) 
 
-def preprocess(df_timing,df_data):
+def diagnostic_figure_filename(id_str, data_sheet_name):
+    return f'Diagnostic_Figure_Subj_{id_str}_{data_sheet_name}.png'
+
+def diagnostic_render_key(subj_id, df_timing, df_data, data_sheet_name, protocol: GSRProtocol = DEFAULT_PROTOCOL):
     """
-    takes as an input timing dataframe and data dataframe and returns common subjects id list. 
-    if some is missing it alerts and "ignores" the missing data
+    hash of the subject's timing column (with the event names), its raw GSR column, the plot settings
+    and the protocol
     """
-    timing_columns_ordered = df_timing.columns.astype(str).tolist()
-    timing_subjects_set = set(timing_columns_ordered)
-    data_subjects_set = set(df_data.columns.astype(str).tolist())
-    
-    missing_in_data = timing_subjects_set - data_subjects_set
-    missing_in_timing = data_subjects_set - timing_subjects_set
-    
-    if missing_in_data:
-        print(f"subjects with time table and no data(df_data): {sorted(list(missing_in_data))}")
-    
-    if missing_in_timing:
-        print(f"some subject are missing time table(df_timing): {sorted(list(missing_in_timing))}")
-    
-    subjects = [subj for subj in timing_columns_ordered if subj in data_subjects_set]
-    
-    if not subjects:
-        print("no common subjects ids in the data")
-        return pd.DataFrame()
-    return subjects
+    return render_key(
+        [df_timing[[subj_id]].reset_index(), df_data[subj_id]],
+        sheet=data_sheet_name, **diagnostic_render_params(protocol)
+    )
+
+def draw_sheet_figures(timing, data, sheet_name, cache: RenderCache, windows: EventWindows = None,
+                       protocol: GSRProtocol = DEFAULT_PROTOCOL):
+    """
+    Draws the diagnostic figure of every subject in one sheet into the cache's directory,
+    skipping the ones the cache has up to date. windows: the sheet's resolved EventWindows,
+    when the caller already has them (their protocol is used).
+    """
+    if windows is None:
+        # the timing of every subject is resolved once for the whole sheet
+        windows = EventWindows(timing, data, preprocess(timing, data), protocol)
+
+    for subj_id in windows.subjects:
+        filename = diagnostic_figure_filename(subj_id, sheet_name)
+        key = diagnostic_render_key(subj_id, timing, data, sheet_name, windows.protocol)
+        if cache.is_fresh(filename, key):
+            print(f"--- subject {subj_id} unchanged, keeping {filename} ---")
+            continue
+
+        print(f"--- plotting for subject: {subj_id} ---")
+        create_diagnostic_figures(subj_id, timing, data, sheet_name, windows, output_dir=cache.output_dir)
+        cache.record(filename, key)
 
-def process_all_diagnostic_figures(file_path, data_sheet_names):
+def process_all_diagnostic_figures(file_path, data_sheet_names, force=False, protocol: GSRProtocol = DEFAULT_PROTOCOL):
+    """
+    Draws the diagnostic figure of every subject in every sheet. A subject is skipped when
+    its timing, its data and the plot settings did not change since its figure was drawn
+    (see render_cache); force=True redraws everything.
+    Data recorded above the protocol's sampling rate is averaged down to it first.
+    """
+    cache = RenderCache(OUTPUT_DIR, force=force)
+
+    # every sheet is parsed in one pass over the workbook (or read from its cache)
+    try:
+        sheets = load_gsr_sheets(
+            file_path,
+            data_sheets=data_sheet_names,
+            timing_sheets=[timing_sheet_for(name) for name in data_sheet_names],
+            skip_missing=True,
+        )
+    except Exception as e:
+        print(f"\n error while loading {file_path}: {e}")
+        return
 
     for sheet_name in data_sheet_names:
         
-        timing_sheet_name = f'timing_{sheet_name[-1]}' 
+        timing_sheet_name = timing_sheet_for(sheet_name)
 
         try:
-            timing = timing_to_dataframe(file_path, timing_sheet_name)
-            data = GSR_to_dataframe(file_path, sheet_name)
-            
-            subjects_to_process = preprocess(timing, data) 
-            
-            for subj_id in subjects_to_process:
-                print(f"--- plotting for subject: {subj_id} ---")
-                create_diagnostic_figures(subj_id, timing, data, sheet_name)
+            timing = sheets[timing_sheet_name]
+            data = protocol.resample_frame(sheets[sheet_name])
+            draw_sheet_figures(timing, data, sheet_name, cache, protocol=protocol)
 
         except Exception as e:
             print(f"\n error while working on sheet {sheet_name}: {e}")
             continue
+        finally:
+            cache.save()
 
     
 
 if __name__ == "__main__":
     FILE_PATH = '/Users/yuvalnadam/Desktop/CS/Cognition/MDMA/2ndYear/data/GSR/GSR_RawData.xlsx' 
-    SHEET_DATA = 'T1'
-    SHEET_TIMING = 'timing_1'
     #SUBJECT_ID_TO_PLOT = 18
     DATA_SHEET_NAMES = ['T1', 'T2']
 
-    timing = timing_to_dataframe(FILE_PATH, SHEET_TIMING)
-    data = GSR_to_dataframe(FILE_PATH, SHEET_DATA)
-
     process_all_diagnostic_figures(FILE_PATH, DATA_SHEET_NAMES)
 
     """
@@ -1,19 +1,54 @@
 import os
+import warnings
+import numpy as np
 import pandas as pd
 
 # Import your existing functions
-from GSR_to_tables import (
-    timing_to_dataframe,
-    GSR_to_dataframe,
-    preprocess,
-    SAMPLING_RATE,
-)
+from GSR_protocol import DEFAULT_PROTOCOL, GSRProtocol
+from GSR_windows import EventWindows, preprocess
+from GSR_workbook import load_gsr_sheets
 
+# how every window of sample_step samples is summarized in the matrix
+DECIMATION_MODES = ("point", "mean", "median", "minmax")
 
-def extract_samples_for_label(label: str, df_timing, df_data, subjects, sample_step=10):
+
+def decimate(values: np.ndarray, sample_step: int, mode: str = "point") -> dict:
+    """
+    Summarizes consecutive windows of sample_step samples (the last one may be shorter).
+    - point: the first sample of every window (a strided view, no copy)
+    - mean / median: NaN-ignoring mean / median of every window
+    - minmax: min and max of every window (envelope)
+    Returns {column suffix: array}: "" for point/mean/median, "_min" and "_max" for minmax.
+    """
+    if mode == "point":
+        return {"": values[::sample_step]}
+    if mode not in DECIMATION_MODES:
+        raise ValueError(f"Unknown decimation mode '{mode}', expected one of {DECIMATION_MODES}")
+
+    floats = pd.to_numeric(values, errors="coerce").astype(float)
+    n_windows = -(-len(floats) // sample_step)
+    windows = np.full(n_windows * sample_step, np.nan)
+    windows[:len(floats)] = floats
+    windows = windows.reshape(n_windows, sample_step)
+
+    # all-NaN windows give NaN without a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if mode == "mean":
+            return {"": np.nanmean(windows, axis=1)}
+        if mode == "median":
+            return {"": np.nanmedian(windows, axis=1)}
+        return {"_min": np.nanmin(windows, axis=1), "_max": np.nanmax(windows, axis=1)}
+
+
+def extract_samples_for_label(label: str, df_timing, df_data, subjects, sample_step=10, mode="point",
+                              windows: EventWindows = None, protocol: GSRProtocol = DEFAULT_PROTOCOL):
     """
     Extracts every Nth sample for a given label across all subjects.
     The timing table contains START times for each label (except neut1).
+    mode selects how every N samples are summarized (see decimate).
+    windows: the sheet's resolved EventWindows, so several labels (and the other GSR outputs)
+    share one timing resolution; built here (following protocol) when not given.
 
     - neut1: from neut1_time to stress_time
     - stress: from stress_time to neut2_time
@@ -22,170 +57,73 @@ def extract_samples_for_label(label: str, df_timing, df_data, subjects, sample_s
     """
     label_data = {}
 
-    # Define the next label for each condition (to get end time)
-    next_label = {
-        "neut1": "stress",
-        "stress": "neut2",
-        "neut2": "trauma",
-        "trauma": None,  # ends at 'end of recording'
-    }
+    if windows is None:
+        windows = EventWindows(
+            df_timing, df_data, [subj_id for subj_id in subjects if subj_id in df_data.columns], protocol
+        )
+    sampling_rate = windows.protocol.sampling_rate
 
-    next_lbl = next_label.get(label)
-    if next_lbl is None and label != "trauma":
+    if label not in windows.protocol.events:
         print(f"Unknown label: {label}")
         return label_data
 
     for subj_id in subjects:
         # Make sure the subject exists in data
-        if subj_id not in df_data.columns:
+        if subj_id not in windows.subject_index:
             print(f"Subject {subj_id} not found in data, skipping.")
             continue
 
-        # --- 1. Get START time from timing table ---
-
-        try:
-            start_time = df_timing.loc[label, subj_id]
-        except KeyError:
-            print(f"Label '{label}' not found for subject {subj_id}")
+        # the span from the label's start to the next label's start (or the end of recording),
+        # clamped to the available data
+        subject_data = windows.slice(subj_id, f"{label}_span")
+        if subject_data is None:
+            print(f"Skipping subject {subj_id}, label {label}: {windows.reason(subj_id, f'{label}_span')}")
             continue
 
-        if pd.isna(start_time):
-            print(f"Start time NaN for label '{label}', subject {subj_id}")
-            continue
-
-        try:
-            start_time_float = float(start_time)
-        except (ValueError, TypeError):
-            print(f"Start time non-numeric for label '{label}', subject {subj_id}: {start_time}")
-            continue
-
-        # --- 2. Get END time (next label start, or end of recording) ---
-
-        if label == "trauma":
-            # For trauma, use 'end of recording' or 'trauma_end' as the end
-            end_time_float = None
-            for row_name in ["end of recording", "trauma_end"]:
-                if row_name in df_timing.index:
-                    val = df_timing.loc[row_name, subj_id]
-                    if not pd.isna(val):
-                        try:
-                            end_time_float = float(val)
-                            break
-                        except (ValueError, TypeError):
-                            pass
-
-            if end_time_float is None:
-                print(f"No valid end time found for trauma, subject {subj_id}")
-                continue
-        else:
-            # For other labels, end time is the start of the next label
-            try:
-                end_time = df_timing.loc[next_lbl, subj_id]
-            except KeyError:
-                print(f"Next label '{next_lbl}' not found for subject {subj_id}")
-                continue
-
-            if pd.isna(end_time):
-                print(f"End time NaN for next label '{next_lbl}', subject {subj_id}")
-                continue
-
-            try:
-                end_time_float = float(end_time)
-            except (ValueError, TypeError):
-                print(f"End time non-numeric for '{next_lbl}', subject {subj_id}: {end_time}")
-                continue
-
-        # --- 3. Convert times to sample indices ---
-
-        start_sample = int(start_time_float * SAMPLING_RATE)
-        end_sample = int(end_time_float * SAMPLING_RATE)
-
-        if end_sample <= start_sample:
-            print(
-                f"Invalid sample range for subject {subj_id}, label {label}: "
-                f"{start_sample}–{end_sample}"
-            )
-            continue
-
-        # --- 4. Slice the subject's column STRICTLY by timing ---
-
-        col = df_data[subj_id].reset_index(drop=True)
-        n_available = len(col)
-
-        # Check if start is within bounds
-        if start_sample >= n_available:
-            print(
-                f"Start sample {start_sample} beyond available data ({n_available}) "
-                f"for subject {subj_id}, label {label}"
-            )
-            continue
-
-        # Clamp end_sample to available data
-        end_sample_clamped = min(end_sample, n_available)
-
-        subject_data = col.iloc[start_sample:end_sample_clamped]
-
-        # Expected length from timing (in samples)
-        expected_len = end_sample - start_sample
-
-        # Strict truncation to never pass the timing end
-        if len(subject_data) > expected_len:
-            subject_data = subject_data.iloc[:expected_len]
-
-        # Debug for subject 19 stress
-        # if str(subj_id) == "19" and label == "stress":
-        #     print(f"\n*** DEBUG SUBJECT {subj_id} – {label.upper()} ***")
-        #     print(f"Timing start: {start_time_float} sec")
-        #     print(f"Timing end:   {end_time_float} sec")
-        #     print(f"start_sample: {start_sample}")
-        #     print(f"end_sample:   {end_sample}")
-        #     print(f"len(col):     {n_available}")
-        #     print(f"len(subject_data): {len(subject_data)}")
-        #     print(f"expected_len (samples): {expected_len}")
-        #     print(f"\nFirst 5 raw values from col at start_sample:")
-        #     print(col.iloc[start_sample:start_sample + 5].to_list())
-        #     print(f"\nFirst 5 values in subject_data:")
-        #     print(subject_data.iloc[:5].to_list())
-        #     print(f"\nRaw value at sample index {start_sample}: {col.iloc[start_sample]}")
-        #     print(
-        #         f"Value at 256 sec (sample {int(256 * SAMPLING_RATE)}): {col.iloc[int(256 * SAMPLING_RATE)] if int(256 * SAMPLING_RATE) < len(col) else 'OUT OF BOUNDS'}")
-        #     print("*** END DEBUG ***\n")
-
-        samples_at_intervals = []
-        for i in range(0, len(subject_data), sample_step):
-            samples_at_intervals.append(subject_data.iloc[i])
+        decimated = decimate(subject_data, sample_step, mode)
+        samples_at_intervals = next(iter(decimated.values()))
 
         # Save
-        label_data[f"Subject_{subj_id}"] = samples_at_intervals
+        for suffix, samples in decimated.items():
+            label_data[f"Subject_{subj_id}{suffix}"] = samples
 
         # Debug info
-        duration_sec = end_time_float - start_time_float
+        start_sample, end_sample = windows.bounds(subj_id, f"{label}_span")
         print(
-            f"  Subject {subj_id}: {start_time_float:.1f}-{end_time_float:.1f} sec "
-            f"= {duration_sec:.1f} sec ({len(subject_data)} samples) "
+            f"  Subject {subj_id}: {start_sample / sampling_rate:.1f}-{end_sample / sampling_rate:.1f} sec "
+            f"= {(end_sample - start_sample) / sampling_rate:.1f} sec ({len(subject_data)} samples) "
             f"-> {len(samples_at_intervals)} extracted"
         )
 
     return label_data
 
 
-def create_combined_excel(df_timing, df_data, timepoint, sample_step=10):
+def create_combined_excel(df_timing, df_data, timepoint, sample_step=10, mode="point",
+                          windows: EventWindows = None, protocol: GSRProtocol = DEFAULT_PROTOCOL):
     """
     Creates sheets for a given timepoint (T1 or T2).
-    Each sheet has subjects as columns and samples (every Nth) as rows.
+    Each sheet has subjects as columns and samples (every Nth, or a summary of every N
+    samples depending on mode, see decimate) as rows.
+    windows: the sheet's resolved EventWindows, when the caller already has them (their protocol is used).
     """
-    subjects = preprocess(df_timing, df_data)
+    subjects = windows.subjects if windows is not None else preprocess(df_timing, df_data)
 
-    if not subjects:
+    if len(subjects) == 0:
         print(f"No subjects to process for {timepoint}")
         return None
 
-    labels = ["neut1", "stress", "neut2", "trauma"]
+    # the timing is resolved (and every subject column converted) once, for all labels
+    if windows is None:
+        windows = EventWindows(df_timing, df_data, subjects, protocol)
+
+    labels = windows.protocol.events
     sheets_data = {}
 
     for label in labels:
         print(f"\nProcessing {timepoint} - label: {label}")
-        label_data = extract_samples_for_label(label, df_timing, df_data, subjects, sample_step)
+        label_data = extract_samples_for_label(
+            label, df_timing, df_data, subjects, sample_step, mode, windows
+        )
 
         if not label_data:
             print(f"No data found for {timepoint} - label: {label}")
@@ -226,6 +164,13 @@ if __name__ == "__main__":
 
     all_sheets = {}
 
+    # Parse every data and timing sheet in one pass over the workbook (or read them from its cache)
+    workbook_sheets = load_gsr_sheets(
+        file_path,
+        data_sheets=[sheets["data_sheet"] for sheets in timepoints.values()],
+        timing_sheets=[sheets["timing_sheet"] for sheets in timepoints.values()],
+    )
+
     # Process each timepoint
     for timepoint, sheets in timepoints.items():
         print(f"\n{'=' * 60}")
@@ -236,8 +181,8 @@ if __name__ == "__main__":
             f"Loading data from sheets: {sheets['data_sheet']} and {sheets['timing_sheet']}..."
         )
 
-        timing = timing_to_dataframe(file_path, sheets["timing_sheet"])
-        data = GSR_to_dataframe(file_path, sheets["data_sheet"])
+        timing = workbook_sheets[sheets["timing_sheet"]]
+        data = workbook_sheets[sheets["data_sheet"]]
 
         # Create sheets for this timepoint
         timepoint_sheets = create_combined_excel(timing, data, timepoint, sample_step=10)
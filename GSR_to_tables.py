@@ -2,49 +2,39 @@ import os
 import pandas as pd
 import math 
 import numpy as np
-SAMPLING_RATE = 10
-STANDARD_CONDITIONS = ['neut1', 'stress', 'neut2'] #act the same
-TRAUMA_CONDITION = 'trauma'
-#[duration,offset]
-STANDARD_SEGMENTS = {
-    'Baseline': [10,-10], 
-    'Audio': [60,0],   
-    'Imagery': [30,60],  
-    'Recovery_1': [30,90],
-    'Recovery_2': [30,120],
-}
-
-TRAUMA_AUDIO_END_LABEL = 'trauma_end'  
-RECORDING_END_LABEL = 'end of recording' 
-RECOVERY_BLOCK_DURATION = 30 
-BASELINE_DURATION = STANDARD_SEGMENTS['Baseline'][0]
-BASELINE_OFFSET = STANDARD_SEGMENTS['Baseline'][1]
-IMAGERY_DURATION = STANDARD_SEGMENTS['Imagery'][0]
-AUDIO_OFFSET = STANDARD_SEGMENTS['Audio'][1]
 
+from GSR_workbook import load_gsr_sheets
+from GSR_protocol import (
+    DEFAULT_PROTOCOL,
+    GSRProtocol,
+    SAMPLING_RATE,
+    STANDARD_CONDITIONS,
+    TRAUMA_CONDITION,
+    STANDARD_SEGMENTS,
+    TRAUMA_AUDIO_END_LABEL,
+    RECORDING_END_LABEL,
+    RECOVERY_BLOCK_DURATION,
+    BASELINE_DURATION,
+    BASELINE_OFFSET,
+    IMAGERY_DURATION,
+    AUDIO_OFFSET,
+)
+from GSR_windows import EventWindows, preprocess, segment_names
 
 
 def timing_to_dataframe(file_path: str, sheet_to_load:str):
     """
     Reads an timing excel file, replaces empty cells with 'NA', and changes first colums name to "event"
-    returns Dataframe
+    returns Dataframe (from the workbook cache when it is up to date, see GSR_workbook)
     """
-    df = pd.read_excel(file_path, sheet_name=sheet_to_load, index_col=0, na_values=['NA', ''])
-    df.columns = df.columns.astype(str)
-    #df = df.rename(columns={'Unnamed: 0': "event"})
-
-
-    return df
+    return load_gsr_sheets(file_path, timing_sheets=[sheet_to_load])[sheet_to_load]
 
 def GSR_to_dataframe(file_path: str, sheet_to_load:str):
     """
     Reads an timing excel file, replaces empty cells with 'NA', and changes first colums name to "event"
-    returns Dataframe
+    returns Dataframe (from the workbook cache when it is up to date, see GSR_workbook)
     """
-
-    df = pd.read_excel(file_path, sheet_name=sheet_to_load, na_values=['NA', ''])
-    df.columns = df.columns.astype(str)
-    return df
+    return load_gsr_sheets(file_path, data_sheets=[sheet_to_load])[sheet_to_load]
 
 def get_timing_by_id(df, id:int):
     return df[id]
@@ -97,21 +87,48 @@ def avg_by_event_and_id(event:str, id, df_timing, df_data, seconds,offset_sec: i
 
     return mean_val
 
-def create_statistic_table(df_timing, df_data):
+def statistic_table_columns():
+    return [f'{name}_Mean' for name in segment_names()]
+
+def create_statistic_table(df_timing, df_data, vectorized: bool = True, windows: EventWindows = None,
+                           protocol: GSRProtocol = DEFAULT_PROTOCOL):
+    """
+    One row per subject, one column per condition segment mean.
+    windows: the sheet's resolved EventWindows, when the caller already has them (their protocol is used).
+    vectorized=False uses the original per subject and segment loop, which knows only the default protocol.
+    """
+    if vectorized:
+        return create_statistic_table_vectorized(df_timing, df_data, windows, protocol)
+    return create_statistic_table_by_loop(df_timing, df_data)
+
+def create_statistic_table_vectorized(df_timing, df_data, windows: EventWindows = None,
+                                      protocol: GSRProtocol = DEFAULT_PROTOCOL):
+    """
+    create_statistic_table computed for all subjects and segments at once from the sheet's
+    resolved windows (see GSR_windows); every mean comes from a cumulative sum.
+    """
+    if windows is None:
+        subjects = preprocess(df_timing,df_data)
+        if len(subjects) == 0:
+            subjects = []
+        windows = EventWindows(df_timing, df_data, subjects, protocol)
+
+    names = windows.statistic_names()
+    means = windows.means(names)
+    # a subject without all three trauma times gets no trauma values (its baseline included)
+    is_trauma = np.array([name.startswith(f'{windows.protocol.trauma_condition}_') for name in names])
+    means[np.ix_(~windows.trauma_complete, is_trauma)] = np.nan
+
+    df_stats = pd.DataFrame(means, index=windows.subjects, columns=[f'{name}_Mean' for name in names], dtype=float)
+    df_stats.index.name = 'Subject_ID'
+    return df_stats
+
+def create_statistic_table_by_loop(df_timing, df_data):
 
     subjects = preprocess(df_timing,df_data)
     
     #building the table
-    stats_cols = []
-    for cond in STANDARD_CONDITIONS:
-        for seg in STANDARD_SEGMENTS.keys():
-            stats_cols.append(f'{cond}_{seg}_Mean')
-    
-    trauma_base_segments = ['Baseline', 'Audio', 'Imagery']
-    for seg in trauma_base_segments:
-        stats_cols.append(f'{TRAUMA_CONDITION}_{seg}_Mean')
-    for i in range(1, 10): 
-        stats_cols.append(f'{TRAUMA_CONDITION}_Recovery_{i}_Mean')
+    stats_cols = statistic_table_columns()
 
 
     df_stats = pd.DataFrame(index=subjects, columns=stats_cols, dtype=float)
@@ -191,31 +208,6 @@ def create_statistic_table(df_timing, df_data):
             
     return df_stats
 
-def preprocess(df_timing,df_data):
-    """
-    takes as an input timing dataframe and data dataframe and returns common subjects id list. 
-    if some is missing it alerts and "ignores" the missing data
-    """
-    timing_columns_ordered = df_timing.columns.astype(str).tolist()
-    timing_subjects_set = set(timing_columns_ordered)
-    data_subjects_set = set(df_data.columns.astype(str).tolist())
-    
-    missing_in_data = timing_subjects_set - data_subjects_set
-    missing_in_timing = data_subjects_set - timing_subjects_set
-    
-    if missing_in_data:
-        print(f"subjects with time table and no data(df_data): {sorted(list(missing_in_data))}")
-    
-    if missing_in_timing:
-        print(f"some subject are missing time table(df_timing): {sorted(list(missing_in_timing))}")
-    
-    subjects = [subj for subj in timing_columns_ordered if subj in data_subjects_set]
-    
-    if not subjects:
-        print("no common subjects ids in the data")
-        return pd.DataFrame()
-    return subjects
-
 def dataframe_to_csv(df, file_path, sheet):
     file_name = file_path + "/" + sheet + "_GSR_Statistics_Table.csv"
     df.to_csv(
@@ -229,8 +221,9 @@ if __name__ == "__main__":
     file_path = "/Users/jasmineerell/Documents/Research/data/GSR_RawData.xlsx"
     sheet_to_load = "T1"
     sheet_time = "timing_1"
-    timing = timing_to_dataframe(file_path,sheet_time)
-    data = GSR_to_dataframe(file_path,sheet_to_load)
+    sheets = load_gsr_sheets(file_path, data_sheets=[sheet_to_load], timing_sheets=[sheet_time])
+    timing = sheets[sheet_time]
+    data = sheets[sheet_to_load]
 
     #mean = avg_by_event_and_id("neut1",18,timing,data,30)
     #print("{:.10f}".format(mean))
@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+from GSR_signal_store import SignalStore
+from GSR_protocol import DEFAULT_PROTOCOL, GSRProtocol
+
+"Resolves a GSR timing sheet into per subject sample windows once; the statistics table, the matrix and the diagnostic figures all read from it"
+
+
+def preprocess(df_timing,df_data):
+    """
+    takes as an input timing dataframe and data dataframe and returns common subjects id list.
+    if some is missing it alerts and "ignores" the missing data
+    """
+    timing_columns_ordered = df_timing.columns.astype(str).tolist()
+    timing_subjects_set = set(timing_columns_ordered)
+    data_subjects_set = set(df_data.columns.astype(str).tolist())
+
+    missing_in_data = timing_subjects_set - data_subjects_set
+    missing_in_timing = data_subjects_set - timing_subjects_set
+
+    if missing_in_data:
+        print(f"subjects with time table and no data(df_data): {sorted(list(missing_in_data))}")
+
+    if missing_in_timing:
+        print(f"some subject are missing time table(df_timing): {sorted(list(missing_in_timing))}")
+
+    subjects = [subj for subj in timing_columns_ordered if subj in data_subjects_set]
+
+    if not subjects:
+        print("no common subjects ids in the data")
+        return pd.DataFrame()
+    return subjects
+
+
+def segment_names() -> list[str]:
+    """statistics table segments of the default protocol"""
+    return DEFAULT_PROTOCOL.segment_names()
+
+
+class EventWindows:
+    """
+    Every window the GSR outputs use, resolved for all subjects of one sheet at once:
+    - '<event>_<segment>': statistics segments (e.g. 'neut1_Baseline', 'trauma_Recovery_3')
+    - '<event>_span': matrix spans, from the event onset to the next event (clamped to the recording)
+    - '<event>_plot': diagnostic segments, PLOT_SEGMENT_DURATION_SEC from STARTING_OFFSET before the onset
+    - 'recording_plot': diagnostic raw signal, from STARTING_OFFSET before the first event to the end of recording
+    Each window has a start and end sample per subject and a reason, '' when the window is valid.
+    The data is kept as one float row per subject, so a window slice is a view; df_data can also
+    be a SignalStore, whose memory map is then sliced directly.
+    protocol: the GSRProtocol the windows follow (df_data must be at its sampling rate).
+    """
+    def __init__(self, df_timing, df_data, subjects=None, protocol: GSRProtocol = DEFAULT_PROTOCOL):
+        self.protocol = protocol
+        if subjects is None:
+            subjects = preprocess(df_timing, df_data)
+        self.subjects = list(subjects)
+        self.subject_index = {subj_id: i for i, subj_id in enumerate(self.subjects)}
+        if isinstance(df_data, SignalStore):
+            # the memory map itself, subjects are looked up by row
+            self.values = df_data.values
+            self.rows = np.array([df_data.row_index[subj_id] for subj_id in self.subjects], dtype=int)
+        else:
+            self.values = np.ascontiguousarray(
+                df_data[self.subjects].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).T
+            )
+            self.rows = np.arange(len(self.subjects))
+        self.n_samples = len(df_data)
+
+        self.onsets = {}
+        self.timing_reasons = {}
+        labels = protocol.events + [protocol.trauma_audio_end_label, protocol.recording_end_label]
+        for label in dict.fromkeys(labels + protocol.trauma_span_end_labels):
+            self.onsets[label], self.timing_reasons[label] = self._timing_row(df_timing, label)
+
+        self.names, self._starts, self._ends, self._reasons = [], [], [], []
+        self._resolve_segments()
+        self._resolve_spans()
+        self._resolve_plots()
+        self.window_index = {name: i for i, name in enumerate(self.names)}
+        self.starts = np.column_stack(self._starts) if self.names else np.empty((len(self.subjects), 0))
+        self.ends = np.column_stack(self._ends) if self.names else np.empty((len(self.subjects), 0))
+        self.reasons = np.column_stack(self._reasons) if self.names else np.empty((len(self.subjects), 0), dtype=object)
+
+    # ---------- resolving ----------
+
+    def _timing_row(self, df_timing, label):
+        """float seconds of every subject for one timing row, and why a value is missing"""
+        n_subjects = len(self.subjects)
+        if label not in df_timing.index:
+            return np.full(n_subjects, np.nan), np.full(n_subjects, f"no '{label}' timing row", dtype=object)
+        raw = df_timing.loc[label].reindex(self.subjects)
+        seconds = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float)
+        reasons = np.where(
+            raw.isna().to_numpy(), f"missing '{label}' timing",
+            np.where(np.isnan(seconds), f"'{label}' timing is not a number", ""),
+        ).astype(object)
+        return seconds, reasons
+
+    def _add(self, name, start, end, reason, clamp_end=False):
+        """
+        start/end: sample arrays, reason: timing reasons ('' when the times are there).
+        Windows that leave the recording are invalid, unless clamp_end cuts them at its end.
+        """
+        start = np.asarray(start, dtype=float)
+        end = np.asarray(end, dtype=float)
+        reason = np.asarray(reason, dtype=object)
+        if clamp_end:
+            checks = [
+                (end <= start, "empty window"),
+                (start < 0, "starts before the recording"),
+                (start >= self.n_samples, "starts after the recording ended"),
+            ]
+            end = np.minimum(end, self.n_samples)
+        else:
+            checks = [
+                (start < 0, "starts before the recording"),
+                (end > self.n_samples, "ends after the recording"),
+            ]
+        for failed, text in checks:
+            reason = np.where((reason == "") & failed, text, reason)
+        reason = np.asarray(reason, dtype=object)
+
+        valid = reason == ""
+        self.names.append(name)
+        self._starts.append(np.where(valid, start, np.nan))
+        self._ends.append(np.where(valid, end, np.nan))
+        self._reasons.append(reason)
+
+    @staticmethod
+    def _first_reason(*reasons):
+        combined = reasons[0]
+        for reason in reasons[1:]:
+            combined = np.where(combined == "", reason, combined)
+        return np.asarray(combined, dtype=object)
+
+    def _resolve_segments(self):
+        protocol = self.protocol
+        to_samples = protocol.seconds_to_samples
+        for condition in protocol.standard_conditions:
+            onset_sample, reason = to_samples(self.onsets[condition]), self.timing_reasons[condition]
+            for seg_name, (offset_samples, duration_samples) in protocol.segment_samples.items():
+                start = onset_sample + offset_samples
+                self._add(f'{condition}_{seg_name}', start, start + duration_samples, reason)
+
+        #Trauma
+        condition = protocol.trauma_condition
+        trauma_onset_sec = self.onsets[condition]
+        trauma_audio_end_sec = self.onsets[protocol.trauma_audio_end_label]
+        recording_end_sec = self.onsets[protocol.recording_end_label]
+        onset_reason = self.timing_reasons[condition]
+        # audio, imagery and recovery need all three times
+        trauma_reason = self._first_reason(
+            onset_reason,
+            self.timing_reasons[protocol.trauma_audio_end_label],
+            self.timing_reasons[protocol.recording_end_label],
+        )
+        onset_sample = to_samples(trauma_onset_sec)
+
+        def add(name, start, duration_samples, reason):
+            self._add(f'{condition}_{name}', start, start + duration_samples, reason)
+
+        baseline_offset, baseline_samples = protocol.segment_samples['Baseline']
+        add('Baseline', onset_sample + baseline_offset, baseline_samples, onset_reason)
+
+        audio_duration_sec = trauma_audio_end_sec - trauma_onset_sec
+        audio_offset = protocol.segment_samples['Audio'][0] if 'Audio' in protocol.segment_samples else 0
+        add('Audio', onset_sample + audio_offset, to_samples(audio_duration_sec), trauma_reason)
+
+        imagery_offset_sec = audio_duration_sec
+        add('Imagery', onset_sample + to_samples(imagery_offset_sec), protocol.imagery_samples, trauma_reason)
+
+        recovery_start_offset_sec = imagery_offset_sec + protocol.standard_segments['Imagery'][0]
+        total_recovery_duration = recording_end_sec - (trauma_onset_sec + recovery_start_offset_sec)
+        has_times = trauma_reason == ""
+        num_recovery_blocks = np.where(
+            has_times & (total_recovery_duration > 0),
+            np.floor(np.where(has_times, total_recovery_duration, 0) / protocol.recovery_block_duration),
+            0,
+        )
+        self.trauma_complete = has_times
+
+        # one more window for every block some subject has beyond min_recovery_blocks
+        max_blocks = int(max(protocol.min_recovery_blocks, num_recovery_blocks.max(initial=0)))
+        current_offset = recovery_start_offset_sec
+        for i in range(1, max_blocks + 1):
+            reason = np.where(
+                (trauma_reason == "") & (num_recovery_blocks < i), "past the end of recording", trauma_reason
+            )
+            add(f'Recovery_{i}', onset_sample + to_samples(current_offset), protocol.recovery_block_samples, reason)
+            current_offset = current_offset + protocol.recovery_block_duration
+        self.recovery_blocks = max_blocks
+
+    def _resolve_spans(self):
+        protocol = self.protocol
+        for event in protocol.events:
+            start_sec, start_reason = self.onsets[event], self.timing_reasons[event]
+            if event == protocol.trauma_condition:
+                end_sec = np.full(len(self.subjects), np.nan)
+                for label in protocol.trauma_span_end_labels:
+                    end_sec = np.where(np.isnan(end_sec), self.onsets[label], end_sec)
+                end_reason = np.where(np.isnan(end_sec), "no valid end time", "")
+            else:
+                next_event = protocol.next_event[event]
+                end_sec, end_reason = self.onsets[next_event], self.timing_reasons[next_event]
+            reason = self._first_reason(start_reason, end_reason)
+            self._add(f'{event}_span', protocol.seconds_to_samples(start_sec), protocol.seconds_to_samples(end_sec),
+                      reason, clamp_end=True)
+
+    def _resolve_plots(self):
+        protocol = self.protocol
+        for event in protocol.events:
+            start = protocol.seconds_to_samples(self.onsets[event] - protocol.starting_offset)
+            self._add(f'{event}_plot', start, start + protocol.plot_segment_samples, self.timing_reasons[event])
+
+        first_event = protocol.events[0]
+        reason = self._first_reason(self.timing_reasons[first_event], self.timing_reasons[protocol.recording_end_label])
+        self._add('recording_plot', protocol.seconds_to_samples(self.onsets[first_event] - protocol.starting_offset),
+                  protocol.seconds_to_samples(self.onsets[protocol.recording_end_label]), reason, clamp_end=True)
+
+    # ---------- queries ----------
+
+    def table(self) -> pd.DataFrame:
+        """one row per subject and window: subject, window, start_sample, end_sample, reason"""
+        n_subjects, n_windows = self.starts.shape
+        return pd.DataFrame({
+            'subject': np.repeat(self.subjects, n_windows),
+            'window': np.tile(self.names, n_subjects),
+            'start_sample': pd.array(self.starts.ravel(), dtype='Int64'),
+            'end_sample': pd.array(self.ends.ravel(), dtype='Int64'),
+            'reason': self.reasons.ravel(),
+        })
+
+    def onset_sec(self, subj_id, label) -> float:
+        """the subject's time of a timing row in seconds, NaN when missing"""
+        return float(self.onsets[label][self.subject_index[subj_id]])
+
+    def reason(self, subj_id, name) -> str:
+        if subj_id not in self.subject_index:
+            return "subject not found in data"
+        return self.reasons[self.subject_index[subj_id], self.window_index[name]]
+
+    def bounds(self, subj_id, name):
+        """(start, end) samples of a valid window, None otherwise"""
+        if self.reason(subj_id, name):
+            return None
+        i, j = self.subject_index[subj_id], self.window_index[name]
+        return int(self.starts[i, j]), int(self.ends[i, j])
+
+    def slice(self, subj_id, name):
+        """the subject's samples in the window (a view), None when the window is not valid"""
+        bounds = self.bounds(subj_id, name)
+        if bounds is None:
+            return None
+        return self.values[self.rows[self.subject_index[subj_id]], bounds[0]:bounds[1]]
+
+    def _row_means(self, i, cols) -> np.ndarray:
+        """
+        means of the windows cols of subject i, from one cumulative sum over that subject's row
+        only, so a memory mapped store is never copied whole
+        """
+        starts, ends = self.starts[i, cols], self.ends[i, cols]
+        valid = ~np.isnan(starts)
+        result = np.full(len(cols), np.nan)
+        if not valid.any():
+            return result
+        start_idx = starts[valid].astype(int)
+        end_idx = np.maximum(ends[valid], starts[valid]).astype(int)
+
+        values = np.asarray(self.values[self.rows[i], :end_idx.max()], dtype=float)
+        is_valid = ~np.isnan(values)
+        sums = np.concatenate([[0.0], np.cumsum(np.where(is_valid, values, 0.0))])
+        counts = np.concatenate([[0], np.cumsum(is_valid)])
+
+        window_count = counts[end_idx] - counts[start_idx]
+        window_sum = sums[end_idx] - sums[start_idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[valid] = np.where(window_count > 0, window_sum / window_count, np.nan)
+        return result
+
+    def means(self, names) -> np.ndarray:
+        """
+        subjects x names means; NaN samples are skipped like Series.mean(),
+        invalid and empty windows are NaN
+        """
+        cols = [self.window_index[name] for name in names]
+        if not self.subjects:
+            return np.empty((0, len(cols)))
+        return np.vstack([self._row_means(i, cols) for i in range(len(self.subjects))])
+
+    def mean(self, subj_id, name) -> float:
+        if subj_id not in self.subject_index:
+            return np.nan
+        return float(self._row_means(self.subject_index[subj_id], [self.window_index[name]])[0])
+
+    def statistic_names(self) -> list[str]:
+        """the segments of the statistics table, including every trauma recovery block"""
+        protocol = self.protocol
+        names = protocol.segment_names()
+        names += [
+            f'{protocol.trauma_condition}_Recovery_{i}'
+            for i in range(protocol.min_recovery_blocks + 1, self.recovery_blocks + 1)
+        ]
+        return names
+
+    def normalized_segment(self, subj_id, event):
+        """
+        the event's diagnostic segment divided by its baseline mean.
+        Returns (array, '') or (None, reason)
+        """
+        baseline_mean = self.mean(subj_id, f'{event}_Baseline')
+        if pd.isna(baseline_mean) or baseline_mean <= 0:
+            return None, f"baseline value - {baseline_mean} (it must be positive)"
+        segment = self.slice(subj_id, f'{event}_plot')
+        if segment is None:
+            return None, self.reason(subj_id, f'{event}_plot')
+        return segment / baseline_mean, ""
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+from GSR_protocol import DEFAULT_PROTOCOL, GSRProtocol
+from columnar_cache import read_parquet_frame, write_parquet_frame
+from GSR_signal_store import SignalStore, write_signal_store
+
+"Loads the sheets of a GSR_RawData workbook with a single open, and caches them as Parquet files (and float32 signal stores) next to it"
+
+CACHE_VERSION = 2
+NA_VALUES = ['NA', '']
+
+
+def cache_dir_for(file_path: str) -> str:
+    folder, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(folder, f".{os.path.splitext(name)[0]}_cache")
+
+
+def workbook_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_sheet(xls: pd.ExcelFile, sheet_name: str, kind: str) -> pd.DataFrame:
+    """
+    timing sheets: events as index, subjects as columns
+    data sheets: one column per subject, one row per sample
+    empty cells and 'NA' become NaN, column names become strings
+    """
+    if kind == "timing":
+        df = xls.parse(sheet_name, index_col=0, na_values=NA_VALUES)
+    else:
+        df = xls.parse(sheet_name, na_values=NA_VALUES)
+    df.columns = df.columns.astype(str)
+    return df
+
+
+def load_cache_manifest(cache_dir: str, file_path: str) -> dict:
+    """
+    Returns the cache manifest if it belongs to the current workbook, otherwise an empty one.
+    Size and mtime are compared first; the content hash only when they differ.
+    """
+    st = os.stat(file_path)
+    fresh = {"version": CACHE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None, "sheets": {}}
+
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    if not os.path.isfile(manifest_path):
+        return fresh
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return fresh
+
+    if manifest.get("version") != CACHE_VERSION:
+        return fresh
+    if manifest["size"] == st.st_size and manifest["mtime_ns"] == st.st_mtime_ns:
+        return manifest
+
+    fresh["sha256"] = workbook_sha256(file_path)
+    if manifest.get("sha256") == fresh["sha256"]:
+        manifest["mtime_ns"] = st.st_mtime_ns
+        return manifest
+    return fresh
+
+
+def save_cache_manifest(cache_dir: str, manifest: dict):
+    tmp_path = os.path.join(cache_dir, "manifest.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(cache_dir, "manifest.json"))
+
+
+def load_gsr_sheets(file_path: str, data_sheets=(), timing_sheets=(), use_cache: bool = True,
+                    skip_missing: bool = False) -> dict:
+    """
+    Returns {sheet name: DataFrame} for the requested data and timing sheets.
+    Sheets cached for the current workbook (same size/mtime, or same content hash) are read
+    from their Parquet file; all the others are parsed with a single open of the workbook and
+    cached (a sheet Parquet cannot store, e.g. a column mixing numbers and text, is parsed every time).
+    skip_missing=True leaves out sheets the workbook does not have instead of raising.
+    """
+    requested = [(name, "data") for name in data_sheets] + [(name, "timing") for name in timing_sheets]
+    cache_dir = cache_dir_for(file_path)
+    manifest = load_cache_manifest(cache_dir, file_path) if use_cache else None
+
+    sheets = {}
+    to_parse = []
+    for name, kind in requested:
+        cached = manifest["sheets"].get(f"{kind}:{name}") if manifest else None
+        if cached and os.path.isfile(os.path.join(cache_dir, cached)):
+            sheets[name] = read_parquet_frame(os.path.join(cache_dir, cached))
+        else:
+            to_parse.append((name, kind))
+
+    if to_parse:
+        print(f"Parsing {', '.join(name for name, _ in to_parse)} from {file_path}")
+        with pd.ExcelFile(file_path) as xls:
+            for name, kind in list(to_parse):
+                if skip_missing and name not in xls.sheet_names:
+                    print(f"Sheet {name} not found in {file_path}")
+                    to_parse.remove((name, kind))
+                    continue
+                sheets[name] = parse_sheet(xls, name, kind)
+
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        if manifest["sha256"] is None:
+            manifest["sha256"] = workbook_sha256(file_path)
+        for name, kind in to_parse:
+            cache_name = f"{kind}_{hashlib.sha1(name.encode()).hexdigest()[:12]}.parquet"
+            if write_parquet_frame(sheets[name], os.path.join(cache_dir, cache_name)):
+                manifest["sheets"][f"{kind}:{name}"] = cache_name
+        # also records a new mtime of an unchanged workbook
+        save_cache_manifest(cache_dir, manifest)
+
+    return sheets
+
+
+def load_signal_stores(file_path: str, data_sheets=(), skip_missing: bool = False,
+                       protocol: GSRProtocol = DEFAULT_PROTOCOL) -> dict:
+    """
+    Returns {sheet name: SignalStore} for the requested data sheets. The float32 stores live in
+    the workbook cache; a sheet without a store for the current workbook is loaded once
+    (see load_gsr_sheets) and written to one, later runs only map the file.
+    The stored samples are at the protocol's sampling rate (averaged down from its input rate).
+    """
+    rates = f"{protocol.input_rate}to{protocol.sampling_rate}hz"
+    cache_dir = cache_dir_for(file_path)
+    manifest = load_cache_manifest(cache_dir, file_path)
+    stores = {}
+    missing = []
+    for name in data_sheets:
+        cached = manifest["sheets"].get(f"signal:{rates}:{name}")
+        if cached and os.path.isfile(os.path.join(cache_dir, cached)):
+            stores[name] = SignalStore(os.path.join(cache_dir, cached))
+        else:
+            missing.append(name)
+
+    if missing:
+        sheets = load_gsr_sheets(file_path, data_sheets=missing, skip_missing=skip_missing)
+        # load_gsr_sheets may have refreshed the manifest
+        manifest = load_cache_manifest(cache_dir, file_path)
+        for name in missing:
+            if name not in sheets:
+                continue
+            store_name = f"signal_{rates}_{hashlib.sha1(name.encode()).hexdigest()[:12]}.f32"
+            print(f"Writing the signal store of {name}")
+            write_signal_store(protocol.resample_frame(sheets[name]), os.path.join(cache_dir, store_name))
+            manifest["sheets"][f"signal:{rates}:{name}"] = store_name
+            stores[name] = SignalStore(os.path.join(cache_dir, store_name))
+        save_cache_manifest(cache_dir, manifest)
+
+    return stores
+
+
+def timing_sheet_for(data_sheet: str) -> str:
+    """T1 -> timing_1"""
+    return f'timing_{data_sheet[-1]}'
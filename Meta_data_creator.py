@@ -1,25 +1,56 @@
 import pandas as pd
+import bisect
 import csv
+import hashlib
+import json
 import os
 import re
 
+from columnar_cache import has_fresh_columnar, write_columnar
+from kubios_report import parse_kubios_report
+from parallel_files import parse_files_in_order
+
 "Takes a directory with patients data, and creates in the same directory a meta_data.csv file"
 
 
+META_COLUMNS = ['subject', 'meet', 'state', 'type']
+STREAM_CHUNK_ROWS = 100_000
+
+
+def read_clean_rows(file_path: str) -> tuple[list[list[str]], int]:
+    """
+    Reads a CSV file and replaces empty cells with 'NA' (see kubios_report).
+    Returns the rows and the length of the longest row.
+    """
+    report = parse_kubios_report(file_path, keep_rows=True)
+    return report.rows, report.width
+
+
+def read_typed_rows(file_path: str, type_value: str = "") -> tuple[list[list[str]], int, str]:
+    """
+    read_clean_rows that also passes the file's type through, for the worker pool
+    """
+    rows, max_cols = read_clean_rows(file_path)
+    return rows, max_cols, type_value
+
+
+def metadata_from_path(file_path: str) -> tuple[str, str, str]:
+    """
+    subject, meet and state are the three folders above the file
+    """
+    parts = os.path.normpath(file_path).split(os.sep)
+    if len(parts) >= 4:
+        return parts[-4], parts[-3], parts[-2]
+    return "unknown", "unknown", "unknown"
+
+
 def preprocess(file_path: str, type_value: str = "") -> pd.DataFrame:
     """
     Reads a CSV file, replaces empty cells with 'NA', and adds 'subject', 'meet', and 'state' columns
     based on the file path. Pads short rows and returns a cleaned DataFrame.
     The 'subject', 'meet', and 'state' columns are moved to the front of the DataFrame.
     """
-    with open(file_path, newline='', encoding="utf-8") as f:
-        reader = csv.reader(f)
-        rows = []
-        max_cols = 0
-        for row in reader:
-            cleaned_row = [cell if cell.strip() != "" else "NA" for cell in row]
-            rows.append(cleaned_row)
-            max_cols = max(max_cols, len(cleaned_row))
+    rows, max_cols = read_clean_rows(file_path)
 
     # Pad all rows to match the maximum column length
     padded = [r + ["NA"] * (max_cols - len(r)) for r in rows]
@@ -29,11 +60,7 @@ def preprocess(file_path: str, type_value: str = "") -> pd.DataFrame:
     df = pd.DataFrame(padded, columns=col_names)
 
     # Add metadata from the file path
-    parts = os.path.normpath(file_path).split(os.sep)
-    if len(parts) >= 4:
-        subject, meet, state = parts[-4], parts[-3], parts[-2]
-    else:
-        subject = meet = state = "unknown"
+    subject, meet, state = metadata_from_path(file_path)
 
     df["subject"] = subject
     df["meet"] = meet
@@ -41,20 +68,20 @@ def preprocess(file_path: str, type_value: str = "") -> pd.DataFrame:
     df["type"] = type_value  # Add the passed-in type
 
     # Move 'subject', 'meet', and 'state' to the front
-    cols = ['subject', 'meet', 'state', 'type'] + [col for col in df.columns if col not in ['subject', 'meet', 'state', 'type']]
+    cols = META_COLUMNS + [col for col in df.columns if col not in META_COLUMNS]
     df = df[cols]
 
     return df
 
 
-def iterate_over_drive(root: str,existing_subjects:set ) -> pd.DataFrame:
+def iter_drive_csv_files(root: str, existing_subjects: set, exclude=()):
     """
-    Recursively finds all .csv files under the root, processes them using preprocess(),
-    and returns a single concatenated DataFrame.
+    Recursively yields (file_path, type_value) for every data .csv file under root,
+    skipping subjects that are already in the meta data and the files in exclude.
     """
+    excluded = {os.path.normpath(path) for path in exclude}
     meet_dir_re = re.compile(r'^\s*meet\s+\d+a?\s*$', re.IGNORECASE)
 
-    dfs = []
     for dirpath, dirnames, filenames in os.walk(root):
         current_dirname = os.path.basename(dirpath)
         if current_dirname in existing_subjects:
@@ -69,6 +96,8 @@ def iterate_over_drive(root: str,existing_subjects:set ) -> pd.DataFrame:
         for fname in filenames:
             if fname.lower().endswith(".csv") and "meta_data" not in fname.lower():
                 file_path = os.path.join(dirpath, fname)
+                if os.path.normpath(file_path) in excluded:
+                    continue
 
                 # Determine 'state' from folder structure
                 parts = os.path.normpath(file_path).split(os.sep)
@@ -77,11 +106,22 @@ def iterate_over_drive(root: str,existing_subjects:set ) -> pd.DataFrame:
                 # Extract type if state is therapy
                 type_value = extract_type_from_filename(fname) if state.lower() == "therapy" else ""
 
-                try:
-                    df = preprocess(file_path, type_value=type_value)
-                    dfs.append(df)
-                except Exception as e:
-                    print(f"Failed to process {file_path}: {e}")
+                yield file_path, type_value
+
+
+def iterate_over_drive(root: str,existing_subjects:set, workers: int = 1, exclude=()) -> pd.DataFrame:
+    """
+    Recursively finds all .csv files under the root, processes them using preprocess(),
+    and returns a single concatenated DataFrame.
+    workers > 1 runs preprocess in that many processes; the result is the same as the serial run.
+    """
+    dfs = []
+    tasks = iter_drive_csv_files(root, existing_subjects, exclude)
+    for file_path, df, error, _ in parse_files_in_order(preprocess, tasks, workers):
+        if error is not None:
+            print(f"Failed to process {file_path}: {error}")
+            continue
+        dfs.append(df)
 
     if not dfs:
         return None
@@ -90,31 +130,456 @@ def iterate_over_drive(root: str,existing_subjects:set ) -> pd.DataFrame:
     return combined_df
 
 
+def csv_width(path: str) -> int:
+    """
+    number of colN columns in the header of an existing meta data csv (0 if missing)
+    """
+    if not os.path.isfile(path):
+        return 0
+    with open(path, newline='', encoding="utf-8") as f:
+        return len(next(csv.reader(f), META_COLUMNS)) - len(META_COLUMNS)
+
+
+def write_parsed_rows(tasks, part_path: str, workers: int = 1) -> tuple[list, int]:
+    """
+    Parses every (file_path, type_value) task and writes its rows, prefixed with the metadata
+    columns and padded inside the file with 'NA', to part_path as soon as it is parsed.
+    Returns [(file_path, type_value, n_rows)] for the files that were parsed, and the widest row.
+    """
+    parsed_files = []
+    max_cols = 0
+    with open(part_path, "w", newline='', encoding="utf-8") as part:
+        writer = csv.writer(part, lineterminator=os.linesep)
+        for file_path, parsed, error, _ in parse_files_in_order(read_typed_rows, tasks, workers):
+            if error is not None:
+                print(f"Failed to process {file_path}: {error}")
+                continue
+
+            rows, file_cols, type_value = parsed
+            subject, meet, state = metadata_from_path(file_path)
+            for row in rows:
+                # pad inside a file with 'NA', like preprocess
+                writer.writerow([subject, meet, state, type_value] + row + ["NA"] * (file_cols - len(row)))
+            max_cols = max(max_cols, file_cols)
+            parsed_files.append((file_path, type_value, len(rows)))
+    return parsed_files, max_cols
+
+
+def append_padded_rows(part_path: str, out, width: int, table: list = None):
+    """
+    copies the rows of part_path to the open csv file out, padded across files with empty cells like pd.concat;
+    table, when given, also receives every padded row
+    """
+    writer = csv.writer(out, lineterminator=os.linesep)
+    with open(part_path, newline='', encoding="utf-8") as src:
+        for row in csv.reader(src):
+            row += [""] * (len(META_COLUMNS) + width - len(row))
+            writer.writerow(row)
+            if table is not None:
+                table.append(row)
+
+
+def stream_drive_to_csv(root: str, existing_subjects: set, out_path: str, workers: int = 1, exclude=()) -> int:
+    """
+    Streaming version of iterate_over_drive: every file's rows are written to a temporary
+    file as soon as they are parsed, so only one file is held in memory at a time.
+    A footer pass then pads all rows to the widest row seen and appends them to out_path
+    (widening an existing out_path first if needed). Output matches the in-memory mode.
+    Returns the number of rows added.
+    """
+    existing_width = csv_width(out_path)
+    part_path = out_path + ".part"
+    try:
+        parsed_files, max_cols = write_parsed_rows(
+            iter_drive_csv_files(root, existing_subjects, exclude), part_path, workers)
+        n_rows = sum(n for _, _, n in parsed_files)
+        if n_rows == 0:
+            return 0
+
+        width = max(max_cols, existing_width)
+        header = META_COLUMNS + [f"col{i + 1}" for i in range(width)]
+        if existing_width and existing_width < width:
+            pad_csv_file(out_path, header)
+
+        with open(out_path, "a", newline='', encoding="utf-8") as out:
+            if not existing_width:
+                csv.writer(out, lineterminator=os.linesep).writerow(header)
+            append_padded_rows(part_path, out, width)
+        return n_rows
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def manifest_path_for(out_path: str) -> str:
+    return os.path.splitext(out_path)[0] + "_manifest.json"
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    {relative file path: {size, mtime_ns, sha256, type, rows: [first, stop]}}
+    rows are 0-based data row positions in meta_data.csv (header excluded)
+    """
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def save_manifest(manifest_path: str, files: dict):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def find_changed_files(root: str, manifest: dict, exclude=()) -> tuple[list, dict, list, list]:
+    """
+    Compares the drive to the manifest. size and mtime are checked first; the content hash
+    is computed only when they differ, so touched-but-identical files are not re-parsed.
+    Returns (files to parse as (file_path, type_value)), {rel path: fingerprint} for them,
+    the relative paths of unchanged files, and every file as (file_path, type_value) in walk order.
+    """
+    to_parse = []
+    fingerprints = {}
+    unchanged = []
+    files = list(iter_drive_csv_files(root, set(), exclude))
+    for file_path, type_value in files:
+        rel = os.path.relpath(file_path, root)
+        st = os.stat(file_path)
+        entry = manifest.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            unchanged.append(rel)
+            continue
+
+        sha = file_sha256(file_path)
+        if entry and entry["sha256"] == sha and entry["type"] == type_value:
+            entry["mtime_ns"] = st.st_mtime_ns
+            unchanged.append(rel)
+            continue
+
+        to_parse.append((file_path, type_value))
+        fingerprints[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha, "type": type_value}
+    return to_parse, fingerprints, unchanged, files
+
+
+def incremental_update(root: str, out_path: str, workers: int = 1, exclude=()) -> int:
+    """
+    File level incremental update of out_path using a sidecar manifest
+    (path, size, mtime, content hash and row range of every parsed file).
+    Only new or changed csv files are parsed; their old rows, and the rows of files that
+    no longer exist, are dropped, and the new rows are appended. A changed file that fails
+    to parse keeps its old rows (and is tried again on the next run). The existing meta data
+    is streamed once to do that, and is not read at all when nothing changed.
+    Without a manifest the meta data is rebuilt from scratch.
+    Returns the number of rows added plus the number of rows removed, 0 when out_path was not rewritten.
+    """
+    manifest_path = manifest_path_for(out_path)
+    manifest = load_manifest(manifest_path) if os.path.isfile(out_path) else {}
+    if os.path.isfile(out_path) and not manifest:
+        print(f"[INFO] No manifest next to {out_path}. Rebuilding it from all files.")
+
+    to_parse, fingerprints, unchanged, _ = find_changed_files(root, manifest, exclude)
+    kept = {rel: manifest[rel] for rel in unchanged}
+    removed = sorted(set(manifest) - set(kept) - set(fingerprints))
+    print(f"[MANIFEST] {len(unchanged)} unchanged, {len(to_parse)} new or changed, {len(removed)} removed")
+
+    if not to_parse and not removed:
+        if kept:
+            save_manifest(manifest_path, kept)  # refresh mtimes of touched files
+        return 0
+
+    part_path = out_path + ".part"
+    new_path = out_path + ".new"
+    try:
+        parsed_files, max_cols = write_parsed_rows(to_parse, part_path, workers)
+        parsed = {os.path.relpath(file_path, root) for file_path, _, _ in parsed_files}
+        for rel in sorted(set(fingerprints) - parsed):
+            if rel in manifest:
+                print(f"[MANIFEST] Keeping the old rows of {rel}, it could not be parsed")
+                kept[rel] = manifest[rel]
+            else:
+                print(f"[MANIFEST] {rel} could not be parsed and was not added")
+
+        dropped = [entry["rows"] for rel, entry in manifest.items() if rel not in kept]
+        n_added = sum(n for _, _, n in parsed_files)
+        n_dropped = sum(stop - start for start, stop in dropped)
+        if removed:
+            n_removed = sum(manifest[rel]["rows"][1] - manifest[rel]["rows"][0] for rel in removed)
+            print(f"[MANIFEST] Dropping {n_removed} rows of {len(removed)} removed file(s): {', '.join(removed)}")
+        if not n_added and not dropped:
+            save_manifest(manifest_path, kept)
+            return 0
+
+        existing_width = csv_width(out_path) if kept else 0
+        width = max(max_cols, existing_width)
+        header = META_COLUMNS + [f"col{i + 1}" for i in range(width)]
+
+        # new positions of the kept files once the dropped row ranges are removed
+        dropped = sorted(dropped)
+        drop_starts = [start for start, _ in dropped]
+        removed_before = [0]
+        for start, stop in dropped:
+            removed_before.append(removed_before[-1] + stop - start)
+        for rel, entry in kept.items():
+            start, stop = entry["rows"]
+            shift = removed_before[bisect.bisect_right(drop_starts, start)]
+            kept[rel] = dict(entry, rows=[start - shift, stop - shift])
+
+        with open(new_path, "w", newline='', encoding="utf-8") as out:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            writer.writerow(header)
+            n_kept = 0
+            if kept:
+                keep_mask = KeptRows(dropped)
+                with open(out_path, newline='', encoding="utf-8") as src:
+                    reader = csv.reader(src)
+                    next(reader, None)
+                    for i, row in enumerate(reader):
+                        if keep_mask.keeps(i):
+                            writer.writerow(row + [""] * (len(header) - len(row)))
+                            n_kept += 1
+            append_padded_rows(part_path, out, width)
+
+        position = n_kept
+        for file_path, type_value, n in parsed_files:
+            rel = os.path.relpath(file_path, root)
+            kept[rel] = dict(fingerprints[rel], rows=[position, position + n])
+            position += n
+
+        os.replace(new_path, out_path)
+        save_manifest(manifest_path, kept)
+        return n_added + n_dropped
+    finally:
+        for path in (part_path, new_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def rebuild_in_order(root: str, out_path: str, workers: int = 1, exclude=(), table: list = None) -> int:
+    """
+    Rewrites out_path and its manifest in the order a clean build writes them (every file in
+    walk order), so the result is the same as rebuilding from scratch, but the rows of unchanged
+    files are copied from out_path instead of parsed again. Only new or changed files are parsed;
+    a changed file that fails to parse keeps its old rows. The old rows are read in one forward
+    pass, so an unchanged file whose rows come before those of an earlier file (an incremental
+    update appends changed files at the end) is parsed again instead.
+    table, when given, receives the header and every row as written, for a caller that goes on
+    with the table in memory instead of reading out_path back.
+    Returns the number of rows written, 0 when there are none (out_path is then left as it is).
+    """
+    manifest_path = manifest_path_for(out_path)
+    manifest = load_manifest(manifest_path) if os.path.isfile(out_path) else {}
+    _, fingerprints, unchanged, files = find_changed_files(root, manifest, exclude)
+
+    # reuse the unchanged files whose old rows can be read in walk order; a changed file's old
+    # rows count too, as they are kept if it fails to parse
+    rels = [os.path.relpath(file_path, root) for file_path, _ in files]
+    unchanged = set(unchanged)
+    reused = set()
+    last_stop = 0
+    for rel in rels:
+        entry = manifest.get(rel)
+        if entry is None or entry["rows"][0] < last_stop:
+            continue
+        last_stop = entry["rows"][1]
+        if rel in unchanged:
+            reused.add(rel)
+    for rel in unchanged - reused:
+        fingerprints[rel] = {key: value for key, value in manifest[rel].items() if key != "rows"}
+    tasks = [task for task, rel in zip(files, rels) if rel not in reused]
+
+    removed = sorted(set(manifest) - set(rels))
+    print(f"[MANIFEST] Rebuilding {out_path}: {len(reused)} unchanged files reused, "
+          f"{len(tasks)} parsed, {len(removed)} removed")
+
+    part_path = out_path + ".part"
+    ordered_path = out_path + ".ordered"
+    new_path = out_path + ".new"
+    old_rows = ForwardRows(out_path if manifest else None)
+    try:
+        parsed_files, width = write_parsed_rows(tasks, part_path, workers)
+        parsed = {os.path.relpath(file_path, root): n for file_path, _, n in parsed_files}
+
+        # every file's rows in walk order, without the padding across files
+        written = {}
+        position = 0
+        with open(ordered_path, "w", newline='', encoding="utf-8") as out, \
+                open(part_path, newline='', encoding="utf-8") as part:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            part_rows = csv.reader(part)
+            for rel in rels:
+                if rel in parsed:
+                    rows = [next(part_rows) for _ in range(parsed[rel])]
+                    entry = fingerprints[rel]
+                elif rel in manifest and old_rows.can_read(*manifest[rel]["rows"]):
+                    if rel not in reused:
+                        print(f"[MANIFEST] Keeping the old rows of {rel}, it could not be parsed")
+                    rows = old_rows.read(*manifest[rel]["rows"])
+                    width = max([width] + [len(row) - len(META_COLUMNS) for row in rows])
+                    entry = {key: value for key, value in manifest[rel].items() if key != "rows"}
+                else:
+                    print(f"[MANIFEST] {rel} could not be parsed and was not added")
+                    continue
+                writer.writerows(rows)
+                written[rel] = dict(entry, rows=[position, position + len(rows)])
+                position += len(rows)
+
+        if removed:
+            n_removed = sum(manifest[rel]["rows"][1] - manifest[rel]["rows"][0] for rel in removed)
+            print(f"[MANIFEST] Dropping {n_removed} rows of {len(removed)} removed file(s): {', '.join(removed)}")
+        if position == 0:
+            return 0
+
+        header = META_COLUMNS + [f"col{i + 1}" for i in range(width)]
+        if table is not None:
+            table.append(header)
+        with open(new_path, "w", newline='', encoding="utf-8") as out:
+            csv.writer(out, lineterminator=os.linesep).writerow(header)
+            append_padded_rows(ordered_path, out, width, table)
+        os.replace(new_path, out_path)
+        save_manifest(manifest_path, written)
+        return position
+    finally:
+        old_rows.close()
+        for path in (part_path, ordered_path, new_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ForwardRows:
+    """
+    Reads [start, stop) ranges of the data rows of a meta data csv in one forward pass,
+    without the empty cells that pad them to the table's width.
+    """
+    def __init__(self, path):
+        self.file = open(path, newline='', encoding="utf-8") if path and os.path.isfile(path) else None
+        self.reader = csv.reader(self.file) if self.file else iter(())
+        next(self.reader, None)
+        self.position = 0
+
+    def can_read(self, start: int, stop: int) -> bool:
+        # ranges before the current position were already passed
+        return self.file is not None and start >= self.position
+
+    def read(self, start: int, stop: int) -> list:
+        for _ in range(start - self.position):
+            next(self.reader)
+        rows = []
+        for _ in range(stop - start):
+            row = next(self.reader)
+            while len(row) > len(META_COLUMNS) and row[-1] == "":
+                row.pop()
+            rows.append(row)
+        self.position = stop
+        return rows
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class KeptRows:
+    """
+    Answers "is data row i kept?" for increasing i, given the [start, stop) ranges to drop.
+    """
+    def __init__(self, dropped_ranges):
+        self.ranges = sorted(tuple(r) for r in dropped_ranges)
+        self.pos = 0
+
+    def keeps(self, i: int) -> bool:
+        while self.pos < len(self.ranges) and self.ranges[self.pos][1] <= i:
+            self.pos += 1
+        return not (self.pos < len(self.ranges) and self.ranges[self.pos][0] <= i)
+
+
+def pad_csv_file(path: str, header: list):
+    """
+    Rewrites a csv file line by line with a wider header, padding rows with empty cells.
+    """
+    tmp_path = path + ".widen"
+    with open(path, newline='', encoding="utf-8") as src, \
+            open(tmp_path, "w", newline='', encoding="utf-8") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst, lineterminator=os.linesep)
+        next(reader, None)
+        writer.writerow(header)
+        for row in reader:
+            writer.writerow(row + [""] * (len(header) - len(row)))
+    os.replace(tmp_path, path)
+
+
 def extract_type_from_filename(filename):
     match = re.search(r'ECG_([A-Z])', filename, re.IGNORECASE)
     return match.group(1).upper() if match else ""
 
 
 
-def metaDataCsvCreator(root_path: str):
+def add_new_data(root_path: str, out_path: str, streaming: bool, workers: int, incremental: bool,
+                 exclude=(), rebuild: bool = False, table: list = None) -> bool:
     """
-    Creates a combined metadata CSV file from all CSVs in the root_path directory.
+    Adds the new data under root_path to out_path in the requested mode.
+    Returns True if out_path changed (rows were added, or removed by an incremental update or a rebuild).
     """
+    if rebuild:
+        return rebuild_in_order(root_path, out_path, workers, exclude, table) > 0
+    if incremental:
+        return incremental_update(root_path, out_path, workers, exclude) > 0
 
-    out_path = os.path.join(root_path, "meta_data.csv")
     existing_subjects = set()
-    if os.path.exists(out_path):
+    if os.path.exists(out_path) and streaming:
+        for chunk in pd.read_csv(out_path, usecols=['subject'], chunksize=STREAM_CHUNK_ROWS):
+            existing_subjects.update(chunk['subject'].unique())
+    elif os.path.exists(out_path):
         existing_df = pd.read_csv(out_path, usecols=['subject'])
         for sub in existing_df['subject'].unique():
             existing_subjects.add(sub)
 
+    if streaming:
+        return stream_drive_to_csv(root_path, existing_subjects, out_path, workers, exclude) > 0
+
+    combined_df = iterate_over_drive(root_path,existing_subjects, workers, exclude)
+    if combined_df is None:
+        return False
+    file_exists = os.path.isfile(out_path)
+    combined_df.to_csv(out_path, mode='a', index=False, header=not file_exists)
+    return True
 
-    combined_df = iterate_over_drive(root_path,existing_subjects )
-    if combined_df is not None:
-        file_exists = os.path.isfile(out_path)
-        combined_df.to_csv(out_path, mode='a', index=False, header=not file_exists)
-        print(f"Successfully added new data to {out_path}")
+
+def metaDataCsvCreator(root_path: str, streaming: bool = False, workers: int = 1, incremental: bool = False,
+                       columnar: bool = False, exclude=(), rebuild: bool = False, table: list = None):
+    """
+    Creates a combined metadata CSV file from all CSVs in the root_path directory.
+    streaming=True writes each file's rows to disk as they are parsed instead of
+    building the whole table in memory.
+    workers > 1 parses the files in a process pool; the output file is identical to the serial run.
+    incremental=True tracks every file in meta_data_manifest.json and only re-parses new or
+    changed files, replacing their rows (see incremental_update). It always streams.
+    rebuild=True rewrites the table and its manifest as a clean build would, parsing only new or
+    changed files and copying the rows of the others (see rebuild_in_order). It always streams.
+    table: with rebuild=True, a list that receives the header and the rows as written.
+    columnar=True also keeps a typed meta_data.parquet copy up to date (needs pyarrow).
+    exclude: csv files under root_path that are not exports (e.g. outputs written next to them).
+    """
+
+    out_path = os.path.join(root_path, "meta_data.csv")
+    added = add_new_data(root_path, out_path, streaming, workers, incremental, exclude, rebuild, table)
+
+    if columnar and os.path.isfile(out_path) and not has_fresh_columnar(out_path):
+        write_columnar(pd.read_csv(out_path), out_path)
+
+    if added:
+        action = "rebuilt" if rebuild else "updated" if incremental else "added new data to"
+        print(f"Successfully {action} {out_path}")
         return out_path
     else:
         print("No new data to add.")
-        return None
\ No newline at end of file
+        return None
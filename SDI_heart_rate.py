@@ -1,6 +1,12 @@
+import csv
 import os
 import re
+import numpy as np
 import pandas as pd
+import xlsxwriter
+
+from columnar_cache import write_columnar
+from parallel_files import parse_files_in_order
 
 features =[
     "Sample limits (hh:mm:ss):",
@@ -15,113 +21,114 @@ features =[
     "RMSSD (ms):"
 ]
 
-def find_feature_row_range(csv_file_path):
-    """
-    finds the index when the wanted feature starts and end, we will crop from it
-    """
-    start_row = None
-    end_row = None
+SDI_OUTPUT_FORMATS = ("excel", "csv", "parquet")
 
-    with open(csv_file_path, 'r', encoding='utf-8') as f:
-        for i, line in enumerate(f):
-            first_col = line.split(',')[0].strip().lower()
-
-            if start_row is None and "mean rr" in first_col and "ms" in first_col:
-                start_row = i
+def is_block_start(first_col):
+    return "mean rr" in first_col and "ms" in first_col
 
-            if "rmssd" in first_col and "ms" in first_col:
-                end_row = i
+def is_block_end(first_col):
+    return "rmssd" in first_col and "ms" in first_col
 
-    return start_row, end_row
-
-def create_features_dataframe(csv_file_path, start_row, end_row):
+def is_extra_feature(first_col):
     """
-    Create a df for a specific subject.
-
-    - Includes all rows from start_row to end_row (Mean RR ... RMSSD),
-    - PLUS the rows whose first column matches:
-        * "Sample limits (hh:mm:ss):"
-        * "Beats corrected (%):"
-        * "Effective data length (s):"
-      (matched in a case-insensitive way, without relying on fixed line numbers)
-
+    the rows kept outside the Mean RR ... RMSSD block, matched by name (case-insensitive):
+    "Sample limits (hh:mm:ss):", "Beats corrected (%):", "Effective data length (s):"
     """
-    # Read all rows from the CSV
-    all_rows = []
-    with open(csv_file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            all_rows.append(line.strip().split(','))
-
-    feature_data = {}
-
-
-
-    # 1) indices for the standard HRV block (Mean RR ... RMSSD)
-    row_indices = set(range(start_row, end_row + 1))
+    return (("sample limits" in first_col and "hh:mm:ss" in first_col)
+            or ("beats corrected" in first_col and "%" in first_col)
+            or "effective data length" in first_col)
 
-    # 2) find indices for the extra features by NAME, not line number
-    for idx, row in enumerate(all_rows):
-        if not row or not row[0].strip():
+def parse_feature_values(cells):
+    """
+    The values of one feature row: numbers as floats, intervals like "00:00:37-00:01:07" and
+    other text as strings, stopping after 2 consecutive empty cells.
+    A row of numbers only comes back as a float array.
+    """
+    values = []
+    empty_count = 0
+    all_numbers = True
+
+    for cell in cells:
+        cell = cell.strip()
+
+        # Handle empty cells and stop after 2 consecutive empties
+        if cell == "":
+            empty_count += 1
+            if empty_count >= 2:
+                break
             continue
 
-        first_col = row[0].strip()
-        lc = first_col.lower()
-
-        # Sample limits
-        if "sample limits" in lc and "hh:mm:ss" in lc:
-            row_indices.add(idx)
+        # non-empty cell
+        empty_count = 0
 
-        # Beats corrected (%)
-        elif "beats corrected" in lc and "%" in lc:
-            row_indices.add(idx)
+        # Detect interval pattern: e.g. "00:00:37-00:01:07"
+        if "-" in cell and ":" in cell:
+            # keep the interval as a string
+            values.append(cell)
+            all_numbers = False
+            continue
 
-        # Effective data length
-        elif "effective data length" in lc:
-            row_indices.add(idx)
+        # Try to parse as float
+        try:
+            values.append(float(cell))
+        except ValueError:
+            # Not numeric and not empty → keep as string
+            values.append(cell)
+            all_numbers = False
 
-    # Sort to keep a stable, readable order
-    row_indices = sorted(row_indices)
+    return np.array(values, dtype=float) if all_numbers else values
 
+def parse_feature_row(row_idx, line):
+    """(row index, feature name, values) of one kept line"""
+    row = next(csv.reader([line]))
+    return row_idx, row[0].strip(), parse_feature_values(row[1:])
 
-    for row_idx in row_indices:
-        row = all_rows[row_idx]
-        if not row:
-            continue
+def create_features_dataframe(csv_file_path):
+    """
+    Create a df for a specific subject, reading the SDI file once.
 
-        feature_name = row[0].strip()
-        if not feature_name:
-            continue
+    - Includes all rows from the first Mean RR (ms) row to the last RMSSD (ms) row,
+    - PLUS the rows whose first column matches is_extra_feature, wherever they are.
 
-        values = []
-        empty_count = 0
+    Only the first cell of every line is looked at while streaming; a line is split into cells
+    (with csv, so quoted cells keep their commas) once it is known to be kept. Lines after the
+    block start are held as text until an RMSSD row closes them into the block, so the lines
+    after the last RMSSD row are never split.
+    Returns None when the file has no HRV block.
+    """
+    start_row = None
+    end_row = None
+    picked = []   # (row index, feature name, values)
+    pending = []  # (row index, line) after the start, not yet closed by an RMSSD row
 
-        for cell in row[1:]:
-            cell = cell.strip()
+    with open(csv_file_path, newline='', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if line.startswith('"'):
+                first_col = next(csv.reader([line]), [""])[0].strip()
+            else:
+                first_col = line.partition(',')[0].strip()
+            lc = first_col.lower()
 
-            # Handle empty cells and stop after 2 consecutive empties
-            if cell == "":
-                empty_count += 1
-                if empty_count >= 2:
-                    break
-                continue
+            if start_row is None and is_block_start(lc):
+                start_row = i
 
-            # non-empty cell
-            empty_count = 0
+            if first_col and is_extra_feature(lc):
+                picked.append(parse_feature_row(i, line))
+            elif first_col and start_row is not None:
+                pending.append((i, line))
 
-            # Detect interval pattern: e.g. "00:00:37-00:01:07"
-            if "-" in cell and ":" in cell:
-                # keep the interval as a string
-                values.append(cell)
-                continue
+            if is_block_end(lc):
+                end_row = i
+                picked.extend(parse_feature_row(idx, pending_line) for idx, pending_line in pending)
+                pending = []
 
-            # Try to parse as float
-            try:
-                num = float(cell)
-                values.append(num)
-            except ValueError:
-                # Not numeric and not empty → keep as string
-                values.append(cell)
+    if start_row is None or end_row is None:
+        return None
 
+    # Sort to keep a stable, readable order
+    picked.sort(key=lambda item: item[0])
+    feature_data = {}
+    for _, feature_name, values in picked:
         feature_data[feature_name] = values
 
     df = pd.DataFrame(feature_data).T
@@ -129,6 +136,25 @@ def create_features_dataframe(csv_file_path, start_row, end_row):
     df.index.name = "Feature"
     return df
 
+def read_subject_features(csv_file, features):
+    """
+    {feature: row of values} of one SDI file for the features it has, and the features it
+    lacks; None when the file has no HRV block. Module level so it can be sent to worker processes.
+    """
+    df = create_features_dataframe(csv_file)
+    if df is None:
+        return None
+    rows = {feature: row_array(df.loc[feature]) for feature in features if feature in df.index}
+    return rows, [feature for feature in features if feature not in rows]
+
+def row_array(row):
+    # numbers (and the NaN padding of shorter rows) as floats, anything with text stays object
+    values = row.to_numpy()
+    try:
+        return values.astype(float)
+    except (TypeError, ValueError):
+        return values
+
 
 
 def extract_feature_rows(df, features):
@@ -150,14 +176,113 @@ def safe_name(feature):
     return re.sub(r'[^0-9a-zA-Z_]', '_', feature)
 
 
-def build_excel_from_subject_features(dir_path, output_file, features):
+class FeatureMatrix:
+    """
+    One feature's values for a batch: a subjects x samples matrix preallocated for every file
+    of the batch and filled row by row as the files are parsed (NaN where a subject has fewer
+    samples). It turns into an object matrix if a row holds text (the sample limits).
+    """
+    def __init__(self, n_subjects):
+        self.values = np.full((n_subjects, 0), np.nan)
+        self.subjects = []
+
+    def add(self, subject, values):
+        values = np.asarray(values)
+        if values.dtype.kind not in "fiu" and self.values.dtype != object:
+            self.values = self.values.astype(object)
+        n_rows, n_samples = self.values.shape
+        if len(values) > n_samples:
+            # the first file sets the width, only a longer recording grows it
+            wider = np.full((n_rows, len(values)), np.nan, dtype=self.values.dtype)
+            wider[:, :n_samples] = self.values
+            self.values = wider
+        self.values[len(self.subjects), :len(values)] = values
+        self.subjects.append(subject)
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def column_names(self):
+        return [f"SAMPLE {i + 1}" for i in range(self.values.shape[1])]
+
+    def filled(self):
+        return self.values[:len(self.subjects)]
+
+    def to_frame(self):
+        df = pd.DataFrame(self.filled(), index=self.subjects, columns=self.column_names())
+        df.index.name = "Subject"
+        return df
+
+
+def write_feature_workbook(output_file, matrices):
+    """
+    One sheet per feature (Subject, SAMPLE 1 ...), written row by row with xlsxwriter in
+    constant memory mode, so each row is flushed to disk once it is written.
+    Empty cells (NaN) are left blank.
+    """
+    workbook = xlsxwriter.Workbook(output_file, {"constant_memory": True})
+    # the header style pandas' to_excel uses
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    try:
+        for feature, matrix in matrices.items():
+            if not len(matrix):
+                print(f"No data for feature '{feature}', skipping sheet.")
+                continue
+
+            sheet = workbook.add_worksheet(safe_name(feature))
+            sheet.write_row(0, 0, ["Subject"] + matrix.column_names(), header_format)
+            for row_idx, (subject, values) in enumerate(zip(matrix.subjects, matrix.filled()), start=1):
+                sheet.write(row_idx, 0, subject, header_format)
+                sheet.write_row(row_idx, 1, [None if pd.isna(value) else value for value in values.tolist()])
+    finally:
+        workbook.close()
+    print(f"Excel file created successfully: {output_file}")
+
+
+def write_feature_csvs(output_file, matrices):
+    """<output name>_csv/<sheet name>.csv per feature, laid out like the sheets"""
+    csv_dir = os.path.splitext(output_file)[0] + "_csv"
+    os.makedirs(csv_dir, exist_ok=True)
+    for feature, matrix in matrices.items():
+        if len(matrix):
+            matrix.to_frame().to_csv(os.path.join(csv_dir, f"{safe_name(feature)}.csv"))
+    print(f"CSV files created successfully: {csv_dir}")
+    return csv_dir
+
+
+def write_feature_columnar(output_file, matrices):
+    """
+    every feature in one Parquet file next to output_file: a row per subject and a
+    '<sheet name>|SAMPLE n' column per feature and sample
+    """
+    frames = []
+    for feature, matrix in matrices.items():
+        if len(matrix):
+            frame = matrix.to_frame()
+            frame.columns = [f"{safe_name(feature)}|{name}" for name in frame.columns]
+            frames.append(frame)
+    if not frames:
+        return None
+    df = pd.concat(frames, axis=1).reset_index()
+    return write_columnar(df, output_file)
+
+
+def build_excel_from_subject_features(dir_path, output_file, features, workers=1, output_formats=("excel",)):
     """
     Builds an Excel file with one sheet per feature.
     Each sheet contains one row per subject (values extracted from create_features_dataframe).
+    workers > 1 reads the SDI files in that many processes; the sheets are the same as a serial run.
+    output_formats picks what is written (see SDI_OUTPUT_FORMATS): "excel" the workbook at
+    output_file, "csv" a csv per feature in <output name>_csv, "parquet" one columnar file
+    <output name>.parquet with every feature. Returns {feature: FeatureMatrix}.
     """
-    all_feature_rows = {f: [] for f in features}
+    for output_format in output_formats:
+        if output_format not in SDI_OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}', expected one of {SDI_OUTPUT_FORMATS}")
 
     # scan CSVs in directory
+    tasks = []
+    subject_names = {}
     for fname in os.listdir(dir_path):
         if not fname.endswith(".csv"):
             continue
@@ -170,43 +295,34 @@ def build_excel_from_subject_features(dir_path, output_file, features):
             print(f"Skipping file (invalid name): {fname}")
             continue
 
-        subj_number = m.group(1)
-        subject_name = f"subject{subj_number}"
+        subject_names[csv_file] = f"subject{m.group(1)}"
+        tasks.append((csv_file, features))
 
-        # find feature block rows
-        start, end = find_feature_row_range(csv_file)
-        if start is None or end is None:
+    # a row per file is reserved in every feature's matrix up front
+    matrices = {feature: FeatureMatrix(len(tasks)) for feature in features}
+    for csv_file, result, error, _ in parse_files_in_order(read_subject_features, tasks, workers):
+        fname = os.path.basename(csv_file)
+        if error is not None:
+            print(f"Failed to process {fname}: {error}")
+            continue
+        if result is None:
             print(f"Could not find HRV block in file: {fname}")
             continue
 
-        # build df for this subject
-        df = create_features_dataframe(csv_file, start, end)
-
         # collect each of the expected feature rows
-        for feature in features:
-            if feature not in df.index:
-                print(f"Warning: feature '{feature}' missing in {fname}")
-                continue
-
-            row_values = df.loc[feature]
-            row_values.name = subject_name  # store subject name as index
-            all_feature_rows[feature].append(row_values)
-
-    # write Excel - one sheet per feature
-    with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
-        for feature in features:
-            rows = all_feature_rows[feature]
-            if not rows:
-                print(f"No data for feature '{feature}', skipping sheet.")
-                continue
-
-            sheet_df = pd.DataFrame(rows)
-            sheet_df.index.name = "Subject"
-
-            sheet_name = safe_name(feature)
-            sheet_df.to_excel(writer, sheet_name=sheet_name)
-
-    print(f"Excel file created successfully: {output_file}")
+        rows, missing = result
+        for feature in missing:
+            print(f"Warning: feature '{feature}' missing in {fname}")
+        for feature, values in rows.items():
+            matrices[feature].add(subject_names[csv_file], values)
+
+    if "excel" in output_formats:
+        write_feature_workbook(output_file, matrices)
+    if "csv" in output_formats:
+        write_feature_csvs(output_file, matrices)
+    if "parquet" in output_formats:
+        write_feature_columnar(output_file, matrices)
+    return matrices
 
 
 
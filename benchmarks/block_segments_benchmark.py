@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Meta_data_creator import metaDataCsvCreator
+from block_creator import build_subject_meet_index, rows_by_positions, get_segments
+from synthetic import make_kubios_tree
+
+"Compares the vectorized get_segments with the row by row scan on a synthetic meta_data.csv"
+
+
+def time_segments(df, index, vectorized):
+    start = time.perf_counter()
+    blocks = []
+    for subject in sorted(index):
+        for meeting in sorted(index[subject]):
+            blocks.append(get_segments(rows_by_positions(df, index[subject][meeting]), vectorized=vectorized))
+    return time.perf_counter() - start, pd.concat(blocks, ignore_index=True)
+
+
+def main(n_subjects=10, n_meetings=3, n_time_rows=60):
+    with tempfile.TemporaryDirectory() as root:
+        make_kubios_tree(root, n_subjects, n_meetings, n_time_rows)
+        meta_path = metaDataCsvCreator(root)
+        df = pd.read_csv(meta_path)
+
+    index = build_subject_meet_index(df)
+    print(f"meta_data rows: {len(df)}, subjects: {len(index)}")
+
+    loop_sec, loop_df = time_segments(df, index, vectorized=False)
+    vec_sec, vec_df = time_segments(df, index, vectorized=True)
+    pd.testing.assert_frame_equal(loop_df, vec_df)
+
+    print(f"row loop:   {loop_sec:.3f} s")
+    print(f"vectorized: {vec_sec:.3f} s ({loop_sec / vec_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GSR_to_tables import create_statistic_table
+from synthetic import make_gsr_frames
+
+"Compares the vectorized create_statistic_table with the per subject and segment loop"
+
+
+def main(n_subjects=80, n_samples=30000):
+    df_timing, df_data = make_gsr_frames(n_subjects, n_samples)
+    print(f"subjects: {n_subjects}, samples per subject: {n_samples}")
+
+    start = time.perf_counter()
+    loop_stats = create_statistic_table(df_timing, df_data, vectorized=False)
+    loop_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vec_stats = create_statistic_table(df_timing, df_data)
+    vec_sec = time.perf_counter() - start
+
+    pd.testing.assert_index_equal(loop_stats.columns, vec_stats.columns)
+    pd.testing.assert_frame_equal(loop_stats, vec_stats, rtol=1e-9)
+    print(f"max abs difference: {np.nanmax(np.abs(loop_stats.to_numpy() - vec_stats.to_numpy())):.2e}")
+    print(f"loop:       {loop_sec:.3f} s")
+    print(f"vectorized: {vec_sec:.3f} s ({loop_sec / vec_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
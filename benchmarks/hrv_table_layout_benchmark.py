@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_to_filteredTable import generate_clean_metadata
+from synthetic import make_kubios_tree
+
+"Compares the long and wide layouts of the filtered HRV table, serial and in worker processes, on a synthetic corpus"
+
+
+def time_layout(root, out_dir, layout, workers=1):
+    output_csv = os.path.join(out_dir, f"filtered_{layout}_{workers}.csv")
+    start = time.perf_counter()
+    generate_clean_metadata(root, output_csv, layout=layout, workers=workers)
+    return time.perf_counter() - start, output_csv
+
+
+def main(n_subjects=40, n_meetings=3, n_time_rows=20, workers=4):
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as out_dir:
+        make_kubios_tree(root, n_subjects, n_meetings, n_time_rows)
+
+        long_sec, long_csv = time_layout(root, out_dir, "long")
+        wide_sec, wide_csv = time_layout(root, out_dir, "wide")
+        parallel_sec, parallel_csv = time_layout(root, out_dir, "long", workers)
+        with open(long_csv, "rb") as a, open(parallel_csv, "rb") as b:
+            assert a.read() == b.read()
+
+        # a consumer of the long table still has to pivot it
+        start = time.perf_counter()
+        long_df = pd.read_csv(long_csv)
+        long_df["col2"] = pd.to_numeric(long_df["col2"], errors="coerce")
+        long_df.pivot_table(index=["subject", "meet", "state", "type"], columns="col1", values="col2")
+        pivot_sec = time.perf_counter() - start
+        wide_rows = len(pd.read_csv(wide_csv))
+
+    print(f"long rows: {len(long_df)}, wide rows: {wide_rows}")
+    print(f"long table: {long_sec:.3f} s (+ {pivot_sec:.3f} s to read and pivot)")
+    print(f"wide table: {wide_sec:.3f} s ({(long_sec + pivot_sec) / wide_sec:.1f}x)")
+    print(f"long table, {workers} workers: {parallel_sec:.3f} s ({long_sec / parallel_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
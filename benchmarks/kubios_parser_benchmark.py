@@ -0,0 +1,88 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kubios_report import HRV_FEATURES, HRV_FEATURE_REGISTRY, parse_kubios_report
+from synthetic import make_kubios_tree
+
+"Compares one shared parse_kubios_report pass with the three separate reads the meta data, global and filtered tables used to do"
+
+
+def legacy_clean_rows(file_path):
+    with open(file_path, newline='', encoding="utf-8") as f:
+        rows = [[cell if cell.strip() != "" else "NA" for cell in row] for row in csv.reader(f)]
+    return rows, max((len(row) for row in rows), default=0)
+
+
+def legacy_global_rows(file_path):
+    with open(file_path, newline='', encoding="utf-8") as f:
+        return [(row[0], row[1]) for row in csv.reader(f) if len(row) >= 2 and row[0] in HRV_FEATURES]
+
+
+def legacy_segments(file_path):
+    with open(file_path, newline='', encoding="utf-8") as f:
+        reader = list(csv.reader(f))
+    segments = []
+    for i, row in enumerate(reader):
+        if len(row) >= 3 and "Time" in row[1] and "Beats total" in row[2]:
+            headers, units = reader[i - 1], reader[i]
+            for data_row in reader[i + 1:]:
+                if not data_row or not str(data_row[1]).replace('.', '', 1).isdigit():
+                    break
+                segments.append([
+                    (f"{headers[col_idx].strip()} {units[col_idx].strip()}", data_row[col_idx])
+                    for col_idx in range(3, len(data_row))
+                ])
+            break
+    return segments
+
+
+def time_legacy(paths):
+    start = time.perf_counter()
+    results = [(legacy_clean_rows(p), legacy_global_rows(p), legacy_segments(p)) for p in paths]
+    return time.perf_counter() - start, results
+
+
+def time_shared(paths):
+    start = time.perf_counter()
+    results = []
+    for p in paths:
+        report = parse_kubios_report(p, HRV_FEATURE_REGISTRY, keep_rows=True)
+        segments = [
+            list(zip(report.segment_feature_names(len(values)), values)) for values in report.segment_rows
+        ]
+        global_rows = [(feature.label, value) for feature, value in report.global_rows]
+        results.append(((report.rows, report.width), global_rows, segments))
+    return time.perf_counter() - start, results
+
+
+def main(n_subjects=20, n_meetings=3, n_time_rows=200):
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_kubios_tree(root, n_subjects, n_meetings, n_time_rows)
+        print(f"exports: {len(paths)}")
+
+        legacy_sec, legacy = time_legacy(paths)
+        shared_sec, shared = time_shared(paths)
+        assert legacy == shared
+        assert all(segments for _, _, segments in shared)
+
+        # another Kubios version pads the labels differently: the exact list loses them, the registry does not
+        with open(paths[0], encoding="utf-8") as f:
+            text = f.read()
+        for label in HRV_FEATURES:
+            text = text.replace(label, " " + label.strip().replace("  ", " ") + "   ")
+        with open(paths[0], "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"repadded export: exact list keeps {len(legacy_global_rows(paths[0]))} global rows, "
+              f"registry keeps {len(parse_kubios_report(paths[0], HRV_FEATURE_REGISTRY).global_rows)}")
+
+    print(f"three reads per file: {legacy_sec:.3f} s")
+    print(f"one shared pass:      {shared_sec:.3f} s ({legacy_sec / shared_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SDI_heart_rate import (
+    build_excel_from_subject_features, create_features_dataframe, features, safe_name, write_feature_workbook
+)
+from synthetic import make_sdi_dir
+
+"Compares the one-pass SDI parser with the old range scan plus full re-read and the constant memory workbook writer with pandas, and checks the workbook does not depend on workers"
+
+
+def legacy_features_dataframe(csv_file_path):
+    # find_feature_row_range + create_features_dataframe as they were: two reads, line.split(',')
+    start_row = end_row = None
+    with open(csv_file_path, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            first_col = line.split(',')[0].strip().lower()
+            if start_row is None and "mean rr" in first_col and "ms" in first_col:
+                start_row = i
+            if "rmssd" in first_col and "ms" in first_col:
+                end_row = i
+    if start_row is None or end_row is None:
+        return None
+
+    with open(csv_file_path, 'r', encoding='utf-8') as f:
+        all_rows = [line.strip().split(',') for line in f]
+    row_indices = set(range(start_row, end_row + 1))
+    for idx, row in enumerate(all_rows):
+        lc = row[0].strip().lower()
+        if ("sample limits" in lc and "hh:mm:ss" in lc) or ("beats corrected" in lc and "%" in lc) \
+                or "effective data length" in lc:
+            row_indices.add(idx)
+
+    feature_data = {}
+    for row_idx in sorted(row_indices):
+        row = all_rows[row_idx]
+        if not row[0].strip():
+            continue
+        values, empty_count = [], 0
+        for cell in row[1:]:
+            cell = cell.strip()
+            if cell == "":
+                empty_count += 1
+                if empty_count >= 2:
+                    break
+                continue
+            empty_count = 0
+            if "-" in cell and ":" in cell:
+                values.append(cell)
+                continue
+            try:
+                values.append(float(cell))
+            except ValueError:
+                values.append(cell)
+        feature_data[row[0].strip()] = values
+
+    df = pd.DataFrame(feature_data).T
+    df.columns = [f"SAMPLE {i + 1}" for i in range(len(df.columns))]
+    df.index.name = "Feature"
+    return df
+
+
+def legacy_workbook(output_file, matrices):
+    # a Series per subject per feature, pd.DataFrame over them and to_excel, as before
+    with pd.ExcelWriter(output_file, engine="xlsxwriter") as writer:
+        for feature, matrix in matrices.items():
+            rows = [pd.Series(values, index=matrix.column_names(), name=subject)
+                    for subject, values in zip(matrix.subjects, matrix.filled())]
+            sheet_df = pd.DataFrame(rows)
+            sheet_df.index.name = "Subject"
+            sheet_df.to_excel(writer, sheet_name=safe_name(feature))
+
+
+def time_writer(write, output_file, matrices):
+    start = time.perf_counter()
+    write(output_file, matrices)
+    return time.perf_counter() - start
+
+
+def time_parser(parse, paths):
+    start = time.perf_counter()
+    frames = [parse(p) for p in paths]
+    return time.perf_counter() - start, frames
+
+
+def main(n_subjects=200, n_samples=24, n_tail_rows=400, workers=4):
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_sdi_dir(root, n_subjects, n_samples, n_tail_rows)
+
+        legacy_sec, legacy = time_parser(legacy_features_dataframe, paths)
+        one_pass_sec, one_pass = time_parser(create_features_dataframe, paths)
+        for old, new in zip(legacy, one_pass):
+            pd.testing.assert_frame_equal(old.astype(object), new.astype(object))
+
+        serial_xlsx = os.path.join(root, "serial.xlsx")
+        parallel_xlsx = os.path.join(root, "parallel.xlsx")
+        matrices = build_excel_from_subject_features(root, serial_xlsx, features, output_formats=())
+        legacy_xlsx = os.path.join(root, "legacy.xlsx")
+        pandas_write_sec = time_writer(legacy_workbook, legacy_xlsx, matrices)
+        write_sec = time_writer(write_feature_workbook, serial_xlsx, matrices)
+        start = time.perf_counter()
+        build_excel_from_subject_features(root, parallel_xlsx, features, workers=workers)
+        parallel_sec = time.perf_counter() - start
+        for feature_sheet in pd.read_excel(serial_xlsx, sheet_name=None).items():
+            sheet_name, df = feature_sheet
+            pd.testing.assert_frame_equal(df, pd.read_excel(parallel_xlsx, sheet_name=sheet_name))
+            pd.testing.assert_frame_equal(df, pd.read_excel(legacy_xlsx, sheet_name=sheet_name))
+
+    print(f"SDI files: {len(paths)}")
+    print(f"two reads per file: {legacy_sec:.3f} s")
+    print(f"one pass:           {one_pass_sec:.3f} s ({legacy_sec / one_pass_sec:.1f}x)")
+    print(f"pandas to_excel:    {pandas_write_sec:.3f} s")
+    print(f"constant memory:    {write_sec:.3f} s ({pandas_write_sec / write_sec:.1f}x)")
+    print(f"workbook with {workers} workers: {parallel_sec:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
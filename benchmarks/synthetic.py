@@ -0,0 +1,139 @@
+import os
+import random
+
+"Writes synthetic Kubios HRV exports laid out like the drive: subject/meet N/state/file.csv"
+
+GLOBAL_FEATURES = [
+    "  Beats corrected (%):        ", "  Time length (sec):          ",
+    "  Mean RR  (ms):              ", "  SDNN (ms):                  ",
+    "  Mean HR (beats/min):        ", "  SD HR (beats/min):          ",
+    "  Min HR (beats/min):         ", "  Max HR (beats/min):         ",
+    "  RMSSD (ms):                 ", "  LF (ms^2):                  ",
+    "  HF (ms^2):                  ", " LF/HF ratio:                 ",
+]
+
+
+def write_kubios_export(file_path, rnd, n_time_rows=20, n_segments=3):
+    """
+    One export: a global results section, a time-varying table with a two-line
+    "Time" / "(hh:mm:ss)" header and a segment table (feature names above a
+    "Time" / "Beats total" units row).
+    """
+    lines = ["Kubios HRV Standard,,,,", "", "RESULTS FOR SINGLE SAMPLE,,", ""]
+    for feat in GLOBAL_FEATURES:
+        lines.append(f"{feat},{rnd.uniform(1, 900):.3f}")
+    lines.append("")
+    lines.append("Time-varying results,,")
+    lines.append(",Time,Mean RR,Mean HR,RMSSD,PNS index,SNS index")
+    lines.append(",(hh:mm:ss),(ms),(beats/min),(ms),,")
+    for k in range(n_time_rows):
+        sec = k * 30
+        lines.append(
+            f",{sec // 3600:02d}:{(sec // 60) % 60:02d}:{sec % 60:02d},"
+            f"{rnd.uniform(600, 900):.2f},{rnd.uniform(50, 100):.2f},"
+            f"{rnd.uniform(10, 80):.2f},{rnd.uniform(-2, 2):.2f},"
+        )
+    lines.append("")
+    lines.append(",Segment,Segment,Mean RR,Mean HR,RMSSD,LF/HF")
+    lines.append(",Time (s),Beats total,(ms),(beats/min),(ms),")
+    for k in range(n_segments):
+        lines.append(
+            f",{k * 300},{rnd.randint(300, 450)},{rnd.uniform(600, 900):.1f},"
+            f"{rnd.uniform(50, 100):.1f},{rnd.uniform(10, 80):.1f},{rnd.uniform(0.5, 3):.2f}"
+        )
+    lines.append("")
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def make_kubios_tree(root, n_subjects=4, n_meetings=3, n_time_rows=20, seed=0):
+    """
+    Creates root/subNN/meet M/{baseline,therapy,recovery}/*.csv and returns the list of files.
+    Therapy folders hold one file per stage (ECG_A ... ECG_D).
+    """
+    rnd = random.Random(seed)
+    paths = []
+    for s in range(1, n_subjects + 1):
+        for m in range(1, n_meetings + 1):
+            for state in ["baseline", "therapy", "recovery"]:
+                state_dir = os.path.join(root, f"sub{s:02d}", f"meet {m}", state)
+                os.makedirs(state_dir, exist_ok=True)
+                names = [f"s{s}_ECG_{t}.csv" for t in "ABCD"] if state == "therapy" else [f"s{s}_{state}.csv"]
+                for name in names:
+                    file_path = os.path.join(state_dir, name)
+                    write_kubios_export(file_path, rnd, n_time_rows)
+                    paths.append(file_path)
+    return paths
+
+
+def make_gsr_frames(n_subjects=40, n_samples=30000, sampling_rate=10, seed=0):
+    """
+    Synthetic GSR recordings and timing table shaped like the T1 / timing_1 sheets:
+    data has one column per subject id, timing has one row per event (seconds).
+    Some recordings end early and some timings are missing.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    subjects = [str(100 + i) for i in range(n_subjects)]
+    data = {}
+    timing = {}
+    for k, subj in enumerate(subjects):
+        signal = 2 + np.cumsum(rng.normal(0, 0.01, n_samples))
+        signal[n_samples - rng.integers(0, n_samples // 10):] = np.nan
+        data[subj] = signal
+
+        neut1 = rng.uniform(10, 60)
+        trauma = neut1 + rng.uniform(600, 700)
+        timing[subj] = {
+            'neut1': neut1,
+            'stress': neut1 + rng.uniform(180, 220),
+            'neut2': neut1 + rng.uniform(380, 420),
+            'trauma': trauma,
+            'trauma_end': trauma + rng.uniform(60, 90),
+            'end of recording': min(trauma + rng.uniform(300, 900), n_samples / sampling_rate),
+        }
+    df_timing = pd.DataFrame(timing)
+    df_timing.iloc[1, ::7] = np.nan
+    return df_timing, pd.DataFrame(data)
+
+
+SDI_BLOCK_FEATURES = [
+    "Mean RR  (ms):", "STD RR (SDNN) (ms):", "SDNN (ms):", "Mean HR (beats/min):", "SD HR (beats/min):",
+    "Min HR (beats/min):", "Max HR (beats/min):", "RMSSD (ms):",
+]
+
+
+def write_sdi_export(file_path, rnd, n_samples=12, n_tail_rows=200):
+    """
+    One SDI (sample-wise) export: a feature per row and a value per sample column, the sample
+    limits / beats corrected / effective length rows above the Mean RR ... RMSSD block and a long
+    tail of other results after it.
+    """
+    lines = ["Kubios HRV Standard,,", "Sample-wise results,,", ""]
+    limits = [f"00:{5 * k:02d}:00-00:{5 * k + 5:02d}:00" for k in range(n_samples)]
+    lines.append("Sample limits (hh:mm:ss):," + ",".join(limits) + ",,")
+    lines.append("Beats corrected (%):," + ",".join(f"{rnd.uniform(0, 5):.2f}" for _ in range(n_samples)) + ",,")
+    lines.append("Effective data length (s):," + ",".join("300" for _ in range(n_samples)) + ",,")
+    lines.append("")
+    lines.append("Time-Domain Results,,")
+    for feat in SDI_BLOCK_FEATURES:
+        lines.append(f"{feat}," + ",".join(f"{rnd.uniform(40, 900):.3f}" for _ in range(n_samples)) + ",,")
+    lines.append("")
+    for k in range(n_tail_rows):
+        lines.append(f"Other result {k}:," + ",".join(f"{rnd.uniform(0, 1):.4f}" for _ in range(n_samples)))
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def make_sdi_dir(root, n_subjects=50, n_samples=12, n_tail_rows=200, seed=0):
+    """root/HR_SDI_<n>.csv for n subjects; returns the list of files"""
+    rnd = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    paths = []
+    for s in range(1, n_subjects + 1):
+        file_path = os.path.join(root, f"HR_SDI_{s}.csv")
+        write_sdi_export(file_path, rnd, n_samples, n_tail_rows)
+        paths.append(file_path)
+    return paths
@@ -1,25 +1,34 @@
+import numpy as np
 import pandas as pd
 import re
 
+from columnar_cache import read_table, write_columnar
+
 def extract_all_subjects_realtime_blocks(df):
-    list_of_subjects = get_list_subjects_from_df(df)
+    subject_meet_index = build_subject_meet_index(df)
+    list_of_subjects = sorted(subject_meet_index)
     print(f"Meta data contains subjects - {', '.join(list_of_subjects)}")
     all_blocks = []
     for subject in list_of_subjects:
-        subject_full_block = get_single_subject_all_blocks(df, subject)
+        subject_full_block = get_single_subject_all_blocks(df, subject, subject_meet_index[subject])
         if not subject_full_block.empty:
             all_blocks.append(subject_full_block)
     return pd.concat(all_blocks, ignore_index=True) if all_blocks else pd.DataFrame()
 
-def get_single_subject_all_blocks(df, subject):
-    meetings = list_meetings_for_subjects(df, subject)
+def get_single_subject_all_blocks(df, subject, meetings_index=None):
+    """
+    meetings_index: {meeting number: row positions} for this subject, as built by
+    build_subject_meet_index. Computed here when not given.
+    """
+    if meetings_index is None:
+        meetings_index = build_subject_meet_index(df).get(subject, {})
+    meetings = sorted(meetings_index)
     all_blocks = []
     print(f"{subject} has {len(meetings)} meetings")
 
     for meeting in meetings:
         print(f"Adding meet {meeting}")
-        sub_df = sub_df_for_specific_subject_meet(df, subject, meeting)
-        # sub_df = sub_df[sub_df['subject'].astype(str).str.strip() == subject]  # filter subject
+        sub_df = rows_by_positions(df, meetings_index[meeting])
         block_df = get_segments(sub_df)
 
         if not block_df.empty:
@@ -27,6 +36,44 @@ def get_single_subject_all_blocks(df, subject):
 
     return pd.concat(all_blocks, ignore_index=True) if all_blocks else pd.DataFrame()
 
+def normalize_subject_meet_keys(df: pd.DataFrame) -> tuple[pd.Series, pd.Series]:
+    """
+    Returns the stripped subject name and the meeting number of every row of df.
+    Rows without a subject or without a number in 'meet' get NaN.
+    """
+    subject_key = df["subject"].astype(str).str.strip().where(df["subject"].notna())
+    meet_key = (
+        df["meet"]
+        .astype(str)
+        .str.extract(r"(\d+)", expand=False)
+        .astype(float)
+    )
+    return subject_key, meet_key
+
+def build_subject_meet_index(df: pd.DataFrame) -> dict[str, dict[int, np.ndarray]]:
+    """
+    Groups the meta data a single time and returns {subject: {meeting number: row positions}}.
+    Row positions keep the original order of df.
+    """
+    subject_key, meet_key = normalize_subject_meet_keys(df)
+    groups = pd.Series(np.arange(len(df))).groupby(
+        [subject_key.to_numpy(), meet_key.to_numpy()], sort=True
+    ).indices
+
+    index = {}
+    for (subject, meeting), positions in groups.items():
+        index.setdefault(subject, {})[int(meeting)] = positions
+    return index
+
+def rows_by_positions(df: pd.DataFrame, positions: np.ndarray) -> pd.DataFrame:
+    """
+    Returns the rows of df at the given positions. A contiguous run (the usual case,
+    since meta_data.csv is written file by file) is returned as a slice, without copying.
+    """
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return df.iloc[positions[0]:positions[-1] + 1]
+    return df.take(positions)
+
 def list_meetings_for_subjects(df: pd.DataFrame, subject: str) -> list[int]:
     filtered = df[df['subject'].astype(str).str.strip() == subject]
     meets = (
@@ -55,7 +102,87 @@ def sub_df_for_specific_subject_meet(df, subject, meeting_number):
     filtered = df_copy[(df_copy["__subject__"] == subject) & (df_copy["__meet_num__"] == meeting_number)]
     return filtered.drop(columns=["__subject__", "__meet_num__"]).reset_index(drop=True)
 
-def get_segments(df: pd.DataFrame) -> pd.DataFrame:
+TIME_CELL_RE = re.compile(r"^\d{2}:\d{2}:\d{2}$")
+
+def get_segments(df: pd.DataFrame, vectorized: bool = True) -> pd.DataFrame:
+    """
+    Extracts every real-time block (two-line "Time" / "(hh:mm:ss)" header followed by
+    hh:mm:ss rows) from the meta data rows of a single subject and meeting.
+    vectorized=False uses the original row by row scan.
+    """
+    if vectorized:
+        return get_segments_vectorized(df)
+    return get_segments_by_rows(df)
+
+def build_full_header(row1: list, row2: list) -> list[str]:
+    """
+    builds unique full header names by zipping the two header lines
+    """
+    seen = {}
+    full_header = []
+    for h1, h2 in zip(row1, row2):
+        name = f"{h1} {h2}".strip()
+        name = re.sub(r"\s+", " ", name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        full_header.append(name)
+    return full_header
+
+def cells_contain(cells: pd.DataFrame, text: str) -> np.ndarray:
+    """
+    True for every row where at least one cell contains text.
+    Numeric columns can never contain it, so only text columns are searched.
+    """
+    found = np.zeros(len(cells), dtype=bool)
+    for col in cells.select_dtypes(exclude="number").columns:
+        found |= cells[col].astype(str).str.contains(text, regex=False, na=False).to_numpy(dtype=bool)
+    return found
+
+def get_segments_vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    cells = df.iloc[:, 4:]
+    n_rows = len(df)
+    if n_rows < 2:
+        return pd.DataFrame()
+
+    # detect all headers at once: a "Time" line followed by a "(hh:mm:ss)" line
+    has_time = cells_contain(cells, "Time")
+    has_hh = cells_contain(cells, "(hh:mm:ss)")
+    header_rows = np.flatnonzero(has_time[:-1] & has_hh[1:])
+
+    rt_blocks = []
+    time_runs = {}  # time column position -> sorted positions of rows that are NOT hh:mm:ss
+    for i in header_rows:
+        row1 = cells.iloc[i].fillna("").astype(str).str.strip().tolist()
+        row2 = cells.iloc[i + 1].fillna("").astype(str).str.strip().tolist()
+        full_header = build_full_header(row1, row2)
+        time_idx = next(idx for idx, h in enumerate(full_header) if h.startswith("Time"))
+
+        # run-length grouping of the time column: a block ends at the first non hh:mm:ss row
+        if time_idx not in time_runs:
+            time_cells = cells.iloc[:, time_idx].astype(str).str.strip()
+            is_time = time_cells.str.match(TIME_CELL_RE, na=False).to_numpy(dtype=bool)
+            time_runs[time_idx] = np.flatnonzero(~is_time)
+        breaks = time_runs[time_idx]
+        start = i + 2
+        pos = np.searchsorted(breaks, start)
+        end = breaks[pos] if pos < len(breaks) else n_rows
+
+        if end > start:
+            # one slice per block; rebuilt from rows so column dtypes are inferred as before
+            block_df = pd.DataFrame(cells.iloc[start:end].to_numpy(dtype=object).tolist(), columns=full_header)
+            # prepend metadata columns in correct order
+            block_df.insert(0, "therapy", df.iat[i, 3])
+            block_df.insert(0,   "state", df.iat[i, 2])
+            block_df.insert(0,    "meeting", df.iat[i, 1])
+            block_df.insert(0,  "sub", df.iat[i, 0])
+            rt_blocks.append(block_df)
+
+    return pd.concat(rt_blocks, ignore_index=True) if rt_blocks else pd.DataFrame()
+
+def get_segments_by_rows(df: pd.DataFrame) -> pd.DataFrame:
 
     rt_blocks = []
 
@@ -67,18 +194,7 @@ def get_segments(df: pd.DataFrame) -> pd.DataFrame:
 
         # detect header: first line has "Time", second has "(hh:mm:ss)"
         if row1.str.contains("Time", regex=False).any() and row2.str.contains(r"\(hh:mm:ss\)", regex=True).any():
-            #build unique full header names by zipping row1 & row2
-            seen = {}
-            full_header = []
-            for h1, h2 in zip(row1.tolist(), row2.tolist()):
-                name = f"{h1} {h2}".strip()
-                name = re.sub(r"\s+", " ", name)
-                if name in seen:
-                    seen[name] += 1
-                    name = f"{name}.{seen[name]}"
-                else:
-                    seen[name] = 0
-                full_header.append(name)
+            full_header = build_full_header(row1.tolist(), row2.tolist())
 
             # collect the numeric rows immediately after header
             data_rows = []
@@ -86,7 +202,7 @@ def get_segments(df: pd.DataFrame) -> pd.DataFrame:
             for j in range(i + 2, len(df)):
                 cell = str(df.iat[j, 4 + time_idx]).strip()
                 # stop when Time column no longer matches hh:mm:ss
-                if not re.match(r"^\d{2}:\d{2}:\d{2}$", cell):
+                if not TIME_CELL_RE.match(cell):
                     break
                 data_rows.append(df.iloc[j, 4 :].tolist())
 
@@ -130,16 +246,24 @@ def drop_empty_D_E(df: pd.DataFrame) -> pd.DataFrame:
                 df_clean.drop(columns=[col], inplace=True)
     return df_clean
 
-def create_block(path):
-    big_df = pd.read_csv(path)
+def build_block(big_df: pd.DataFrame) -> pd.DataFrame:
+    """the block table of a loaded meta data table"""
     real_time_df = extract_all_subjects_realtime_blocks(big_df)
 
     #skip every second row to avoid overlap and reset the index row count --> can remove this line to go back to overlap
     real_time_df = real_time_df.iloc[::2].reset_index(drop=True)
 
-    final_df = drop_empty_D_E(real_time_df)
-    returned_path = path.replace("meta_data.csv", "block.csv")
-    return returned_path, final_df.to_csv(returned_path, index=False)
-
-
+    return drop_empty_D_E(real_time_df)
 
+def create_block(path, columnar: bool = False):
+    """
+    Builds block.csv next to the meta data at path. The meta data is read from its fresh
+    meta_data.parquet copy when there is one. columnar=True also writes a typed block.parquet.
+    """
+    big_df = read_table(path)
+    final_df = build_block(big_df)
+    returned_path = path.replace("meta_data.csv", "block.csv")
+    saved = final_df.to_csv(returned_path, index=False)
+    if columnar:
+        write_columnar(final_df, returned_path)
+    return returned_path, saved
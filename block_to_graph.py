@@ -1,34 +1,60 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
+from columnar_cache import as_read_from_csv, columnar_column_names, has_fresh_columnar, read_table
+from render_cache import RenderCache, render_key
+
 """# === Configurable Variables ===
 EXCEL_PATH = 'data.xlsx'            # Path to your Excel file
 SUBJECT_ID = 15                     # Subject ID to plot
 OUTPUT_DIR = '.'                    # Directory to save the output
 PARAMETER_NAME = 'Mean HR'          # Change to any parameter name from the Excel"""
 
+BLOCK_KEY_COLUMNS = ['sub', 'meeting', 'state', 'therapy', 'subject', 'meet']
+
 # === Load and clean data ===
-def load_clean_data(filepath, parameter_name):
-    df = pd.read_csv(filepath)
-    df.columns = df.columns.str.strip()
+def block_columns(columns, parameter_name):
+    """the key, time and parameter columns of a block"""
+    parameter_names = [parameter_name] if isinstance(parameter_name, str) else parameter_name
+    return [
+        col for col in columns
+        if col.strip() in BLOCK_KEY_COLUMNS or any(p in col.strip() for p in parameter_names)
+        or ('Time' in col and 'hh' in col)
+    ]
 
-    # Find the actual parameter column
-    param_col = [col for col in df.columns if parameter_name in col][0]
-    print("Using parameter column:", param_col)
+def load_block(filepath, parameter_name):
+    """
+    Reads the block. With a fresh block.parquet only the key, time and parameter columns are loaded.
+    filepath may also be the block itself, handed over in memory as block_creator.build_block
+    returns it; only its needed columns are typed as read_csv would load them.
+    parameter_name can be a single name or a list of names.
+    """
+    if isinstance(filepath, pd.DataFrame):
+        return as_read_from_csv(filepath[block_columns(filepath.columns, parameter_name)])
+    if not has_fresh_columnar(filepath):
+        return pd.read_csv(filepath)
 
-    # Find the time column
-    time_col = [col for col in df.columns if 'Time' in col and 'hh' in col][0]
-    print("Using time column:", time_col)
+    return read_table(filepath, columns=block_columns(columnar_column_names(filepath), parameter_name))
 
-    # Clean and prepare
+def block_source(filepath):
+    return "block in memory" if isinstance(filepath, pd.DataFrame) else filepath
+
+def find_time_column(columns):
+    return [col for col in columns if 'Time' in col and 'hh' in col][0]
+
+def clean_block_keys(df, time_col):
+    """
+    subject and meeting to numbers, state/therapy/time to stripped strings, time column renamed to 'Time'
+    """
     df = df.copy()
     df['sub'] = df['sub'].str.extract(r'(\d+)').astype(int)
     df['meeting'] = df['meeting'].str.extract(r'(\d+)').astype(int)
-    df[param_col] = pd.to_numeric(df[param_col], errors='coerce')
     df.rename(columns={
-        param_col: 'value',
         time_col: 'Time',
         'subject': 'sub',
         'meet': 'meeting'
@@ -40,9 +66,68 @@ def load_clean_data(filepath, parameter_name):
     else:
         df['therapy'] = df['therapy'].astype(str).str.strip().str.upper()
     df['Time'] = df['Time'].astype(str).str.strip()
+    return df
+
+def load_clean_data(filepath, parameter_name):
+    df = load_block(filepath, parameter_name)
+    df.columns = df.columns.str.strip()
+
+    # Find the actual parameter column
+    param_col = [col for col in df.columns if parameter_name in col][0]
+    print("Using parameter column:", param_col)
+
+    # Find the time column
+    time_col = find_time_column(df.columns)
+    print("Using time column:", time_col)
+
+    # Clean and prepare
+    df = clean_block_keys(df, time_col)
+    df[param_col] = pd.to_numeric(df[param_col], errors='coerce')
+    df.rename(columns={param_col: 'value'}, inplace=True)
 
     return df
 
+def load_clean_block(filepath, parameter_names):
+    """
+    Loads and cleans the block once for several parameters.
+    Returns the cleaned block and {parameter: its column}; parameters without a column are left out.
+    """
+    df = load_block(filepath, parameter_names)
+    df.columns = df.columns.str.strip()
+
+    param_cols = {}
+    for parameter in parameter_names:
+        matches = [col for col in df.columns if parameter in col]
+        if not matches:
+            print(f"No column found for parameter {parameter}, skipping it")
+            continue
+        param_cols[parameter] = matches[0]
+        print(f"Using parameter column for {parameter}:", matches[0])
+
+    time_col = find_time_column(df.columns)
+    print("Using time column:", time_col)
+
+    return clean_block_keys(df, time_col), param_cols
+
+def feature_frame(df, param_col):
+    """
+    the key columns of a cleaned block plus the parameter as 'value', as load_clean_data returns them
+    """
+    return df[['sub', 'meeting', 'state', 'therapy', 'Time']].assign(
+        value=pd.to_numeric(df[param_col], errors='coerce')
+    )
+
+def feature_graphs_dir(output_root, parameter_name):
+    safe_feature = parameter_name.replace(" ", "_").replace("/", "_")
+    return os.path.join(output_root, f"{safe_feature}_graphs")
+
+GRAPH_DPI = 300
+# plotting parameters that are part of every render cache key; bump the version when the figure layout changes
+GRAPH_RENDER_PARAMS = {'dpi': GRAPH_DPI, 'normalization': 'per-subject min-max', 'version': 1}
+
+def subject_graph_filename(subject_id, parameter_name):
+    return f'subject_{subject_id}_{parameter_name.replace(" ", "_").lower()}_analysis.png'
+
 def plot_subject_meetings(df, subject_id, parameter_name, output_dir):
     subject_data = df[df['sub'] == subject_id].copy()
     min_val = subject_data['value'].min()
@@ -148,8 +233,8 @@ def plot_subject_meetings(df, subject_id, parameter_name, output_dir):
     ], loc='lower right', fontsize=10)
 
     plt.tight_layout()
-    filename = f'subject_{subject_id}_{parameter_name.replace(" ", "_").lower()}_analysis.png'
-    plt.savefig(os.path.join(output_dir, filename), dpi=300)
+    filename = subject_graph_filename(subject_id, parameter_name)
+    plt.savefig(os.path.join(output_dir, filename), dpi=GRAPH_DPI)
     plt.close()
     print(f"✅ Saved: {filename}")
 
@@ -158,20 +243,102 @@ def generate_graphs(excel_path, parameter, subject_id, output_dir):
     os.makedirs(output_dir, exist_ok=True)
     plot_subject_meetings(df, subject_id, parameter, output_dir)
 
-def generate_graphs_for_all_subjects(block_path, parameter, output_dir):
+def generate_graphs_for_all_subjects(block_path, parameter, output_dir, workers=1, force=False):
 
-    print(f"Loading data from: {block_path}")
+    print(f"Loading data from: {block_source(block_path)}")
     df = load_clean_data(block_path, parameter)
+    plot_all_subjects(df, parameter, output_dir, workers, force)
+
+SUBJECT_PLOT_COLUMNS = ['meeting', 'state', 'therapy', 'Time', 'value']
+
+def subject_arrays(subject_df):
+    """
+    compact per-subject payload for a render worker: one array per column the plot uses
+    """
+    return {col: subject_df[col].to_numpy() for col in SUBJECT_PLOT_COLUMNS}
 
+def use_agg_backend():
+    matplotlib.use('Agg')
+
+def render_subject(subject_id, arrays, parameter, output_dir):
+    """
+    Draws one subject's figure from its arrays. Returns (subject_id, seconds, error).
+    Module level so it can run in a worker process.
+    """
+    start = time.perf_counter()
+    try:
+        subject_df = pd.DataFrame(arrays)
+        subject_df['sub'] = subject_id
+        plot_subject_meetings(subject_df, subject_id, parameter, output_dir)
+        error = None
+    except Exception as e:
+        error = e
+    return subject_id, time.perf_counter() - start, error
+
+def plot_all_subjects(df, parameter, output_dir, workers=1, force=False):
+    """
+    Renders every subject's figure. workers > 1 renders them in a process pool (Agg backend,
+    one figure per task). Prints every subject's render time and a summary.
+    Subjects whose data and plotting parameters did not change since their figure was drawn
+    are skipped (see render_cache); force=True redraws everything.
+    """
     subject_ids = df['sub'].dropna().astype(int).unique()
     os.makedirs(output_dir, exist_ok=True)
 
     print(f"Found {len(subject_ids)} subjects: {list(subject_ids)}")
+    by_subject = {sid: rows for sid, rows in df.groupby('sub', sort=False)}
+    cache = RenderCache(output_dir, force=force)
+    tasks = []
+    keys = {}
     for sid in subject_ids:
-        print(f"   • Generating graph for subject {sid}...")
-        try:
-            plot_subject_meetings(df, sid, parameter, output_dir)
-        except Exception as e:
-            print(f"     Error for subject {sid}: {e}")
+        subject_df = by_subject[sid][SUBJECT_PLOT_COLUMNS]
+        keys[sid] = render_key(subject_df, parameter=parameter, **GRAPH_RENDER_PARAMS)
+        if cache.is_fresh(subject_graph_filename(sid, parameter), keys[sid]):
+            print(f"   • Subject {sid} unchanged, keeping its graph")
+            continue
+        tasks.append((sid, subject_arrays(subject_df), parameter, output_dir))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = []
+        for task in tasks:
+            print(f"   • Generating graph for subject {task[0]}...")
+            results.append(render_subject(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_agg_backend) as pool:
+            futures = [pool.submit(render_subject, *task) for task in tasks]
+            results = [future.result() for future in as_completed(futures)]
+    wall = time.perf_counter() - start
+
+    render_times = {}
+    for sid, seconds, error in results:
+        if error is not None:
+            print(f"     Error for subject {sid}: {error}")
+        else:
+            render_times[sid] = seconds
+            cache.record(subject_graph_filename(sid, parameter), keys[sid])
+            print(f"     subject {sid} rendered in {seconds:.2f}s")
+    cache.save()
+
+    if render_times:
+        slowest = max(render_times, key=render_times.get)
+        print(f"Rendered {len(render_times)} subjects with {max(workers, 1)} worker(s) in {wall:.2f}s "
+              f"(sum {sum(render_times.values()):.2f}s, slowest subject {slowest}: {render_times[slowest]:.2f}s)")
+    print(f"All subject graphs generated ({len(subject_ids) - len(tasks)} unchanged, skipped).")
+    return render_times
+
+def generate_graphs_for_features(block_path, parameters, output_root, workers=1, force=False):
+    """
+    Loads and cleans the block a single time and renders the per-subject graphs of every
+    parameter into output_root/<parameter>_graphs.
+    Returns {parameter: graphs directory} for the parameters found in the block.
+    """
+    print(f"Loading data from: {block_source(block_path)}")
+    df, param_cols = load_clean_block(block_path, parameters)
 
-    print("All subject graphs generated.")
+    graphs_dirs = {}
+    for parameter, param_col in param_cols.items():
+        print(f"Generating graphs for {parameter}")
+        graphs_dirs[parameter] = feature_graphs_dir(output_root, parameter)
+        plot_all_subjects(feature_frame(df, param_col), parameter, graphs_dirs[parameter], workers, force)
+    return graphs_dirs
@@ -0,0 +1,162 @@
+import importlib.util
+import json
+import os
+import pandas as pd
+
+"Typed Parquet copies of meta_data.csv and block.csv, so later runs skip csv parsing and load only the columns they need"
+
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# key columns stored as categories (meta_data uses subject/meet/state/type, block uses sub/meeting/state/therapy)
+CATEGORICAL_COLUMNS = ["subject", "meet", "state", "type", "sub", "meeting", "therapy"]
+
+# Parquet metadata key holding the fingerprint of the csv a copy was written from
+CSV_FINGERPRINT_KEY = b"csv_fingerprint"
+
+
+def columnar_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def csv_fingerprint(csv_path: str):
+    """{size, mtime_ns} of the csv, None when there is none"""
+    if not os.path.isfile(csv_path):
+        return None
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def has_fresh_columnar(csv_path: str) -> bool:
+    """
+    True when the Parquet copy exists and was written from the csv as it is now (or the csv
+    is gone): the size and mtime_ns of the csv are stored in the copy's metadata and compared,
+    so a csv rewritten without the copy (e.g. an incremental meta data update) makes it stale
+    even within the same mtime tick. Copies without a stored fingerprint count as stale.
+    """
+    parquet_path = columnar_path(csv_path)
+    if not PARQUET_AVAILABLE or not os.path.isfile(parquet_path):
+        return False
+    fingerprint = csv_fingerprint(csv_path)
+    if fingerprint is None:
+        return True
+
+    import pyarrow.parquet as pq
+    stored = (pq.read_schema(parquet_path).metadata or {}).get(CSV_FINGERPRINT_KEY)
+    return stored is not None and json.loads(stored) == fingerprint
+
+
+def to_typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    key columns become categorical, text columns that hold only numbers become numeric
+    (as pd.read_csv would infer them)
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif not pd.api.types.is_numeric_dtype(df[col]):
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+# strings pd.read_csv reads as NaN by default
+CSV_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+# the dtype pd.read_csv gives text columns (object, or str where pandas infers strings)
+CSV_TEXT_DTYPE = pd.Series(["text"]).dtype
+
+
+def as_read_from_csv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The frame as to_csv(index=False) and pd.read_csv would give it back, without the text round
+    trip: NA strings become NaN, text columns whose values all parse as numbers become numeric,
+    the other text columns hold strings, and repeated column names get read_csv's .1, .2 suffixes.
+    Lets a pipeline stage hand its table to the next one in memory.
+    """
+    columns = {}
+    seen = {}
+    for position, name in enumerate(df.columns):
+        col = df.iloc[:, position]
+        if col.dtype == object or pd.api.types.is_string_dtype(col):
+            col = col.where(~(col.isna() | col.isin(CSV_NA_VALUES)))
+            try:
+                col = pd.to_numeric(col)
+            except (ValueError, TypeError):
+                if pd.api.types.infer_dtype(col, skipna=True) != "string":
+                    col = col.map(str, na_action="ignore")
+                col = col.astype(CSV_TEXT_DTYPE)
+
+        name = str(name)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        columns[f"{name}.{count}" if count else name] = col.reset_index(drop=True)
+    return pd.DataFrame(columns)
+
+
+def write_columnar(df: pd.DataFrame, csv_path: str):
+    """
+    writes a typed Parquet copy next to csv_path, recording the csv's fingerprint (write the
+    csv first); needs pyarrow
+    """
+    if not PARQUET_AVAILABLE:
+        print("pyarrow is not installed, skipping the columnar copy")
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_path = columnar_path(csv_path)
+    table = pa.Table.from_pandas(to_typed_frame(df), preserve_index=False)
+    fingerprint = csv_fingerprint(csv_path)
+    if fingerprint is not None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[CSV_FINGERPRINT_KEY] = json.dumps(fingerprint).encode()
+        table = table.replace_schema_metadata(metadata)
+    pq.write_table(table, parquet_path)
+    print(f"Columnar copy saved: {parquet_path}")
+    return parquet_path
+
+
+def columnar_column_names(csv_path: str) -> list[str]:
+    """
+    column names of the Parquet copy, read from its schema without loading any data
+    """
+    import pyarrow.parquet as pq
+    return pq.read_schema(columnar_path(csv_path)).names
+
+
+def read_table(csv_path: str, columns: list = None) -> pd.DataFrame:
+    """
+    Loads a table, preferring its fresh Parquet copy (only the requested columns) over the csv.
+    """
+    if has_fresh_columnar(csv_path):
+        return pd.read_parquet(columnar_path(csv_path), columns=columns)
+    return pd.read_csv(csv_path, usecols=columns)
+
+
+def write_parquet_frame(df: pd.DataFrame, parquet_path: str) -> bool:
+    """
+    Writes df as it is (index included, nothing retyped) to parquet_path. False when pyarrow is
+    missing or a column holds values Parquet cannot store in one type (e.g. numbers mixed with text).
+    """
+    if not PARQUET_AVAILABLE:
+        return False
+    import pyarrow as pa
+    try:
+        df.to_parquet(parquet_path)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        print(f"Cannot store {parquet_path} as Parquet: {e}")
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+        return False
+    return True
+
+
+def read_parquet_frame(parquet_path: str) -> pd.DataFrame:
+    """a frame written by write_parquet_frame"""
+    return pd.read_parquet(parquet_path)
@@ -1,32 +1,18 @@
 import os
 import pandas as pd
-import csv
 import re
 from pathlib import Path
 
-# features
-ALLOWED_FEATURES = [
-    "  Beats corrected (%):        ", "  Time length (sec):          ",
-    "  Mean RR  (ms):              ", "  SDNN (ms):                  ",
-    "  Mean HR (beats/min):        ", "  SD HR (beats/min):          ",
-    "  Min HR (beats/min):         ", "  Max HR (beats/min):         ",
-    "  RMSSD (ms):                 ", "  NNxx (beats):               ",
-    "  pNNxx (%):                  ", "  SDANN (ms):                 ",
-    "  SDNN index (ms):            ", "  RR tri index:               ",
-    "  TINN (ms):                  ", "  DC (ms):                    ",
-    "  DCmod (ms):                 ", "  AC (ms):                    ",
-    "  ACmod (ms):                 ", "  VLF (Hz):                   ",
-    "  LF (Hz):                    ", "  HF (Hz):                    ",
-    "  VLF (ms^2):                 ", "  LF (ms^2):                  ",
-    "  HF (ms^2):                  ", "  VLF (log):                  ",
-    "  LF (log):                   ", "  HF (log):                   ",
-    "  VLF (%):                    ", "  LF (%):                     ",
-    "  HF (%):                     ", "  LF (n.u.):                  ",
-    "  HF (n.u.):                  ", "  Total power (ms^2):         ",
-    " LF/HF ratio:                 ", " RESP (Hz):                   "
-]
+from kubios_report import HRV_FEATURE_REGISTRY, WideTable, check_layout, parse_kubios_report
+from parallel_files import batches_by_folder, parse_files_in_order, pool_workers
 
-def process_file_final(file_path):
+# features (see kubios_report.HRV_FEATURES)
+ALLOWED_FEATURES = HRV_FEATURE_REGISTRY
+# columns of the long table, whose rows are tuples in this order
+LONG_COLUMNS = ["subject", "meet", "state", "type", "col1", "col2"]
+
+def file_keys(file_path):
+    """(subject, meet, state) of an export at subject/meet/state/file.csv"""
     parts = Path(file_path).parts
     subject, meet, state = parts[-4], parts[-3], parts[-2]
     filename = parts[-1]
@@ -39,56 +25,102 @@ def process_file_final(file_path):
             state = f"therapy_{letter}"
         else:
             state = "therapy" # default
+    return subject, meet, state
+
+def process_file_final(file_path):
+    subject, meet, state = file_keys(file_path)
 
     extracted_data = []
-    with open(file_path, newline='', encoding="utf-8") as f:
-        reader = list(csv.reader(f))
+    # global rows and the segment table in one pass over the file
+    report = parse_kubios_report(file_path, ALLOWED_FEATURES)
 
     # global
-    for row in reader:
-        if len(row) < 2: continue
-        feat = row[0]
-        if feat in ALLOWED_FEATURES:
-            extracted_data.append({
-                "subject": subject, "meet": meet, "state": state,
-                "type": "global", "col1": feat, "col2": row[1]
-            })
+    for feature, value in report.global_rows:
+        extracted_data.append((subject, meet, state, "global", feature.label, value))
 
     # segments
-    for i, row in enumerate(reader):
-        if len(row) >= 3 and "Time" in row[1] and "Beats total" in row[2]:
-            headers, units = reader[i-1], reader[i]
-            segment_idx = 1
-            for data_row in reader[i+1:]:
-                if not data_row or not str(data_row[1]).replace('.','',1).isdigit():
-                    break
-                
-                for col_idx in range(3, len(data_row)):
-                    feat_name = headers[col_idx].strip()
-                    unit_name = units[col_idx].strip()
-                    full_feat = f"{feat_name} {unit_name}"
-                    
-                    extracted_data.append({
-                        "subject": subject, "meet": meet, "state": state,
-                        "type": f"segment{segment_idx}", "col1": full_feat, "col2": data_row[col_idx]
-                    })
-                segment_idx += 1
-            break
+    for segment_idx, values in enumerate(report.segment_rows, start=1):
+        for full_feat, value in zip(report.segment_feature_names(len(values)), values):
+            extracted_data.append((subject, meet, state, f"segment{segment_idx}", full_feat, value))
             
     return extracted_data
 
-def generate_clean_metadata(root_folder, output_csv):
-    all_rows = []
-    print(f"Starting to process folders in: {root_folder}")
-    
+def file_wide_rows(file_path):
+    """
+    rows of the wide table for one file as (keys, names, values): 'global' with its global
+    features and 'segmentN' per segment row, columns named '<name> (<unit>)'
+    """
+    subject, meet, state = file_keys(file_path)
+    report = parse_kubios_report(file_path, ALLOWED_FEATURES)
+
+    rows = []
+    # no global row for a csv without global features (not a Kubios export)
+    if report.global_rows:
+        rows.append((
+            (subject, meet, state, "global"),
+            tuple(feature.full_name for feature, _ in report.global_rows),
+            tuple(value for _, value in report.global_rows),
+        ))
+    for segment_idx, values in enumerate(report.segment_rows, start=1):
+        names = tuple(name.strip() for name in report.segment_feature_names(len(values)))
+        rows.append(((subject, meet, state, f"segment{segment_idx}"), names, tuple(values)))
+    return rows
+
+def extract_file(file_path, layout):
+    """one file's rows in the given layout"""
+    if layout == "wide":
+        return file_wide_rows(file_path)
+    return process_file_final(file_path)
+
+def extract_folder(folder, file_paths, layout):
+    """
+    the rows of every file of one subject folder, one list per file; module level for worker
+    processes, which get a whole folder per task so small exports do not cost a round trip each
+    """
+    runs = []
+    for file_path in file_paths:
+        try:
+            runs.append(extract_file(file_path, layout))
+        except Exception as e:
+            print(f"Failed to process {file_path}: {e}")
+    return runs
+
+def iter_export_files(root_folder):
     for root, _, files in os.walk(root_folder):
         for file in files:
             #dont process meta data files
             if file.endswith(".csv") and "meta_data" not in file:
-                all_rows.extend(process_file_final(os.path.join(root, file)))
-    
-    df = pd.DataFrame(all_rows)
+                yield os.path.join(root, file)
+
+def generate_clean_metadata(root_folder, output_csv, layout="long", workers=1):
+    """
+    layout="long": one row per (file, feature, segment) with the raw value in col2.
+    layout="wide": one row per subject/meet/state/type with a numeric column per feature.
+    workers > 1 extracts the subject folders in up to that many processes (no more than there
+    are folders or usable CPUs). The folders' rows are joined in walk order, so the table is the
+    same for any number of workers.
+    """
+    check_layout(layout)
+    print(f"Starting to process folders in: {root_folder}")
+
+    tasks = [(folder, files, layout) for folder, files in batches_by_folder(root_folder, iter_export_files(root_folder))]
+    runs = []
+    for folder, folder_runs, error, _ in parse_files_in_order(extract_folder, tasks, pool_workers(workers, len(tasks))):
+        if error is not None:
+            print(f"Failed to process {folder}: {error}")
+            continue
+        runs.extend(folder_runs)
+
+    if layout == "wide":
+        wide = WideTable(["subject", "meet", "state", "type"])
+        for run in runs:
+            for keys, names, values in run:
+                wide.add_row(keys, names, values)
+        df = wide.to_frame()
+    else:
+        df = pd.DataFrame([row for run in runs for row in run], columns=LONG_COLUMNS)
     df.to_csv(output_csv, index=False, encoding='utf-8')
     print(f"Success! Created {output_csv} with {len(df)} rows.")
 
-generate_clean_metadata("/Users/yuvalnadam/Desktop/CS/Cognition/data", "/Users/yuvalnadam/Desktop/CS/Cognition/data/filtered_meta_data.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    generate_clean_metadata("/Users/yuvalnadam/Desktop/CS/Cognition/data", "/Users/yuvalnadam/Desktop/CS/Cognition/data/filtered_meta_data.csv")
@@ -1,32 +1,20 @@
 import os
 import pandas as pd
-import csv
 import re
 from pathlib import Path
 
-#list of features
-ALLOWED_FEATURES = [
-    "  Beats corrected (%):        ", "  Time length (sec):          ",
-    "  Mean RR  (ms):              ", "  SDNN (ms):                  ",
-    "  Mean HR (beats/min):        ", "  SD HR (beats/min):          ",
-    "  Min HR (beats/min):         ", "  Max HR (beats/min):         ",
-    "  RMSSD (ms):                 ", "  NNxx (beats):               ",
-    "  pNNxx (%):                  ", "  SDANN (ms):                 ",
-    "  SDNN index (ms):            ", "  RR tri index:               ",
-    "  TINN (ms):                  ", "  DC (ms):                    ",
-    "  DCmod (ms):                 ", "  AC (ms):                    ",
-    "  ACmod (ms):                 ", "  VLF (Hz):                   ",
-    "  LF (Hz):                    ", "  HF (Hz):                    ",
-    "  VLF (ms^2):                 ", "  LF (ms^2):                  ",
-    "  HF (ms^2):                  ", "  VLF (log):                  ",
-    "  LF (log):                   ", "  HF (log):                   ",
-    "  VLF (%):                    ", "  LF (%):                     ",
-    "  HF (%):                     ", "  LF (n.u.):                  ",
-    "  HF (n.u.):                  ", "  Total power (ms^2):         ",
-    " LF/HF ratio:                 ", " RESP (Hz):                   "
-]
+from kubios_report import (
+    HRV_FEATURE_REGISTRY, WideTable, check_layout, merge_in_key_order, parse_kubios_report, unique_rows
+)
+from parallel_files import batches_by_folder, parse_files_in_order, pool_workers
 
-def process_file_global_only(file_path):
+#features (see kubios_report.HRV_FEATURES)
+ALLOWED_FEATURES = HRV_FEATURE_REGISTRY
+# columns of the long table, whose rows are tuples in this order
+LONG_COLUMNS = ["subject", "meet", "state", "type", "col1", "col2"]
+
+def file_keys(file_path):
+    """(subject, meet, state) of an export at subject/meet/state/file.csv"""
     parts = Path(file_path).parts
     subject, meet, state = parts[-4], parts[-3], parts[-2]
     filename = parts[-1]
@@ -35,47 +23,102 @@ def process_file_global_only(file_path):
     if "therapy" in state.lower():
         match = re.search(r'ECG_([A-Z])', filename)
         state = f"therapy_{match.group(1).lower()}" if match else "therapy"
+    return subject, meet, state
 
-    extracted_rows = []
+def read_report(file_path):
     try:
-        with open(file_path, newline='', encoding="utf-8") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) < 2: continue
-                feat_name = row[0]
-                if feat_name in ALLOWED_FEATURES:
-                    extracted_rows.append({
-                        "subject": subject,
-                        "meet": meet,
-                        "state": state,
-                        "type": "global",
-                        "col1": feat_name,
-                        "col2": row[1]
-                    })
+        return parse_kubios_report(file_path, ALLOWED_FEATURES)
     except Exception as e:
-        print(f"Error reading {filename}: {e}")
-        
+        print(f"Error reading {Path(file_path).name}: {e}")
+        return None
+
+def process_file_global_only(file_path):
+    subject, meet, state = file_keys(file_path)
+
+    extracted_rows = []
+    report = read_report(file_path)
+    if report is None:
+        return extracted_rows
+
+    for feature, value in report.global_rows:
+        extracted_rows.append((subject, meet, state, "global", feature.label, value))
+
     return extracted_rows
 
-def generate_global_metadata(root_folder, output_csv):
-    all_data = []
-    print(f"Starting to process global data from: {root_folder}")
-    
+def file_global_wide_rows(file_path):
+    """the file's row of the wide table: (keys, feature names '<name> (<unit>)', values)"""
+    report = read_report(file_path)
+    # no row for a csv without global features (not a Kubios export)
+    if report is None or not report.global_rows:
+        return []
+    names = tuple(feature.full_name for feature, _ in report.global_rows)
+    values = tuple(value for _, value in report.global_rows)
+    return [(file_keys(file_path), names, values)]
+
+def long_row_key(row):
+    return row[:3]
+
+def wide_row_key(row):
+    # (keys, names, values)
+    return row[0]
+
+def extract_file(file_path, layout):
+    """one file's rows in the given layout, duplicates already dropped"""
+    if layout == "wide":
+        return file_global_wide_rows(file_path)
+    return unique_rows(process_file_global_only(file_path), tuple)
+
+def extract_folder(folder, file_paths, layout):
+    """
+    the rows of every file of one subject folder, one list per file; module level for worker
+    processes, which get a whole folder per task so small exports do not cost a round trip each
+    """
+    runs = []
+    for file_path in file_paths:
+        try:
+            runs.append(extract_file(file_path, layout))
+        except Exception as e:
+            print(f"Failed to process {file_path}: {e}")
+    return runs
+
+def iter_export_files(root_folder):
     for root, _, files in os.walk(root_folder):
         for file in files:
             if file.endswith(".csv") and "meta_data" not in file.lower():
-                all_data.extend(process_file_global_only(os.path.join(root, file)))
-    
-    if not all_data:
+                yield os.path.join(root, file)
+
+def generate_global_metadata(root_folder, output_csv, layout="long", workers=1):
+    """
+    layout="long": one row per (file, feature) with the raw value in col2.
+    layout="wide": one row per subject/meet/state with a numeric column per feature.
+    workers > 1 extracts the subject folders in up to that many processes (no more than there
+    are folders or usable CPUs). Every file's rows are deduplicated where they are extracted and
+    the files are then merged once in (subject, meet, state) order, so the table is the same
+    for any number of workers.
+    """
+    check_layout(layout)
+    print(f"Starting to process global data from: {root_folder}")
+
+    tasks = [(folder, files, layout) for folder, files in batches_by_folder(root_folder, iter_export_files(root_folder))]
+    runs = []
+    for folder, folder_runs, error, _ in parse_files_in_order(extract_folder, tasks, pool_workers(workers, len(tasks))):
+        if error is not None:
+            print(f"Failed to process {folder}: {error}")
+            continue
+        runs.extend(folder_runs)
+
+    if layout == "wide":
+        wide = WideTable(["subject", "meet", "state"])
+        for keys, names, values in merge_in_key_order(runs, wide_row_key, identity=tuple):
+            wide.add_row(keys, names, values)
+        df = wide.to_frame()
+    else:
+        df = pd.DataFrame(list(merge_in_key_order(runs, long_row_key, identity=tuple)), columns=LONG_COLUMNS)
+
+    if df.empty:
         print("No data found!")
         return
 
-    df = pd.DataFrame(all_data)
-    
-    df = df.drop_duplicates()
-    
-    df = df.sort_values(by=['subject', 'meet', 'state'])
-    
     df.to_csv(output_csv, index=False, encoding='utf-8-sig')
     
     print(f"\n--- Process Complete ---")
@@ -83,6 +126,7 @@ def generate_global_metadata(root_folder, output_csv):
     print(f"Total rows: {len(df)}")
     print(f"Subjects included: {df['subject'].nunique()}")
 
-root_dir = "/Users/yuvalnadam/Desktop/CS/Cognition/data"
-output_file = "/Users/yuvalnadam/Desktop/CS/Cognition/data/ans_global_metadata.csv"
-generate_global_metadata(root_dir, output_file)
\ No newline at end of file
+if __name__ == "__main__":
+    root_dir = "/Users/yuvalnadam/Desktop/CS/Cognition/data"
+    output_file = "/Users/yuvalnadam/Desktop/CS/Cognition/data/ans_global_metadata.csv"
+    generate_global_metadata(root_dir, output_file)
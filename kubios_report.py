@@ -0,0 +1,261 @@
+import csv
+import heapq
+import re
+import numpy as np
+import pandas as pd
+
+"Reads a Kubios HRV export in one pass and keeps what the meta data, global and filtered tables are built from"
+
+# first two cells of the row above the segment values
+SEGMENT_HEADER_CELLS = ("Time", "Beats total")
+
+# global results rows the HRV tables keep, as Kubios writes them
+HRV_FEATURES = [
+    "  Beats corrected (%):        ", "  Time length (sec):          ",
+    "  Mean RR  (ms):              ", "  SDNN (ms):                  ",
+    "  Mean HR (beats/min):        ", "  SD HR (beats/min):          ",
+    "  Min HR (beats/min):         ", "  Max HR (beats/min):         ",
+    "  RMSSD (ms):                 ", "  NNxx (beats):               ",
+    "  pNNxx (%):                  ", "  SDANN (ms):                 ",
+    "  SDNN index (ms):            ", "  RR tri index:               ",
+    "  TINN (ms):                  ", "  DC (ms):                    ",
+    "  DCmod (ms):                 ", "  AC (ms):                    ",
+    "  ACmod (ms):                 ", "  VLF (Hz):                   ",
+    "  LF (Hz):                    ", "  HF (Hz):                    ",
+    "  VLF (ms^2):                 ", "  LF (ms^2):                  ",
+    "  HF (ms^2):                  ", "  VLF (log):                  ",
+    "  LF (log):                   ", "  HF (log):                   ",
+    "  VLF (%):                    ", "  LF (%):                     ",
+    "  HF (%):                     ", "  LF (n.u.):                  ",
+    "  HF (n.u.):                  ", "  Total power (ms^2):         ",
+    " LF/HF ratio:                 ", " RESP (Hz):                   "
+]
+
+TABLE_LAYOUTS = ("long", "wide")
+
+UNIT_PATTERN = re.compile(r"^(.*?)\s*\(([^()]*)\)$")
+
+
+def normalize_feature_label(label: str) -> str:
+    """'  Mean RR  (ms):   ' -> 'mean rr (ms)': padding, inner spacing, the colon and case do not matter"""
+    return " ".join(label.replace(":", " ").split()).lower()
+
+
+class KubiosFeature:
+    """
+    One global feature: label is the row label as registered (what the tables write in col1),
+    name and unit its parts ('Mean RR', 'ms'; unit is '' when the label has none)
+    """
+    __slots__ = ("label", "name", "unit")
+
+    def __init__(self, label: str):
+        self.label = label
+        text = " ".join(label.replace(":", " ").split())
+        match = UNIT_PATTERN.match(text)
+        self.name, self.unit = (match.group(1), match.group(2)) if match else (text, "")
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.name} ({self.unit})" if self.unit else self.name
+
+    def __repr__(self):
+        return f"KubiosFeature({self.full_name!r})"
+
+
+class FeatureRegistry:
+    """
+    The global features a table keeps, compiled once into a dict from normalized label to
+    KubiosFeature. lookup() is one dict probe for labels written exactly as registered and
+    one more after normalizing, so rows whose padding differs between Kubios versions
+    still map to the registered feature.
+    """
+    def __init__(self, labels):
+        self.features = []
+        self._exact = {}
+        self._normalized = {}
+        for label in labels:
+            key = normalize_feature_label(label)
+            if key in self._normalized:
+                continue
+            feature = KubiosFeature(label)
+            self.features.append(feature)
+            self._exact[label] = feature
+            self._normalized[key] = feature
+
+    def lookup(self, label: str):
+        """the registered feature of a row label, or None"""
+        feature = self._exact.get(label)
+        if feature is None and label:
+            feature = self._normalized.get(normalize_feature_label(label))
+        return feature
+
+    def __contains__(self, label) -> bool:
+        return self.lookup(label) is not None
+
+    def __len__(self):
+        return len(self.features)
+
+    def __iter__(self):
+        return iter(self.features)
+
+
+HRV_FEATURE_REGISTRY = FeatureRegistry(HRV_FEATURES)
+
+
+class KubiosReport:
+    """
+    One parsed export:
+    - global_rows: [(KubiosFeature, value)] for every row whose first cell is one of the
+      requested global features, in file order
+    - segment_rows: the values (from the fourth column on) of every row of the segment table
+    - rows / width: every row with empty cells as 'NA' and the longest row length, only kept
+      when asked for (the meta data needs the whole file)
+    """
+    __slots__ = ("global_rows", "segment_headers", "segment_units", "segment_rows", "rows", "width", "_names")
+
+    def __init__(self):
+        self.global_rows = []
+        self.segment_headers = []
+        self.segment_units = []
+        self.segment_rows = []
+        self.rows = None
+        self.width = 0
+        self._names = []
+
+    def segment_feature_names(self, n_values: int) -> list[str]:
+        """'<header> <unit>' of the first n_values segment value columns (fourth column on)"""
+        while len(self._names) < n_values:
+            col_idx = 3 + len(self._names)
+            header = self.segment_headers[col_idx] if col_idx < len(self.segment_headers) else ""
+            unit = self.segment_units[col_idx] if col_idx < len(self.segment_units) else ""
+            self._names.append(f"{header.strip()} {unit.strip()}")
+        return self._names[:n_values]
+
+
+def is_segment_value_row(row) -> bool:
+    # the segment table ends at the first row whose second cell is not a number
+    return len(row) >= 2 and row[1].replace('.', '', 1).isdigit()
+
+
+def parse_kubios_report(file_path: str, global_features=(), keep_rows: bool = False) -> KubiosReport:
+    """
+    Streams the csv once. Global feature rows are recognized by their first cell (global_features
+    is a FeatureRegistry or a list of labels to build one from); the segment
+    table starts after the first row whose second and third cells hold 'Time' and 'Beats total'
+    (the row above it has the feature names, that row their units).
+    """
+    if not isinstance(global_features, FeatureRegistry):
+        global_features = FeatureRegistry(global_features)
+    lookup = global_features.lookup
+    report = KubiosReport()
+    rows = [] if keep_rows else None
+    width = 0
+    previous = []
+    in_segments = False
+    segments_done = False
+
+    with open(file_path, newline='', encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if keep_rows:
+                rows.append([cell if cell.strip() != "" else "NA" for cell in row])
+                width = max(width, len(row))
+
+            if len(row) >= 2:
+                feature = lookup(row[0])
+                if feature is not None:
+                    report.global_rows.append((feature, row[1]))
+
+            if in_segments:
+                if is_segment_value_row(row):
+                    report.segment_rows.append(row[3:])
+                else:
+                    in_segments, segments_done = False, True
+            elif (not segments_done and len(row) >= 3
+                  and SEGMENT_HEADER_CELLS[0] in row[1] and SEGMENT_HEADER_CELLS[1] in row[2]):
+                report.segment_headers, report.segment_units = previous, row
+                in_segments = True
+            previous = row
+
+    report.rows = rows
+    report.width = width
+    return report
+
+
+def check_layout(layout: str):
+    if layout not in TABLE_LAYOUTS:
+        raise ValueError(f"Unknown table layout '{layout}', expected one of {TABLE_LAYOUTS}")
+
+
+def to_number(cell) -> float:
+    """a Kubios cell as a float (NaN when it is empty or not a number)"""
+    try:
+        return float(cell)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class WideTable:
+    """
+    Collects one row per key (subject, meet, state, ...) with a numeric column per feature,
+    straight from each file's names and values; columns are added in order of first
+    appearance and the matrix is filled once in to_frame.
+    """
+    def __init__(self, key_columns):
+        self.key_columns = list(key_columns)
+        self.columns = {}
+        self.keys = []
+        self._cells = []
+
+    def add_row(self, key, names, values):
+        column_of = self.columns
+        positions = np.fromiter(
+            (column_of.setdefault(name, len(column_of)) for name in names), dtype=np.intp, count=len(names)
+        )
+        self.keys.append(tuple(key))
+        self._cells.append((positions, np.fromiter(map(to_number, values), dtype=float, count=len(values))))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_frame(self) -> pd.DataFrame:
+        matrix = np.full((len(self.keys), len(self.columns)), np.nan)
+        for row_idx, (positions, values) in enumerate(self._cells):
+            # a name repeated within one file keeps its last value
+            matrix[row_idx, positions] = values
+        df = pd.DataFrame(matrix, columns=list(self.columns))
+        keys = pd.DataFrame(self.keys, columns=self.key_columns)
+        return pd.concat([keys, df], axis=1)
+
+
+def unique_rows(rows, identity) -> list:
+    """rows without the ones whose identity(row) was already seen, first occurrence kept"""
+    seen = set()
+    unique = []
+    for row in rows:
+        row_id = identity(row)
+        if row_id not in seen:
+            seen.add(row_id)
+            unique.append(row)
+    return unique
+
+
+def merge_in_key_order(runs, key, identity=None):
+    """
+    One k-way merge of per-file row lists into key order (a file's rows all share one key).
+    Rows with equal keys keep the order of their runs, then their order within the run.
+    With identity, a row equal to an earlier row of the same key is dropped, as
+    drop_duplicates over the whole table would.
+    """
+    merged = heapq.merge(*[run for run in runs if run], key=key)
+    if identity is None:
+        yield from merged
+        return
+    current_key, seen = None, set()
+    for row in merged:
+        row_key = key(row)
+        if row_key != current_key:
+            current_key, seen = row_key, set()
+        row_id = identity(row)
+        if row_id not in seen:
+            seen.add(row_id)
+            yield row
@@ -0,0 +1,78 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+"Applies a parse function to many files, serially or in a process pool, keeping the file order"
+
+
+def timed_parse(parse, file_path: str, *args):
+    """
+    Runs parse(file_path, *args) and returns (file_path, result, error, seconds).
+    Module level so it can be sent to worker processes.
+    """
+    start = time.perf_counter()
+    try:
+        result, error = parse(file_path, *args), None
+    except Exception as e:
+        result, error = None, e
+    return file_path, result, error, time.perf_counter() - start
+
+
+def parse_files_in_order(parse, tasks, workers: int = 1, verbose: bool = False):
+    """
+    Applies parse to every (file_path, *args) task and yields timed_parse results in task order.
+    With workers > 1 the files are parsed in a process pool; at most 2 * workers results are
+    kept waiting, so memory stays bounded while the output order is the same as a serial run.
+    verbose=True prints the time of every file and a summary.
+    """
+    timings = []
+    if workers <= 1:
+        results = (timed_parse(parse, *task) for task in tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = ordered_pool_results(pool, parse, tasks, 2 * workers)
+
+    try:
+        for file_path, result, error, seconds in results:
+            if verbose:
+                print(f"[TIME] {file_path}: {seconds:.3f}s")
+            timings.append(seconds)
+            yield file_path, result, error, seconds
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if verbose and timings:
+        print(f"Parsed {len(timings)} files with {max(workers, 1)} worker(s): "
+              f"total {sum(timings):.3f}s, slowest {max(timings):.3f}s")
+
+
+def ordered_pool_results(pool, parse, tasks, max_pending: int):
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(timed_parse, parse, *task))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def pool_workers(workers: int, n_tasks: int) -> int:
+    """the worker processes worth starting: no more than asked for, than the tasks, or than the usable CPUs"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    return max(1, min(workers, n_tasks, cpus))
+
+
+def batches_by_folder(root: str, file_paths) -> list:
+    """
+    [(folder, [file paths])]: the files grouped by their first folder under root (a subject's
+    folder), in the order they come, so a pool task parses a whole folder instead of one small file
+    """
+    batches = {}
+    for file_path in file_paths:
+        first = os.path.relpath(file_path, root).split(os.sep)[0]
+        folder = os.path.join(root, first) if first != os.path.basename(file_path) else root
+        batches.setdefault(folder, []).append(file_path)
+    return list(batches.items())
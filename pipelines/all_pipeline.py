@@ -1,7 +1,14 @@
 import os
-from Meta_data_creator import metaDataCsvCreator
-from block_creator import create_block
-from block_to_graph import generate_graphs_for_all_subjects
+import time
+import pandas as pd
+from Meta_data_creator import iter_drive_csv_files, load_manifest, manifest_path_for, metaDataCsvCreator
+from background_writer import BackgroundWriter, persistTable
+from block_creator import build_block, create_block
+from columnar_cache import as_read_from_csv, read_table
+from block_to_graph import (
+    GRAPH_RENDER_PARAMS, generate_graphs_for_all_subjects, generate_graphs_for_features, feature_graphs_dir
+)
+from stage_state import StageState, stateFileFor
 
 
 class AllPipeline:
@@ -14,19 +21,62 @@ class AllPipeline:
         "SD2/SD1", "ApEn", "SampEn", "DFA a1", "DFA a2"
     ]
 
-    def __init__(self, data_path):
+    def __init__(self, data_path, columnar=False, workers=1, force=False, in_memory=True):
         self.data_path = data_path
+        # also keep typed meta_data.parquet / block.parquet copies for faster reloads
+        self.columnar = columnar
+        # processes used to render the subject graphs
+        self.workers = workers
+        # rerun every stage (and redraw every graph) even when its inputs did not change
+        self.force = force
+        # hand the rebuilt meta data and block to the next stage as DataFrames instead of reading
+        # their csv files back; block.csv is then written in the background
+        self.in_memory = in_memory
+        self.meta_df = None
+        self.block_df = None
+        self.writer = None
+        # stage states to record once the csv files they depend on are written
+        self.pending_records = []
+        # one entry per stage of the last run: {stage, status (ran/skipped/failed), seconds, reason}
+        self.stage_report = []
 
     def doesTheFileExist(self, file_path):
         return os.path.isfile(file_path)
 
+    def blockMissing(self, block):
+        # block: the block.csv path, or the block handed over in memory
+        if isinstance(block, pd.DataFrame):
+            return False
+        return not block or not self.doesTheFileExist(block)
+
     def createMetaData(self):
+        """
+        Rebuilds meta_data.csv in clean build order (the stage only runs when an export was added,
+        changed or removed, or when forced). Appending the rows of the changed files would change
+        the block's row order, so only those files are parsed and the table is rewritten in walk
+        order around them (see Meta_data_creator.rebuild_in_order). With in_memory the rows it
+        writes are also kept for the block stage, typed as reading meta_data.csv back would give them.
+        """
         print("Creating meta data...")
-        metaDataCsvCreator(self.data_path)
-
         meta_path = os.path.join(self.data_path, "meta_data.csv")
+        table = [] if self.writer is not None else None
+        metaDataCsvCreator(self.data_path, rebuild=True, columnar=self.columnar, exclude=self.outputFiles(),
+                           table=table)
+        if table:
+            self.meta_df = as_read_from_csv(pd.DataFrame(table[1:], columns=table[0]))
+
         return meta_path if self.doesTheFileExist(meta_path) else None
 
+    def metaDataMatches(self, state):
+        """
+        True when meta_data.csv holds exactly the exports the meta stage fingerprinted, at that
+        content (an export that failed to parse keeps its old rows, or has none)
+        """
+        manifest = load_manifest(manifest_path_for(os.path.join(self.data_path, "meta_data.csv")))
+        parsed = {rel: entry["sha256"] for rel, entry in manifest.items()}
+        expected = {os.path.relpath(path, self.data_path): fp["sha256"] for path, fp in state.inputs.items()}
+        return parsed == expected
+
     def createBlock(self, meta_path):
         print("Creating block...")
 
@@ -34,11 +84,29 @@ class AllPipeline:
             print("Meta data missing")
             return None
 
-        create_block(meta_path)
+        if self.writer is not None:
+            return self.buildBlockInMemory(meta_path)
+
+        create_block(meta_path, columnar=self.columnar)
         block_path = os.path.join(self.data_path, "block.csv")
 
         return block_path if self.doesTheFileExist(block_path) else None
 
+    def buildBlockInMemory(self, meta_path):
+        """
+        The block of the meta data handed over by the meta stage (or read from meta_path when that
+        stage was skipped), kept for the graphs and written to block.csv in the background
+        """
+        big_df = self.meta_df if self.meta_df is not None else read_table(meta_path)
+        self.meta_df = None
+        final_df = build_block(big_df)
+        block_path = os.path.join(os.path.dirname(meta_path), "block.csv")
+
+        # typed by load_block, column by column, as the graphs read them
+        self.block_df = final_df
+        self.writer.submit(block_path, persistTable, final_df, block_path, final_df if self.columnar else None)
+        return block_path
+
     def createGraphs(self, feature, block_path):
         print("Creating graphs...")
 
@@ -46,31 +114,251 @@ class AllPipeline:
             print("Invalid feature")
             return None
 
-        if not block_path or not self.doesTheFileExist(block_path):
+        if self.blockMissing(block_path):
             print("Block missing")
             return None
 
-        safe_feature = feature.replace(" ", "_").replace("/", "_")
-        graphs_dir = os.path.join(self.data_path, f"{safe_feature}_graphs")
+        graphs_dir = feature_graphs_dir(self.data_path, feature)
 
-        generate_graphs_for_all_subjects(block_path, feature, graphs_dir)
+        generate_graphs_for_all_subjects(block_path, feature, graphs_dir, self.workers, self.force)
 
-        if os.path.isdir(graphs_dir) and any(f.endswith(".png") for f in os.listdir(graphs_dir)):
+        if hasGraphs(graphs_dir):
             print("Graphs saved to:", graphs_dir)
             return graphs_dir
 
         print("Graphs failed")
         return None
 
+    @classmethod
+    def resolveFeatures(cls, features):
+        """
+        "all", a single feature or a list of features -> list of valid features
+        """
+        if isinstance(features, str):
+            features = cls.VALID_FEATURES if features.strip().lower() == "all" else [features]
+
+        valid = []
+        for feature in features:
+            if feature in cls.VALID_FEATURES:
+                valid.append(feature)
+            else:
+                print("Invalid feature:", feature)
+        return valid
+
+    def createGraphsForFeatures(self, features, block_path):
+        """
+        Renders the graphs of several features from a single load of the block.
+        Returns {feature: graphs directory} for the features that produced graphs.
+        """
+        print("Creating graphs...")
+
+        features = self.resolveFeatures(features)
+        if not features:
+            print("No valid features")
+            return None
+
+        if self.blockMissing(block_path):
+            print("Block missing")
+            return None
+
+        graphs_dirs = generate_graphs_for_features(block_path, features, self.data_path, self.workers, self.force)
+        return collectGraphDirs(graphs_dirs)
+
+    def outputFiles(self):
+        # csv files the pipeline writes under the data root, which are not exports
+        return [os.path.join(self.data_path, "block.csv")]
+
+    def dataFiles(self):
+        # the meta data inputs: every export under the data root
+        return [file_path for file_path, _ in iter_drive_csv_files(self.data_path, set(), self.outputFiles())]
+
+    def runStage(self, name, state, input_paths, params, output_paths, action, matches=None, record_later=False):
+        """
+        Runs action (True on success) unless the stage is fresh (see StageState) or forced, records
+        the inputs it ran from, and adds the stage to stage_report. matches(state), when given,
+        tells whether the outputs really reflect the fingerprinted inputs: a stage whose outputs
+        do not is run even if its inputs did not change, and is not recorded until they do.
+        record_later: the stage's outputs are written in the background, so it is recorded once
+        they are on disk (see finishWrites).
+        """
+        if self.force:
+            state.fingerprintInputs(input_paths)
+            fresh, reason = False, "forced"
+        else:
+            fresh, reason = state.isFresh(input_paths, params, output_paths)
+        if fresh and matches is not None and not matches(state):
+            fresh, reason = False, "output does not match its inputs"
+        if fresh:
+            print(f"Skipping {name}: {reason}")
+            self.stage_report.append({"stage": name, "status": "skipped", "seconds": 0.0, "reason": reason})
+            return True
+
+        start = time.perf_counter()
+        ok = bool(action())
+        seconds = round(time.perf_counter() - start, 3)
+        if ok and matches is not None and not matches(state):
+            print(f"{name} does not reflect all of its inputs yet, it runs again next time")
+            reason += "; incomplete, not recorded"
+        elif ok:
+            self.recordStage(state, input_paths, params, record_later)
+        self.stage_report.append({"stage": name, "status": "ran" if ok else "failed", "seconds": seconds, "reason": reason})
+        return ok
+
+    def recordStage(self, state, input_paths, params, later):
+        if later:
+            self.pending_records.append((state, input_paths, params))
+        else:
+            state.record(params)
+
+    def finishWrites(self):
+        """
+        Waits for the background writes, records the stages that waited for them and adds a
+        'persist' entry to stage_report. False when a write failed; nothing waiting is recorded then.
+        """
+        if self.writer is None:
+            return True
+        errors, seconds = self.writer.wait()
+        self.writer = None
+        failed = [path for path, error in errors.items() if error is not None]
+        if not failed:
+            for state, input_paths, params in self.pending_records:
+                # the inputs of graphs drawn from the handed over block are only on disk now
+                state.fingerprintInputs(input_paths)
+                state.record(params)
+        self.pending_records = []
+        self.meta_df = self.block_df = None
+
+        if errors:
+            reason = f"failed: {', '.join(os.path.basename(p) for p in failed)}" if failed else \
+                f"{', '.join(os.path.basename(p) for p in errors)} written"
+            self.stage_report.append({
+                "stage": "persist", "status": "failed" if failed else "ran", "seconds": round(seconds, 3), "reason": reason,
+            })
+        return not failed
+
+    def runGraphStages(self, feature, block_path):
+        """
+        Redraws the graphs of the features whose block or settings changed; the others are
+        skipped. Returns what createGraphs / createGraphsForFeatures return, for all features.
+        """
+        multi = isMultiFeature(feature)
+        features = self.resolveFeatures(feature) if multi else [feature]
+        in_memory = self.block_df is not None
+        block = self.block_df if in_memory else block_path
+        if not features or (not multi and feature not in self.VALID_FEATURES):
+            # let createGraphs(ForFeatures) report the invalid feature
+            return self.createGraphsForFeatures(feature, block) if multi else self.createGraphs(feature, block)
+
+        stale = []
+        states = {}
+        for name in features:
+            graphs_dir = feature_graphs_dir(self.data_path, name)
+            state = StageState(stateFileFor(graphs_dir))
+            params = {"feature": name, "render": GRAPH_RENDER_PARAMS}
+            if in_memory:
+                # block.csv is still being written; unchanged subjects are skipped by the render cache
+                fresh, reason = False, "block rebuilt in memory"
+            elif self.force:
+                state.fingerprintInputs([block_path])
+                fresh, reason = False, "forced"
+            else:
+                fresh, reason = state.isFresh([block_path], params, [graphs_dir])
+            if fresh and not hasGraphs(graphs_dir):
+                fresh, reason = False, "output missing: no graphs"
+            if fresh:
+                print(f"Skipping graphs for {name}: {reason}")
+                self.stage_report.append({"stage": f"graphs:{name}", "status": "skipped", "seconds": 0.0, "reason": reason})
+            else:
+                stale.append(name)
+                states[name] = (state, params, reason)
+
+        if stale:
+            start = time.perf_counter()
+            if multi:
+                done = self.createGraphsForFeatures(stale, block) or {}
+            else:
+                graphs_dir = self.createGraphs(feature, block)
+                done = {feature: graphs_dir} if graphs_dir else {}
+            # the features are drawn from one load of the block, so they share its time
+            seconds = round(time.perf_counter() - start, 3)
+            for name in stale:
+                state, params, reason = states[name]
+                if name in done:
+                    self.recordStage(state, [block_path], params, in_memory)
+                self.stage_report.append({
+                    "stage": f"graphs:{name}", "status": "ran" if name in done else "failed",
+                    "seconds": seconds, "reason": reason,
+                })
+
+        if not multi:
+            graphs_dir = feature_graphs_dir(self.data_path, feature)
+            return graphs_dir if hasGraphs(graphs_dir) else None
+        # the stale features were reported as they were drawn, so only look the folders up here
+        graphs_dirs = {name: feature_graphs_dir(self.data_path, name) for name in features}
+        return {name: graphs_dir for name, graphs_dir in graphs_dirs.items() if hasGraphs(graphs_dir)} or None
+
+    def printStageReport(self):
+        print("Stage report:")
+        for entry in self.stage_report:
+            print(f"  {entry['stage']:<24} {entry['status']:<8} {entry['seconds']:>8.3f}s  {entry['reason']}")
+
     def run(self, feature):
-        meta_path = self.createMetaData()
-        if not meta_path:
+        """
+        feature: a single feature, a list of features, or "all"
+        Each stage (meta data, block, the graphs of each feature) runs only when its inputs or
+        settings changed since it last ran, unless force is set; see stage_report for what ran.
+        With in_memory the rebuilt meta data and block go straight to the next stage while
+        block.csv is written in the background; the run ends once it is on disk.
+        """
+        self.stage_report = []
+        self.writer = BackgroundWriter() if self.in_memory else None
+        try:
+            result = self.runStages(feature)
+        finally:
+            persisted = self.finishWrites()
+            self.printStageReport()
+        return result if persisted else None
+
+    def runStages(self, feature):
+        meta_path = os.path.join(self.data_path, "meta_data.csv")
+        block_path = os.path.join(self.data_path, "block.csv")
+        params = {"columnar": self.columnar}
+
+        ran = self.runStage(
+            "meta", StageState(stateFileFor(meta_path)), self.dataFiles(), params, [meta_path],
+            self.createMetaData, matches=self.metaDataMatches,
+        )
+        if not ran:
             return None
 
-        block_path = self.createBlock(meta_path)
-        if not block_path:
+        ran = self.runStage(
+            "block", StageState(stateFileFor(block_path)), [meta_path], params, [block_path],
+            lambda: self.createBlock(meta_path), record_later=self.writer is not None,
+        )
+        # a skipped block stage leaves the handed over meta data unused
+        self.meta_df = None
+        if not ran:
             return None
 
-        return self.createGraphs(feature, block_path)
+        return self.runGraphStages(feature, block_path)
+
+
+def isMultiFeature(feature):
+    return not isinstance(feature, str) or feature.strip().lower() == "all"
+
+
+def hasGraphs(graphs_dir):
+    return os.path.isdir(graphs_dir) and any(f.endswith(".png") for f in os.listdir(graphs_dir))
+
+
+def collectGraphDirs(graphs_dirs):
+    done = {}
+    for feature, graphs_dir in graphs_dirs.items():
+        if hasGraphs(graphs_dir):
+            print(f"Graphs for {feature} saved to:", graphs_dir)
+            done[feature] = graphs_dir
+        else:
+            print(f"Graphs failed for {feature}")
+    return done or None
 
 
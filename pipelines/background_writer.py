@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from columnar_cache import write_columnar
+
+"Writes the tables the pipeline stages hand to each other in memory to disk, in a background thread"
+
+
+def persistTable(df, csv_path, columnar_df=None):
+    """
+    df as csv_path, written to a temporary file first so a half written csv is never taken for
+    a finished one; columnar_df, when given, also as its typed Parquet copy
+    """
+    tmp_path = csv_path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+    if columnar_df is not None:
+        write_columnar(columnar_df, csv_path)
+
+
+class BackgroundWriter:
+    """
+    One writer thread: the writes run in the order they were submitted while the pipeline
+    goes on with the next stage. wait() blocks until all of them finished.
+    """
+    def __init__(self):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+
+    def submit(self, path, write, *args):
+        print(f"Writing {path} in the background")
+        self.pending.append((path, self.pool.submit(write, *args)))
+
+    def wait(self):
+        """{path: error or None} of every submitted write, and the seconds spent waiting for them"""
+        start = time.perf_counter()
+        errors = {}
+        for path, future in self.pending:
+            error = future.exception()
+            if error is not None:
+                print(f"Failed to write {path}: {error}")
+            errors[path] = error
+        self.pending = []
+        self.pool.shutdown()
+        return errors, time.perf_counter() - start
@@ -1,32 +1,54 @@
 import os
 import block_to_graph
+from all_pipeline import AllPipeline, isMultiFeature, hasGraphs, collectGraphDirs
+from columnar_cache import has_fresh_columnar
 
 
 class GraphsPipeline:
-    def __init__(self, block_path, feature):
+    def __init__(self, block_path, feature, workers=1, force=False):
         self.block_path = block_path
+        # processes used to render the subject graphs
+        self.workers = workers
+        # redraw graphs whose data did not change
+        self.force = force
 
     def doesTheFileExist(self, file_path):
         return os.path.isfile(file_path)
 
+    def doesTheBlockExist(self, block_path):
+        # block.csv, or only its columnar copy
+        return self.doesTheFileExist(block_path) or has_fresh_columnar(block_path)
+
     def run(self,feature):
+        """
+        feature: a single feature, a list of features, or "all"
+        """
         print("Running graphs-only pipeline...")
 
-        if not self.block_path or not self.doesTheFileExist(self.block_path):
+        if not self.block_path or not self.doesTheBlockExist(self.block_path):
             print("Block file does not exist")
             return None
 
-        safe_feature = feature.replace(" ", "_").replace("/", "_")
         output_dir = os.path.dirname(self.block_path)
-        graphs_dir = os.path.join(output_dir, f"{safe_feature}_graphs")
+        if isMultiFeature(feature):
+            features = AllPipeline.resolveFeatures(feature)
+            if not features:
+                print("No valid features")
+                return None
+            graphs_dirs = block_to_graph.generate_graphs_for_features(self.block_path, features, output_dir, self.workers, self.force)
+            return collectGraphDirs(graphs_dirs)
+
+        graphs_dir = block_to_graph.feature_graphs_dir(output_dir, feature)
 
         block_to_graph.generate_graphs_for_all_subjects(
             self.block_path,
             feature,
-            graphs_dir
+            graphs_dir,
+            self.workers,
+            self.force
         )
 
-        if os.path.isdir(graphs_dir) and any(f.endswith(".png") for f in os.listdir(graphs_dir)):
+        if hasGraphs(graphs_dir):
             print("Graphs saved to:", graphs_dir)
             return graphs_dir
 
@@ -0,0 +1,218 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+"Every pipeline command as a function of plain options, job files expanded over data roots, and a status with timings for each job"
+
+
+def run_meta(options):
+    from Meta_data_creator import metaDataCsvCreator
+
+    root = options["root"]
+    metaDataCsvCreator(root, streaming=options.get("streaming", False), workers=options.get("workers", 1),
+                       incremental=options.get("incremental", False), columnar=options.get("columnar", False))
+    # no new data is not a failure, a missing meta data file is
+    return existing_output(os.path.join(root, "meta_data.csv"))
+
+
+def run_block(options):
+    from block_creator import create_block
+
+    block_path, _ = create_block(options["meta"], columnar=options.get("columnar", False))
+    return existing_output(block_path)
+
+
+def run_all(options):
+    from all_pipeline import AllPipeline
+
+    pipeline = AllPipeline(options["root"], columnar=options.get("columnar", False), workers=options.get("workers", 1),
+                           force=options.get("force", False), in_memory=options.get("in_memory", True))
+    graphs = required_result(pipeline.run(options.get("features", "all")), "pipeline failed")
+    return {"graphs": graphs, "stages": pipeline.stage_report}
+
+
+def run_graphs(options):
+    from graphs_pipeline import GraphsPipeline
+
+    features = options.get("features", "all")
+    pipeline = GraphsPipeline(options["block"], features, workers=options.get("workers", 1),
+                              force=options.get("force", False))
+    return required_result(pipeline.run(features), "graphs failed")
+
+
+def run_gsr(options):
+    from GSR_outputs import DEFAULT_DATA_SHEETS, MERGED_STATISTICS_FILE, process_workbooks
+    from GSR_protocol import DEFAULT_PROTOCOL, GSRProtocol
+
+    protocol = GSRProtocol.from_json(options["protocol"]) if options.get("protocol") else DEFAULT_PROTOCOL
+    merged = process_workbooks(
+        options["workbooks"], options["output_root"], options.get("sheets", DEFAULT_DATA_SHEETS),
+        workers=options.get("workers", 1), figures=options.get("figures", True), force=options.get("force", False),
+        sample_step=options.get("sample_step", 10), mode=options.get("mode", "point"),
+        signal_store=options.get("signal_store", False), protocol=protocol,
+    )
+    required_result(merged is not None, "no workbooks found")
+    return os.path.join(options["output_root"], MERGED_STATISTICS_FILE)
+
+
+def run_sdi(options):
+    from SDI_heart_rate import build_excel_from_subject_features, features
+    from columnar_cache import columnar_path
+
+    output = options["output"]
+    output_formats = tuple(options.get("formats", ["excel"]))
+    build_excel_from_subject_features(options["dir"], output, options.get("sdi_features", features),
+                                      workers=options.get("workers", 1), output_formats=output_formats)
+    # where each requested format is written (see build_excel_from_subject_features)
+    paths = {"excel": output, "csv": os.path.splitext(output)[0] + "_csv", "parquet": columnar_path(output)}
+    return [existing_output(paths[output_format]) for output_format in dict.fromkeys(output_formats)]
+
+
+def run_global(options):
+    from data_to_globalTable import generate_global_metadata
+
+    generate_global_metadata(options["root"], options["output"], layout=options.get("layout", "long"),
+                             workers=options.get("workers", 1))
+    return existing_output(options["output"])
+
+
+def run_filtered(options):
+    from data_to_filteredTable import generate_clean_metadata
+
+    generate_clean_metadata(options["root"], options["output"], layout=options.get("layout", "long"),
+                            workers=options.get("workers", 1))
+    return existing_output(options["output"])
+
+
+# command name -> (runner, options it cannot run without)
+COMMANDS = {
+    "meta": (run_meta, ["root"]),
+    "block": (run_block, ["meta"]),
+    "all": (run_all, ["root"]),
+    "graphs": (run_graphs, ["block"]),
+    "gsr": (run_gsr, ["workbooks", "output_root"]),
+    "sdi": (run_sdi, ["dir", "output"]),
+    "global": (run_global, ["root", "output"]),
+    "filtered": (run_filtered, ["root", "output"]),
+}
+
+
+def existing_output(path):
+    if not os.path.exists(path):
+        raise RuntimeError(f"{path} was not created")
+    return path
+
+
+def required_result(result, message):
+    if not result:
+        raise RuntimeError(message)
+    return result
+
+
+def json_safe(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(v) for v in value]
+    return str(value)
+
+
+def run_job(job):
+    """
+    Runs one job ({"command": ..., options}) and returns its status:
+    {"name", "command", "status": "ok" | "failed", "seconds", "output", "error"}.
+    Module level so it can be sent to worker processes.
+    """
+    command = job.get("command")
+    name = job.get("name", command)
+    start = time.perf_counter()
+    output, error = None, None
+    try:
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command '{command}', expected one of {list(COMMANDS)}")
+        runner, required = COMMANDS[command]
+        missing = [key for key in required if key not in job]
+        if missing:
+            raise ValueError(f"{command} needs {missing}")
+        output = runner(job)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+
+    print(f"[JOB] {name}: {'failed' if error else 'ok'} in {seconds:.3f}s")
+    return {
+        "name": name,
+        "command": command,
+        "status": "failed" if error else "ok",
+        "seconds": round(seconds, 3),
+        "output": json_safe(output),
+        "error": error,
+    }
+
+
+def fill_root(value, root):
+    # "{root}" in any string option is the job's data root
+    if isinstance(value, str):
+        return value.replace("{root}", root)
+    if isinstance(value, list):
+        return [fill_root(v, root) for v in value]
+    return value
+
+
+def expand_jobs(spec) -> list[dict]:
+    """
+    A job file's entries -> one job per entry and data root. An entry with "roots" runs once
+    per root (as "root", and substituted for "{root}" in its other options); its features all
+    run in that one job, so a root's meta data and block are built once for all of them.
+    """
+    jobs = []
+    for entry in spec.get("jobs", []):
+        roots = entry.get("roots")
+        if roots is None:
+            jobs.append(dict(entry, name=entry.get("name", entry.get("command"))))
+            continue
+        for root in roots:
+            job = {key: fill_root(value, root) for key, value in entry.items() if key != "roots"}
+            job["root"] = root
+            job["name"] = f"{entry.get('name', entry.get('command'))}:{root}"
+            jobs.append(job)
+    return jobs
+
+
+def load_job_file(path: str) -> dict:
+    """
+    A JSON job file:
+    {"parallel": 2, "jobs": [{"command": "all", "roots": [...], "features": ["RMSSD", "Mean HR"]}, ...]}
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_jobs(jobs, parallel: int = 1) -> dict:
+    """
+    Runs the jobs, parallel > 1 of them at a time in worker processes (a job's own workers
+    option is separate). Returns {"ok", "seconds", "jobs": [status per job, in job order]}.
+    """
+    start = time.perf_counter()
+    if parallel <= 1 or len(jobs) <= 1:
+        statuses = [run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=parallel) as pool:
+            statuses = list(pool.map(run_job, jobs))
+    return {
+        "ok": all(status["status"] == "ok" for status in statuses),
+        "seconds": round(time.perf_counter() - start, 3),
+        "jobs": statuses,
+    }
+
+
+def write_status(report: dict, path: str = None):
+    """the run's status as JSON, into path when given, and always as the last line on stdout"""
+    text = json.dumps(report)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
@@ -1,10 +1,30 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from all_pipeline import AllPipeline
 from graphs_pipeline import GraphsPipeline
+from jobs import expand_jobs, load_job_file, run_jobs, write_status
+
+"""
+Command line entry point. Without arguments it asks for the pipeline interactively; otherwise
+one subcommand per step (meta, block, all, graphs, gsr, sdi, global, filtered) or a job file:
 
+    python pipelines/main.py all /data/site_a --feature RMSSD "Mean HR" --workers 4
+    python pipelines/main.py jobs jobs.json --parallel 2 --status-file status.json
 
-def main():
+Every run ends with a JSON status line (per job: status, seconds, output, error) and exits
+with 0 when all jobs succeeded, 1 otherwise.
+"""
+
+
+def interactive():
     choice = input("Choose pipeline (all/graphs): ").strip().lower()
-    feature = input("Enter feature name: ").strip()
+    feature = input("Enter feature name (several separated by commas, or 'all'): ").strip()
+    if "," in feature:
+        feature = [f.strip() for f in feature.split(",") if f.strip()]
 
     if choice == "all":
         data_path = input("Enter data directory path: ").strip()
@@ -27,5 +47,95 @@ def main():
         print("Pipeline failed.")
 
 
+def feature_option(values):
+    # one name (or "all") stays a string, as the pipelines expect; several become a list
+    return values[0] if len(values) == 1 else values
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HRV and GSR data extraction pipelines")
+    parser.add_argument("--status-file", help="also write the JSON status to this file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_text):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--workers", type=int, default=1, help="worker processes inside the step")
+        return command
+
+    meta = add_command("meta", "build meta_data.csv under a data root")
+    meta.add_argument("root")
+    meta.add_argument("--streaming", action="store_true")
+    meta.add_argument("--incremental", action="store_true")
+    meta.add_argument("--columnar", action="store_true")
+
+    block = add_command("block", "build block.csv from a meta_data.csv")
+    block.add_argument("meta")
+    block.add_argument("--columnar", action="store_true")
+
+    all_steps = add_command("all", "meta data, block and graphs of a data root")
+    all_steps.add_argument("root")
+    all_steps.add_argument("--feature", dest="features", nargs="+", default=["all"])
+    all_steps.add_argument("--columnar", action="store_true")
+    all_steps.add_argument("--force", action="store_true", help="rerun every stage even when its inputs did not change")
+    all_steps.add_argument("--no-handoff", dest="in_memory", action="store_false",
+                           help="read each stage's input back from its csv instead of handing it over in memory")
+
+    graphs = add_command("graphs", "graphs from an existing block.csv")
+    graphs.add_argument("block")
+    graphs.add_argument("--feature", dest="features", nargs="+", default=["all"])
+    graphs.add_argument("--force", action="store_true", help="redraw every graph even when its data did not change")
+
+    gsr = add_command("gsr", "GSR statistics, matrix and figures of a folder (or glob) of workbooks")
+    gsr.add_argument("workbooks")
+    gsr.add_argument("output_root")
+    gsr.add_argument("--sheets", nargs="+", default=["T1", "T2"])
+    gsr.add_argument("--no-figures", dest="figures", action="store_false")
+    gsr.add_argument("--force", action="store_true")
+    gsr.add_argument("--sample-step", type=int, default=10)
+    gsr.add_argument("--mode", default="point")
+    gsr.add_argument("--signal-store", action="store_true")
+    gsr.add_argument("--protocol", help="JSON file with the GSR protocol settings")
+
+    sdi = add_command("sdi", "per-feature workbook of a folder of SDI exports")
+    sdi.add_argument("dir")
+    sdi.add_argument("output")
+    sdi.add_argument("--formats", nargs="+", default=["excel"], choices=["excel", "csv", "parquet"])
+
+    for name, help_text in [("global", "global HRV table of a data root"),
+                            ("filtered", "global and segment HRV table of a data root")]:
+        table = add_command(name, help_text)
+        table.add_argument("root")
+        table.add_argument("output")
+        table.add_argument("--layout", default="long", choices=["long", "wide"])
+
+    job_file = commands.add_parser("jobs", help="run the jobs of a JSON job file")
+    job_file.add_argument("job_file")
+    job_file.add_argument("--parallel", type=int, help="jobs run at once (default: the file's, else 1)")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return 0
+
+    args = build_parser().parse_args(argv)
+    if args.command == "jobs":
+        spec = load_job_file(args.job_file)
+        jobs = expand_jobs(spec)
+        parallel = args.parallel or spec.get("parallel", 1)
+    else:
+        options = {key: value for key, value in vars(args).items() if key != "status_file"}
+        if "features" in options:
+            options["features"] = feature_option(options["features"])
+        jobs = [options]
+        parallel = 1
+
+    report = run_jobs(jobs, parallel)
+    write_status(report, args.status_file)
+    return 0 if report["ok"] else 1
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
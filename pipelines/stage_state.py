@@ -0,0 +1,85 @@
+import json
+import os
+
+from Meta_data_creator import file_sha256
+
+"Make-style freshness of the pipeline stages: the fingerprints of a stage's inputs are stored next to its outputs"
+
+STATE_VERSION = 1
+
+
+def stateFileFor(output_path):
+    """meta_data.csv -> meta_data_stage.json; a graphs directory keeps its state inside"""
+    if os.path.isdir(output_path) or not os.path.splitext(output_path)[1]:
+        return os.path.join(output_path, ".stage.json")
+    return os.path.splitext(output_path)[0] + "_stage.json"
+
+
+def fileFingerprint(file_path, previous=None):
+    """
+    {size, mtime_ns, sha256}. A file whose size and mtime match previous is not read again;
+    otherwise its content is hashed, so a touched but identical file still counts as unchanged.
+    """
+    st = os.stat(file_path)
+    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        return previous
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(file_path)}
+
+
+class StageState:
+    """
+    What a stage last ran from: {"params", "inputs": {input path: fingerprint}} in its state file.
+    A stage is fresh when it ran before with the same params, its outputs exist and none of
+    its inputs was added, removed or changed.
+    """
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.saved = {}
+        self.inputs = {}
+        if os.path.isfile(state_path):
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("version") == STATE_VERSION:
+                    self.saved = saved
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable stage state {state_path}: {e}")
+
+    def fingerprintInputs(self, input_paths):
+        previous = self.saved.get("inputs", {})
+        self.inputs = {path: fileFingerprint(path, previous.get(path)) for path in sorted(input_paths)}
+        return self.inputs
+
+    def isFresh(self, input_paths, params, output_paths):
+        """
+        (fresh, reason). Fingerprints the inputs, hashing only the files whose size or mtime moved.
+        """
+        inputs = self.fingerprintInputs(input_paths)
+        if not self.saved:
+            return False, "never ran"
+        if self.saved.get("params") != params:
+            return False, "settings changed"
+        missing = [path for path in output_paths if not os.path.exists(path)]
+        if missing:
+            return False, f"output missing: {', '.join(os.path.basename(path) for path in missing)}"
+
+        previous = self.saved.get("inputs", {})
+        if set(previous) != set(inputs):
+            return False, f"inputs added or removed ({len(previous)} -> {len(inputs)} files)"
+        changed = [path for path, fp in inputs.items() if fp["sha256"] != previous[path]["sha256"]]
+        if changed:
+            return False, f"{len(changed)} input(s) changed"
+
+        if inputs != previous:
+            # touched but identical files: keep their new mtimes so they are not hashed again
+            self.record(params)
+        return True, "up to date"
+
+    def record(self, params):
+        """stores the inputs fingerprinted last, after the stage ran"""
+        self.saved = {"version": STATE_VERSION, "params": params, "inputs": self.inputs}
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.saved, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+"Remembers what every figure was drawn from, so unchanged subjects are not redrawn"
+
+CACHE_FILE_NAME = ".render_cache.json"
+
+
+def render_key(data, **params) -> str:
+    """
+    Hash of the input slice (a DataFrame or Series, or a list of them) and the plotting parameters.
+    """
+    digest = hashlib.sha256()
+    for part in data if isinstance(data, (list, tuple)) else [data]:
+        frame = part.to_frame() if isinstance(part, pd.Series) else part
+        digest.update(json.dumps([str(c) for c in frame.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    {figure file name: render key} stored in output_dir/.render_cache.json
+    force=True redraws every figure, but still records and saves what they were drawn from.
+    """
+    def __init__(self, output_dir, force=False):
+        self.output_dir = output_dir
+        self.force = force
+        self.path = os.path.join(output_dir, CACHE_FILE_NAME)
+        self.keys = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.keys = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable render cache {self.path}: {e}")
+
+    def is_fresh(self, filename, key) -> bool:
+        """True when filename exists and was drawn from the same input and parameters"""
+        return (
+            not self.force
+            and self.keys.get(filename) == key
+            and os.path.isfile(os.path.join(self.output_dir, filename))
+        )
+
+    def record(self, filename, key):
+        self.keys[filename] = key
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.keys, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)